@@ -0,0 +1,234 @@
+"""Планы выполнения (EXPLAIN ANALYZE) запросов, которые выполняет бот.
+
+БД заполняется тестовыми данными, после чего функции бота, обращающиеся к БД, вызываются по
+очереди; все выполненные ими запросы перехватываются и повторяются с `EXPLAIN (ANALYZE,
+BUFFERS)`. Все изменения выполняются в одной транзакции, которая в конце откатывается, поэтому
+данные в БД не меняются.
+
+Запуск из каталога `src` (нужна локальная БД, указанная в `.env`, с примененными миграциями):
+
+    python -m benchmarks.explain_queries --chats 1000 --polls 30 --output plans.txt
+"""
+import argparse
+import datetime as dt
+import sys
+from typing import Any, Callable, List, Tuple
+
+from aiogram import types
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from bot import subscribe
+from chat_settings import fetch_chat_settings
+from database import ENGINE
+from database.tables import (
+    ChatTimezone,
+    FsmState,
+    Place,
+    PlaceType,
+    Poll,
+    PollOption,
+    PollVote,
+    Subscription,
+)
+from deadlines import get_open_polls
+from fsm_storage import delete_expired_states, read_state, write_state
+from mailing import MailingTime
+from outbox import OutgoingMessage, fetch_due_messages
+from places import load_places
+from polls import close_polls, get_polls_results, on_poll_creation, remove_subscription
+from schedule import MailingSchedule
+from timezone import Timezone
+from utils import select_polls_winners
+from votes import write_votes
+
+
+BOT_ID = 1
+# ID тестовых чатов не пересекаются с ID настоящих чатов
+FIRST_CHAT_ID = -10 ** 12
+NUM_PLACES = 6
+NUM_VOTERS = 5
+
+TStatement = Tuple[str, Any]
+
+
+def seed(session: Session, num_chats: int, num_polls: int) -> List[int]:
+    """Заполнение БД тестовыми данными.
+
+    У каждого чата есть подписка, часовой пояс, состояние диалога и `num_polls` опросов;
+    последний опрос каждого чата не закрыт, и срок его действия истек.
+
+    :return: ID созданных мест.
+    """
+    now = dt.datetime.utcnow()
+    chat_ids = [FIRST_CHAT_ID - i for i in range(num_chats)]
+
+    place_type_id = session.execute(
+        insert(PlaceType).values(name='explain').returning(PlaceType.id)
+    ).scalar_one()
+    place_ids = list(session.execute(
+        insert(Place).values([
+            {'name': f'explain {i}', 'place_type_id': place_type_id, 'is_delivery': i > 0}
+            for i in range(NUM_PLACES)
+        ]).returning(Place.id)
+    ).scalars())
+
+    session.execute(insert(Subscription), [
+        {'chat_id': chat_id, 'bot_id': BOT_ID, 'mailing_time': dt.time(12, i % 60)}
+        for i, chat_id in enumerate(chat_ids)
+    ])
+    session.execute(insert(ChatTimezone), [
+        {'chat_id': chat_id, 'sign': 1, 'offset': dt.time(3)} for chat_id in chat_ids
+    ])
+    session.execute(insert(FsmState), [
+        {'chat_id': chat_id, 'user_id': 1, 'state': 'explain', 'data': {},
+         'updated_at': now - dt.timedelta(days=i % 3)}
+        for i, chat_id in enumerate(chat_ids)
+    ])
+
+    polls, options, votes = [], [], []
+
+    for chat_id in chat_ids:
+        for i in range(num_polls):
+            poll_id = f'explain{chat_id}-{i}'
+            is_last = i == num_polls - 1
+            polls.append({
+                'id': poll_id,
+                'chat_id': chat_id,
+                'start_date': now - dt.timedelta(days=num_polls - i, minutes=10),
+                'open_period': 300,
+                'is_closed': not is_last,
+            })
+            options.extend(
+                {'poll_id': poll_id, 'position': position, 'option_id': place_id}
+                for position, place_id in enumerate(place_ids)
+            )
+            votes.extend(
+                {'poll_id': poll_id, 'user_id': user_id, 'option_number': user_id % NUM_PLACES}
+                for user_id in range(NUM_VOTERS)
+            )
+
+    for table, rows in ((Poll, polls), (PollOption, options), (PollVote, votes)):
+        session.execute(insert(table), rows)
+
+    return place_ids
+
+
+def capture(conn: Connection, func: Callable[[], Any]) -> List[TStatement]:
+    """Запросы, выполненные функцией `func`; изменения, сделанные функцией, откатываются."""
+    statements: List[TStatement] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # для executemany сохраняется только первый набор параметров
+        statements.append((statement, parameters[0] if executemany else parameters))
+
+    savepoint = conn.begin_nested()
+    event.listen(conn, 'before_cursor_execute', before_cursor_execute)
+
+    try:
+        func()
+    finally:
+        event.remove(conn, 'before_cursor_execute', before_cursor_execute)
+        savepoint.rollback()
+
+    return statements
+
+
+def explain(conn: Connection, statements: List[TStatement]) -> List[Tuple[str, List[str]]]:
+    """Повторное выполнение запросов с EXPLAIN ANALYZE в исходном порядке."""
+    plans = []
+    savepoint = conn.begin_nested()
+
+    try:
+        for statement, parameters in statements:
+            if statement.lstrip().upper().startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK')):
+                continue
+
+            rows = conn.exec_driver_sql(
+                'EXPLAIN (ANALYZE, BUFFERS) ' + statement, parameters,
+            ).scalars()
+            plans.append((statement, list(rows)))
+    finally:
+        savepoint.rollback()
+
+    return plans
+
+
+def main(num_chats: int, num_polls: int, output) -> None:
+    chat_id = FIRST_CHAT_ID
+
+    with ENGINE.connect() as conn:
+        transaction = conn.begin()
+        session = Session(bind=conn)
+
+        try:
+            place_ids = seed(session, num_chats=num_chats, num_polls=num_polls)
+            conn.exec_driver_sql('ANALYZE')
+
+            open_poll_ids = [f'explain{chat_id - i}-{num_polls - 1}' for i in range(100)]
+            poll = types.Poll(id='explain-new', open_period=300)
+
+            scenarios: List[Tuple[str, Callable[[], Any]]] = [
+                ('load_places', lambda: load_places(session)),
+                ('MailingSchedule.load', lambda: MailingSchedule().load(session, bot_id=BOT_ID)),
+                ('fetch_chat_settings', lambda: fetch_chat_settings(
+                    session, bot_id=BOT_ID, chat_id=chat_id,
+                )),
+                ('subscribe', lambda: subscribe(session, bot_id=BOT_ID, chat_id=chat_id)),
+                ('Timezone.update_timezone', lambda: Timezone.update_timezone(
+                    session, bot_id=BOT_ID, chat_id=chat_id, sign=1, offset=dt.time(4),
+                )),
+                ('MailingTime.set_mailing_time', lambda: MailingTime.set_mailing_time(
+                    session, bot_id=BOT_ID, chat_id=chat_id, mailing_time=dt.time(13),
+                )),
+                ('remove_subscription', lambda: remove_subscription(
+                    session, bot_id=BOT_ID, chat_id=chat_id,
+                )),
+                ('on_poll_creation', lambda: on_poll_creation(
+                    poll=poll, chat_id=chat_id, session=session, option_ids=place_ids,
+                )),
+                ('get_open_polls', lambda: get_open_polls(session)),
+                ('write_votes', lambda: write_votes(session, votes={
+                    (open_poll_ids[0], NUM_VOTERS): (1,), (open_poll_ids[0], 0): (),
+                })),
+                ('select_polls_winners (истекшие опросы)', lambda: select_polls_winners(session)),
+                ('get_polls_results', lambda: get_polls_results(
+                    session, poll_ids=open_poll_ids, not_delivery_ids=place_ids[:1],
+                )),
+                ('close_polls', lambda: close_polls(
+                    session, poll_ids=open_poll_ids, customers={}, messages=[
+                        OutgoingMessage(chat_id, 'send_message', {'text': 'explain'}),
+                    ],
+                )),
+                ('fetch_due_messages', lambda: fetch_due_messages(session)),
+                ('read_state', lambda: read_state(session, chat_id=chat_id, user_id=1)),
+                ('write_state', lambda: write_state(
+                    session, chat_id=chat_id, user_id=1, state='next', data={'x': 1},
+                )),
+                ('delete_expired_states', lambda: delete_expired_states(session)),
+            ]
+
+            for name, func in scenarios:
+                session.expunge_all()
+                statements = capture(conn, func)
+
+                print(f'===== {name} =====\n', file=output)
+
+                for statement, plan in explain(conn, statements):
+                    print(statement.strip(), file=output)
+                    print('\n'.join(plan), end='\n\n', file=output)
+        finally:
+            session.close()
+            transaction.rollback()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=1000, help='количество чатов')
+    parser.add_argument('--polls', type=int, default=30, help='количество опросов в чате')
+    parser.add_argument('--output', type=argparse.FileType('w'), default=sys.stdout,
+                        help='файл для записи планов')
+    args = parser.parse_args()
+
+    main(num_chats=args.chats, num_polls=args.polls, output=args.output)
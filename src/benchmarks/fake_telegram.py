@@ -0,0 +1,209 @@
+"""Локальный сервер, имитирующий Telegram Bot API, для нагрузочного тестирования бота.
+
+Поддерживаются методы, которые вызывает бот: `getMe`, `getUpdates`, `sendPoll`, `sendMessage`,
+`getChatMember`, `setMyCommands` (и `deleteWebhook`/`setWebhook`); остальные методы возвращают
+`true`. Обновления для бота добавляются через `FakeTelegram.push_update`, отправленные ботом опросы
+и сообщения сохраняются в `polls` и `messages`. Бот подключается к серверу через переменную
+окружения `TELEGRAM_API_URL` (см. `benchmarks/load_test.py`).
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from aiohttp import web
+
+
+BOT_ID = 123456
+BOT_TOKEN = f'{BOT_ID}:fake-token'
+BOT_USER = {'id': BOT_ID, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+
+
+class SentPoll(NamedTuple):
+    poll_id: str
+    chat_id: int
+    num_options: int
+    open_period: int
+    sent_at: float
+
+
+class SentMessage(NamedTuple):
+    chat_id: int
+    text: str
+    sent_at: float
+
+
+class QueuedUpdate(NamedTuple):
+    update_id: int
+    payload: Dict[str, Any]
+    # время добавления обновления в очередь (time.monotonic())
+    created_at: float
+
+
+def make_user(user_id: int) -> Dict[str, Any]:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+
+
+def make_chat(chat_id: int) -> Dict[str, Any]:
+    return {'id': chat_id, 'type': 'group', 'title': f'Chat {chat_id}'}
+
+
+class FakeTelegram:
+    """Сервер Bot API с очередью обновлений в памяти.
+
+    :param on_poll: функция, вызываемая для каждого отправленного ботом опроса.
+    :param on_message: функция, вызываемая для каждого отправленного ботом сообщения.
+    :param on_delivered: функция, вызываемая для каждого обновления при получении его ботом.
+    """
+
+    def __init__(
+        self,
+        on_poll: Optional[Callable[[SentPoll], None]] = None,
+        on_message: Optional[Callable[[SentMessage], None]] = None,
+        on_delivered: Optional[Callable[[QueuedUpdate], None]] = None,
+    ) -> None:
+        self.on_poll = on_poll
+        self.on_message = on_message
+        self.on_delivered = on_delivered
+        self.polls: List[SentPoll] = []
+        self.messages: List[SentMessage] = []
+        self.calls: Dict[str, int] = {}
+        self._updates: List[QueuedUpdate] = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._poll_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post('/bot{token}/{method}', self.handle)
+
+    def push_update(self, payload: Dict[str, Any]) -> QueuedUpdate:
+        """Добавление обновления (`message`, `poll_answer`, ...) в очередь для бота."""
+        update = QueuedUpdate(next(self._update_ids), payload, time.monotonic())
+        self._updates.append(update)
+        self._new_updates.set()
+        return update
+
+    def push_message(self, chat_id: int, user_id: int, text: str) -> QueuedUpdate:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': make_chat(chat_id),
+            'from': make_user(user_id),
+            'text': text,
+        }
+
+        if text.startswith('/'):
+            command_length = len(text.split()[0])
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': command_length}]
+
+        return self.push_update({'message': message})
+
+    def push_poll_answer(self, poll_id: str, user_id: int, option_ids: List[int]) -> QueuedUpdate:
+        return self.push_update({'poll_answer': {
+            'poll_id': poll_id,
+            'user': make_user(user_id),
+            'option_ids': option_ids,
+        }})
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    async def get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+
+        # обновления с ID меньше `offset` подтверждены ботом
+        self._updates = [update for update in self._updates if update.update_id >= offset]
+
+        if not self._updates and timeout:
+            self._new_updates.clear()
+
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = self._updates[:limit]
+
+        if self.on_delivered is not None:
+            for update in batch:
+                self.on_delivered(update)
+
+        return [{'update_id': update.update_id, **update.payload} for update in batch]
+
+    def send_poll(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params['chat_id'])
+        open_period = int(params.get('open_period') or 0)
+        options = json.loads(params['options'])
+        poll = SentPoll(
+            f'poll{next(self._poll_ids)}', chat_id, len(options), open_period, time.monotonic(),
+        )
+        self.polls.append(poll)
+
+        if self.on_poll is not None:
+            self.on_poll(poll)
+
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': make_chat(chat_id),
+            'poll': {
+                'id': poll.poll_id,
+                'question': params['question'],
+                'options': [{'text': text, 'voter_count': 0} for text in options],
+                'total_voter_count': 0,
+                'is_closed': False,
+                'is_anonymous': False,
+                'type': 'regular',
+                'allows_multiple_answers': False,
+                'open_period': open_period,
+            },
+        }
+
+    def send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = SentMessage(int(params['chat_id']), params['text'], time.monotonic())
+        self.messages.append(message)
+
+        if self.on_message is not None:
+            self.on_message(message)
+
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': make_chat(message.chat_id),
+            'text': message.text,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = dict(await request.post())
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getMe':
+            result: Any = BOT_USER
+        elif method == 'getUpdates':
+            result = await self.get_updates(params)
+        elif method == 'sendPoll':
+            result = self.send_poll(params)
+        elif method == 'sendMessage':
+            result = self.send_message(params)
+        elif method == 'getChatMember':
+            result = {'user': make_user(int(params['user_id'])), 'status': 'member'}
+        else:
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8081) -> None:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
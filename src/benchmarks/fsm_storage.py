@@ -0,0 +1,82 @@
+"""Сравнение задержек чтения и записи состояний диалогов.
+
+`memory` — `MemoryStorage` aiogram, `postgres` — `PostgresStorage` с кэшем (чтение обычно не
+обращается к БД), `postgres.nocache` — `PostgresStorage` без кэша (каждое обращение — запрос к
+БД). Для каждого хранилища пользователи по очереди переводятся в новое состояние, после чего их
+состояние читается.
+
+Запуск из каталога `src` (нужна БД, указанная в `.env`, с примененными миграциями):
+
+    python -m benchmarks.fsm_storage --users 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
+
+from database import session_scope
+from database.tables import FsmState
+from fsm_storage import PostgresStorage
+
+
+BENCHMARK_CHAT_ID = -1
+
+
+def report(name: str, operation: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+
+    print(f'{name:<18}{operation:<6}'
+          f'{statistics.mean(latencies) * 1e6:>10.1f} us mean'
+          f'{statistics.median(latencies) * 1e6:>10.1f} us p50'
+          f'{p99 * 1e6:>10.1f} us p99')
+
+
+async def measure(name: str, storage: BaseStorage, num_users: int) -> None:
+    set_latencies, get_latencies = [], []
+
+    for user_id in range(num_users):
+        started = time.perf_counter()
+        await storage.set_state(chat=BENCHMARK_CHAT_ID, user=user_id, state='benchmark')
+        set_latencies.append(time.perf_counter() - started)
+
+    for user_id in range(num_users):
+        started = time.perf_counter()
+        await storage.get_state(chat=BENCHMARK_CHAT_ID, user=user_id)
+        get_latencies.append(time.perf_counter() - started)
+
+    report(name, 'set', set_latencies)
+    report(name, 'get', get_latencies)
+
+
+def cleanup() -> None:
+    with session_scope() as session:
+        session.query(FsmState).filter(
+            FsmState.chat_id == BENCHMARK_CHAT_ID,
+        ).delete(synchronize_session=False)
+
+
+async def main(num_users: int) -> None:
+    storages = (
+        ('memory', MemoryStorage()),
+        ('postgres', PostgresStorage()),
+        ('postgres.nocache', PostgresStorage(cache_size=0)),
+    )
+
+    try:
+        for name, storage in storages:
+            await measure(name, storage, num_users=num_users)
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500, help='количество пользователей')
+    args = parser.parse_args()
+
+    asyncio.run(main(num_users=args.users))
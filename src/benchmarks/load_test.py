@@ -0,0 +1,360 @@
+"""Нагрузочное тестирование бота с локальным сервером Bot API (`benchmarks/fake_telegram.py`).
+
+Бот запускается отдельным процессом с `TELEGRAM_API_URL`, указывающим на локальный сервер.
+Генератор нагрузки создает `--chats` чатов, в каждом из которых создается опрос (командой
+`/lunch` или рассылкой по расписанию), на каждый опрос отвечают `--voters` пользователей;
+дополнительно в чаты отправляются текстовые сообщения. Обновления передаются боту с частотой не
+выше `--rate` в секунду. По завершении выводятся перцентили задержек:
+
+- доставка опроса — от получения ботом команды `/lunch` (или от времени рассылки) до отправки
+  опроса;
+- запись ответа — от появления ответа на опрос до его появления в БД (БД проверяется каждые
+  `WATCH_INTERVAL` секунд);
+- доставка результатов — от завершения опроса до отправки сообщения с результатами.
+
+Запуск из каталога `src` (нужна локальная БД, указанная в `.env`, с примененными миграциями и
+заполненным справочником мест; бот с тем же токеном не должен быть запущен):
+
+    python -m benchmarks.load_test --chats 200 --voters 20 --rate 500 --open-period 30
+
+Рассылка по расписанию (`--trigger schedule`) выполняется только в рабочие дни.
+"""
+import argparse
+import asyncio
+import datetime as dt
+import os
+import random
+import signal
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from benchmarks.fake_telegram import (
+    BOT_ID,
+    BOT_TOKEN,
+    FakeTelegram,
+    QueuedUpdate,
+    SentMessage,
+    SentPoll,
+)
+from benchmarks.name_matcher import random_word
+from calendars import calendars
+from database import run_in_session, session_scope
+from database.tables import (
+    ChatTimezone,
+    FsmState,
+    OutboxMessage,
+    PlaceStat,
+    Poll,
+    PollOption,
+    PollVote,
+    Subscription,
+)
+
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+# ID тестовых чатов не пересекаются с ID настоящих чатов
+FIRST_CHAT_ID = -2 * 10 ** 12
+FIRST_USER_ID = 10 ** 12
+WATCH_INTERVAL = 0.2
+BOT_STOP_TIMEOUT = 30
+
+
+def seed_schedule(chat_times: Dict[int, dt.time]) -> None:
+    """Подписки на рассылку для тестовых чатов (часовой пояс UTC)."""
+    with session_scope() as session:
+        session.bulk_insert_mappings(Subscription, [
+            {'chat_id': chat_id, 'bot_id': BOT_ID, 'mailing_time': mailing_time}
+            for chat_id, mailing_time in chat_times.items()
+        ])
+        session.bulk_insert_mappings(ChatTimezone, [
+            {'chat_id': chat_id, 'sign': 1, 'offset': dt.time(0)} for chat_id in chat_times
+        ])
+
+
+def cleanup(chat_ids: List[int]) -> None:
+    """Удаление данных тестовых чатов."""
+    with session_scope() as session:
+        poll_ids = session.query(Poll.id).filter(Poll.chat_id.in_(chat_ids)).scalar_subquery()
+
+        for table in (PollVote, PollOption):
+            session.query(table).filter(
+                table.poll_id.in_(poll_ids),
+            ).delete(synchronize_session=False)
+
+        for table in (Poll, Subscription, ChatTimezone, FsmState, OutboxMessage, PlaceStat):
+            session.query(table).filter(
+                table.chat_id.in_(chat_ids),
+            ).delete(synchronize_session=False)
+
+
+def fetch_votes(session: Session, poll_ids: List[str]) -> List[Tuple[str, int]]:
+    return session.query(PollVote.poll_id, PollVote.user_id).filter(
+        PollVote.poll_id.in_(poll_ids),
+    ).all()
+
+
+def report(name: str, latencies: List[float], expected: int) -> None:
+    if not latencies:
+        print(f'{name:<22}нет данных (ожидалось {expected})')
+        return
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    print(f'{name:<22}{len(latencies):>7}/{expected:<7}'
+          f'p50 {p50:>9.1f} мс  p90 {p90:>9.1f} мс  p99 {p99:>9.1f} мс  '
+          f'max {max(latencies) * 1000:>9.1f} мс')
+
+
+class LoadGenerator:
+    """Генерация обновлений для бота и сбор задержек."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rnd = random.Random(0)
+        self.chat_ids = [FIRST_CHAT_ID - i for i in range(args.chats)]
+        self.telegram = FakeTelegram(
+            on_poll=self.on_poll,
+            on_message=self.on_message,
+            on_delivered=self.on_delivered,
+        )
+        self._pending: Deque[Callable[[], QueuedUpdate]] = deque()
+        self._delivered: Dict[int, float] = {}
+        # ID чата -> момент (time.monotonic()), от которого отсчитывается доставка опроса
+        self._poll_expected: Dict[int, float] = {}
+        self._command_updates: Dict[int, int] = {}
+        self._polls: Dict[int, SentPoll] = {}
+        # (ID опроса, ID пользователя) -> время появления ответа
+        self._answers: Dict[Tuple[str, int], float] = {}
+        self._unseen: Dict[str, Set[int]] = {}
+        self._results: Set[int] = set()
+        self._done = asyncio.Event()
+
+        self.poll_delivery: List[float] = []
+        self.vote_ingestion: List[float] = []
+        self.result_delivery: List[float] = []
+
+    def on_delivered(self, update: QueuedUpdate) -> None:
+        self._delivered.setdefault(update.update_id, time.monotonic())
+
+    def on_poll(self, poll: SentPoll) -> None:
+        if poll.chat_id in self._polls:
+            return
+
+        self._polls[poll.chat_id] = poll
+
+        if poll.chat_id in self._command_updates:
+            started = self._delivered.get(self._command_updates[poll.chat_id])
+        else:
+            started = self._poll_expected.get(poll.chat_id)
+
+        if started is not None:
+            self.poll_delivery.append(poll.sent_at - started)
+
+        self._unseen[poll.poll_id] = set()
+
+        for i in range(self.args.voters):
+            user_id = FIRST_USER_ID + i
+            option_ids = [self.rnd.randrange(poll.num_options)]
+            self._pending.append(self._answer(poll.poll_id, user_id, option_ids))
+
+    def _answer(
+        self, poll_id: str, user_id: int, option_ids: List[int],
+    ) -> Callable[[], QueuedUpdate]:
+        def push() -> QueuedUpdate:
+            update = self.telegram.push_poll_answer(poll_id, user_id, option_ids)
+            self._answers[(poll_id, user_id)] = update.created_at
+            self._unseen[poll_id].add(user_id)
+            return update
+
+        return push
+
+    def on_message(self, message: SentMessage) -> None:
+        poll = self._polls.get(message.chat_id)
+
+        if poll is None or message.chat_id in self._results:
+            return
+
+        deadline = poll.sent_at + poll.open_period
+
+        # ответы на текстовые сообщения (ссылки на места и приветствия) не учитываются
+        if message.sent_at < deadline or message.text.startswith('«') or message.text == 'Привет!':
+            return
+
+        self._results.add(message.chat_id)
+        self.result_delivery.append(message.sent_at - deadline)
+
+        if len(self._results) == len(self.chat_ids):
+            self._done.set()
+
+    def schedule_polls(self) -> Optional[Dict[int, dt.time]]:
+        """Постановка в очередь команд `/lunch` или построение расписания рассылки."""
+        if self.args.trigger == 'command':
+            for chat_id in self.chat_ids:
+                self._pending.append(self._command(chat_id))
+
+            return None
+
+        now = dt.datetime.utcnow()
+        first_minute = now.replace(second=0, microsecond=0) + dt.timedelta(
+            minutes=self.args.mailing_in,
+        )
+        started = time.monotonic()
+        chat_times = {}
+
+        for i, chat_id in enumerate(self.chat_ids):
+            moment = first_minute + dt.timedelta(minutes=i % self.args.spread)
+            chat_times[chat_id] = moment.time()
+            self._poll_expected[chat_id] = started + (moment - now).total_seconds()
+
+        if not calendars.is_working_day(now.date()):
+            logger.warning('Сегодня не рабочий день, рассылка по расписанию не выполняется')
+
+        return chat_times
+
+    def _command(self, chat_id: int) -> Callable[[], QueuedUpdate]:
+        def push() -> QueuedUpdate:
+            update = self.telegram.push_message(chat_id, FIRST_USER_ID, '/lunch')
+            self._command_updates[chat_id] = update.update_id
+            return update
+
+        return push
+
+    def schedule_messages(self) -> None:
+        for _ in range(self.args.messages):
+            for chat_id in self.chat_ids:
+                text = ' '.join(random_word(self.rnd, 1, 10) for _ in range(self.rnd.randint(1, 8)))
+                self._pending.append(
+                    lambda chat_id=chat_id, text=text: self.telegram.push_message(
+                        chat_id, FIRST_USER_ID + 1, text,
+                    )
+                )
+
+    async def produce(self) -> None:
+        """Передача обновлений из очереди с частотой не выше `--rate` в секунду."""
+        interval = 0.01
+        budget = 0.0
+
+        while True:
+            budget = min(budget + self.args.rate * interval, self.args.rate)
+
+            while budget >= 1 and self._pending:
+                self._pending.popleft()()
+                budget -= 1
+
+            await asyncio.sleep(interval)
+
+    async def watch_votes(self) -> None:
+        """Отслеживание появления ответов на опросы в БД."""
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            poll_ids = [poll_id for poll_id, users in self._unseen.items() if users]
+
+            if not poll_ids:
+                continue
+
+            now = time.monotonic()
+
+            for poll_id, user_id in await run_in_session(fetch_votes, poll_ids=poll_ids):
+                if user_id in self._unseen[poll_id]:
+                    self._unseen[poll_id].discard(user_id)
+                    self.vote_ingestion.append(now - self._answers[(poll_id, user_id)])
+
+    async def run(self, bot_env: Dict[str, str]) -> None:
+        chat_times = self.schedule_polls()
+
+        if chat_times is not None:
+            seed_schedule(chat_times)
+
+        await self.telegram.start(port=self.args.port)
+        bot = await asyncio.create_subprocess_exec(
+            sys.executable, 'main.py', cwd=str(SRC_DIR), env=bot_env,
+        )
+        tasks = []
+        started = time.monotonic()
+
+        try:
+            # бот готов к работе, когда начинает запрашивать обновления
+            while not self.telegram.calls.get('getUpdates'):
+                if bot.returncode is not None:
+                    raise RuntimeError(f'Бот завершился с кодом {bot.returncode}')
+
+                await asyncio.sleep(0.1)
+
+            self.schedule_messages()
+            tasks = [
+                asyncio.ensure_future(self.produce()),
+                asyncio.ensure_future(self.watch_votes()),
+            ]
+
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout=self.args.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'Не все результаты получены за {self.args.timeout} с')
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            if bot.returncode is None:
+                bot.send_signal(signal.SIGINT)
+
+                try:
+                    await asyncio.wait_for(bot.wait(), timeout=BOT_STOP_TIMEOUT)
+                except asyncio.TimeoutError:
+                    bot.kill()
+
+            await self.telegram.stop()
+
+        num_chats = len(self.chat_ids)
+        num_votes = len(self._polls) * self.args.voters
+
+        print(f'Чатов: {num_chats}, опросов: {len(self._polls)}, ответов: {len(self._answers)}, '
+              f'сообщений от бота: {len(self.telegram.messages)}, '
+              f'время: {time.monotonic() - started:.1f} с')
+        report('Доставка опроса', self.poll_delivery, num_chats)
+        report('Запись ответа', self.vote_ingestion, num_votes)
+        report('Доставка результатов', self.result_delivery, num_chats)
+        print('Вызовы Bot API:', dict(sorted(self.telegram.calls.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=100, help='количество чатов')
+    parser.add_argument('--voters', type=int, default=10, help='ответов на каждый опрос')
+    parser.add_argument('--messages', type=int, default=5, help='текстовых сообщений на чат')
+    parser.add_argument('--rate', type=float, default=200, help='обновлений в секунду')
+    parser.add_argument('--trigger', choices=['command', 'schedule'], default='command',
+                        help='создание опросов командой /lunch или рассылкой по расписанию')
+    parser.add_argument('--mailing-in', type=int, default=1,
+                        help='через сколько минут начинается рассылка (для --trigger schedule)')
+    parser.add_argument('--spread', type=int, default=1,
+                        help='на сколько минут распределяется рассылка (для --trigger schedule)')
+    parser.add_argument('--open-period', type=int, default=30, help='длительность опроса, с')
+    parser.add_argument('--port', type=int, default=8081, help='порт сервера Bot API')
+    parser.add_argument('--timeout', type=float, default=600, help='ограничение времени теста, с')
+    args = parser.parse_args()
+
+    bot_env = dict(
+        os.environ,
+        API_TOKEN=BOT_TOKEN,
+        TELEGRAM_API_URL=f'http://127.0.0.1:{args.port}',
+        POLL_OPEN_PERIOD=str(args.open_period),
+    )
+    # вебхук не используется: бот получает обновления через getUpdates
+    bot_env.pop('WEBHOOK_URL', None)
+
+    generator = LoadGenerator(args)
+
+    try:
+        asyncio.run(generator.run(bot_env))
+    finally:
+        cleanup(generator.chat_ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Замер задержки цикла событий при конкурентной обработке обновлений.
+
+Каждое «обновление» выполняет запрос `SELECT pg_sleep(...)` либо напрямую через `session_scope()`
+(как обработчики делали раньше), либо через `run_in_session()`. Параллельно с обработкой
+обновлений фоновая задача засыпает на `PROBE_INTERVAL` секунд и измеряет, насколько позже
+она просыпается.
+
+Запуск из каталога `src` (нужна БД, указанная в `.env`):
+
+    python -m benchmarks.loop_lag --updates 200 --query-time 0.02
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import run_in_session, session_scope
+
+
+PROBE_INTERVAL = 0.005
+
+
+def slow_query(session: Session, duration: float) -> None:
+    session.execute(text('SELECT pg_sleep(:duration)'), {'duration': duration})
+
+
+async def blocking_update(duration: float) -> None:
+    with session_scope() as session:
+        slow_query(session, duration=duration)
+
+
+async def offloaded_update(duration: float) -> None:
+    await run_in_session(slow_query, duration=duration)
+
+
+async def probe(lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def measure(
+    handler: Callable[[float], Awaitable[None]],
+    num_updates: int,
+    duration: float,
+) -> Tuple[float, List[float]]:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(duration) for _ in range(num_updates)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+
+    return elapsed, lags
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main(num_updates: int, duration: float) -> None:
+    handlers = (
+        ('session_scope', blocking_update),
+        ('run_in_session', offloaded_update),
+    )
+
+    print(f'{"":<16}{"total, s":>10}{"upd/s":>10}{"p50, ms":>10}{"p99, ms":>10}{"max, ms":>10}')
+
+    for name, handler in handlers:
+        elapsed, lags = await measure(handler, num_updates=num_updates, duration=duration)
+        lags_ms = [lag * 1000 for lag in lags] or [0.0]
+
+        print(f'{name:<16}{elapsed:>10.2f}{num_updates / elapsed:>10.1f}'
+              f'{percentile(lags_ms, 0.5):>10.1f}{percentile(lags_ms, 0.99):>10.1f}'
+              f'{max(lags_ms):>10.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=200, help='количество обновлений')
+    parser.add_argument('--query-time', type=float, default=0.02,
+                        help='длительность запроса к БД, с')
+    args = parser.parse_args()
+
+    asyncio.run(main(num_updates=args.updates, duration=args.query_time))
@@ -0,0 +1,97 @@
+"""Сравнение поиска названий мест в сообщениях: регулярное выражение и `NameMatcher`.
+
+`regex.match` — прежний способ (название только в начале сообщения), `regex.search` —
+регулярное выражение, ищущее название в любом месте сообщения, `matcher` — автомат
+Ахо — Корасик, `trigram` — нечеткий поиск `TrigramIndex` по тем же сообщениям,
+`trigram.typos` — нечеткий поиск по названиям с одной опечаткой.
+
+Запуск из каталога `src` (БД не нужна):
+
+    python -m benchmarks.name_matcher --names 10000 --messages 10000
+"""
+import argparse
+import random
+import re
+import string
+import time
+from typing import Callable, List, Optional
+
+from matcher import NameMatcher, TrigramIndex
+from utils import normalize_text
+
+
+ALPHABET = string.ascii_lowercase + 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+def random_word(rnd: random.Random, min_len: int, max_len: int) -> str:
+    return ''.join(rnd.choices(ALPHABET, k=rnd.randint(min_len, max_len)))
+
+
+def make_messages(rnd: random.Random, names: List[str], num_messages: int) -> List[str]:
+    """Сообщения из 1–15 случайных слов; в каждом пятом упоминается одно из названий."""
+    messages = []
+
+    for _ in range(num_messages):
+        words = [random_word(rnd, 1, 10) for _ in range(rnd.randint(1, 15))]
+
+        if rnd.random() < 0.2:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(names))
+
+        messages.append(normalize_text(' '.join(words)))
+
+    return messages
+
+
+def make_typos(rnd: random.Random, names: List[str], num_messages: int) -> List[str]:
+    """Названия, в которых один символ заменен случайным."""
+    messages = []
+
+    for _ in range(num_messages):
+        name = rnd.choice(names)
+        pos = rnd.randrange(len(name))
+        messages.append(name[:pos] + rnd.choice(ALPHABET) + name[pos + 1:])
+
+    return messages
+
+
+def measure(name: str, find: Callable[[str], Optional[str]], messages: List[str]) -> None:
+    started = time.perf_counter()
+    found = sum(find(msg) is not None for msg in messages)
+    elapsed = time.perf_counter() - started
+
+    print(f'{name:<14}{len(messages) / elapsed:>12.0f} msg/s'
+          f'{elapsed / len(messages) * 1e6:>10.1f} us/msg{found:>10} found')
+
+
+def main(num_names: int, num_messages: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    names = sorted({random_word(rnd, 4, 16) for _ in range(num_names)})
+    messages = make_messages(rnd, names, num_messages)
+
+    started = time.perf_counter()
+    regex = re.compile('(' + '|'.join(map(re.escape, names)) + ')')
+    print(f'regex build: {time.perf_counter() - started:.3f} s')
+
+    started = time.perf_counter()
+    matcher = NameMatcher(names)
+    print(f'matcher build: {time.perf_counter() - started:.3f} s')
+
+    started = time.perf_counter()
+    fuzzy_index = TrigramIndex(names)
+    print(f'trigram build: {time.perf_counter() - started:.3f} s')
+
+    measure('regex.match', regex.match, messages)
+    measure('regex.search', regex.search, messages)
+    measure('matcher', matcher.find_longest, messages)
+    measure('trigram', fuzzy_index.find, messages)
+    measure('trigram.typos', fuzzy_index.find, make_typos(rnd, names, num_messages))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--names', type=int, default=10000, help='количество названий')
+    parser.add_argument('--messages', type=int, default=10000, help='количество сообщений')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    main(num_names=args.names, num_messages=args.messages, seed=args.seed)
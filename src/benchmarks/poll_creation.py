@@ -0,0 +1,90 @@
+"""Сравнение скорости сохранения созданных опросов.
+
+`legacy` — прежний способ: строка опроса фиксируется отдельной транзакцией, варианты ответа
+записываются через `DataFrame.to_sql` по другому соединению. `bulk` — `on_poll_creation`:
+опрос и варианты ответа сохраняются в одной транзакции одним INSERT.
+
+Запуск из каталога `src` (нужна БД, указанная в `.env`):
+
+    python -m benchmarks.poll_creation --polls 500 --options 10
+"""
+import argparse
+import time
+import uuid
+from typing import Callable, List, Sequence
+
+import pandas as pd
+from aiogram import types
+from sqlalchemy.orm import Session
+
+from database import ENGINE, session_scope
+from database.tables import Poll, PollOption
+from polls import DEFAULT_POLL_OPEN_PERIOD, on_poll_creation
+
+
+POLL_ID_PREFIX = 'benchmark-'
+
+
+def legacy_poll_creation(
+    poll: types.Poll,
+    chat_id: int,
+    session: Session,
+    option_ids: Sequence[int],
+) -> None:
+    session.add(
+        Poll(id=poll.id, chat_id=chat_id, open_period=poll.open_period)
+    )
+    session.commit()
+
+    options = pd.DataFrame({
+        'poll_id': poll.id,
+        'position': range(len(option_ids)),
+        'option_id': option_ids,
+    })
+
+    options.to_sql(PollOption.__tablename__, ENGINE, if_exists='append', index=False)
+
+
+def measure(func: Callable, num_polls: int, option_ids: List[int]) -> float:
+    started = time.perf_counter()
+
+    for chat_id in range(num_polls):
+        poll = types.Poll(
+            id=POLL_ID_PREFIX + uuid.uuid4().hex, open_period=DEFAULT_POLL_OPEN_PERIOD,
+        )
+
+        with session_scope() as session:
+            func(poll=poll, chat_id=chat_id, session=session, option_ids=option_ids)
+
+    return num_polls / (time.perf_counter() - started)
+
+
+def cleanup() -> None:
+    with session_scope() as session:
+        session.query(PollOption).filter(
+            PollOption.poll_id.startswith(POLL_ID_PREFIX)
+        ).delete(synchronize_session=False)
+
+        session.query(Poll).filter(
+            Poll.id.startswith(POLL_ID_PREFIX)
+        ).delete(synchronize_session=False)
+
+
+def main(num_polls: int, num_options: int) -> None:
+    option_ids = list(range(1, num_options + 1))
+
+    try:
+        for name, func in (('legacy', legacy_poll_creation), ('bulk', on_poll_creation)):
+            polls_per_second = measure(func, num_polls=num_polls, option_ids=option_ids)
+            print(f'{name:<8}{polls_per_second:>10.1f} polls/s')
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--polls', type=int, default=500, help='количество опросов')
+    parser.add_argument('--options', type=int, default=10, help='количество вариантов ответа')
+    args = parser.parse_args()
+
+    main(num_polls=args.polls, num_options=args.options)
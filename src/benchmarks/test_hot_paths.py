@@ -0,0 +1,127 @@
+"""Бенчмарки функций, которые бот выполняет при обработке каждого сообщения или опроса.
+
+Запуск из корня репозитория (нужен pytest-benchmark из `dev_requirements.txt`, БД не нужна):
+
+    pytest src/benchmarks --no-cov --benchmark-autosave
+
+Результаты сохраняются в `.benchmarks` в виде JSON; сравнение с последним сохраненным запуском:
+
+    pytest src/benchmarks --no-cov --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Базовые результаты в репозиторий не добавляются, так как зависят от машины: перед сравнением
+сохраните их первым запуском с `--benchmark-autosave` на той же машине (например, на коммите
+до изменений).
+"""
+import datetime as dt
+import random
+from typing import List
+
+import pandas as pd
+import pytest
+
+from benchmarks.name_matcher import make_messages, make_typos, random_word
+from calendars import CalendarService
+from mailing import parse_time
+from places import PlaceRecord, PlacesCatalog
+from schedule import ChatSchedule, MailingSchedule
+from tests.mock.poll_votes import generate_polls_votes
+from timezone import parse_timezone
+from utils import PlacesInfo, get_polls_winners, normalize_text
+
+
+NUM_MESSAGES = 1000
+NOW = dt.datetime(2022, 10, 3, 9, 0)
+
+
+@pytest.fixture(scope='module', params=[10 ** 3, 10 ** 4, 10 ** 5])
+def polls_votes(request: pytest.FixtureRequest) -> pd.DataFrame:
+    return generate_polls_votes(request.param)
+
+
+def test_get_polls_winners(benchmark, polls_votes: pd.DataFrame) -> None:
+    # эталонная реализация на pandas медленная, поэтому большие выгрузки замеряются один раз
+    rounds = max(1, 10 ** 4 // polls_votes.poll_id.nunique())
+    result = benchmark.pedantic(get_polls_winners, args=(polls_votes,), rounds=rounds)
+
+    assert result.index.is_unique
+
+
+@pytest.fixture(scope='module', params=[100, 10 ** 4])
+def places_info(request: pytest.FixtureRequest) -> PlacesInfo:
+    rnd = random.Random(0)
+    catalog = PlacesCatalog()
+    catalog.set_places(tuple(
+        PlaceRecord(i, random_word(rnd, 4, 15), None, 1, None, True)
+        for i in range(request.param)
+    ))
+    return PlacesInfo(catalog)
+
+
+def find_places(places_info: PlacesInfo, messages: List[str]) -> int:
+    return sum(places_info.find_place(normalize_text(message)) is not None for message in messages)
+
+
+def test_find_place(benchmark, places_info: PlacesInfo) -> None:
+    rnd = random.Random(1)
+    messages = make_messages(rnd, list(places_info.places), NUM_MESSAGES)
+
+    assert benchmark(find_places, places_info, messages) > 0
+
+
+def test_find_place_with_typos(benchmark, places_info: PlacesInfo) -> None:
+    rnd = random.Random(2)
+    messages = make_typos(rnd, list(places_info.places), NUM_MESSAGES)
+
+    benchmark(find_places, places_info, messages)
+
+
+@pytest.fixture(scope='module', params=[10 ** 3, 10 ** 4])
+def schedule(request: pytest.FixtureRequest) -> MailingSchedule:
+    """Расписание, в котором у всех чатов время рассылки наступает в `NOW`."""
+    rnd = random.Random(3)
+    schedule = MailingSchedule()
+
+    for chat_id in range(request.param):
+        hours = rnd.randint(-11, 12)
+        local = NOW + dt.timedelta(hours=hours)
+        schedule.update(chat_id, ChatSchedule(
+            mailing_time=local.time(),
+            sign=1 if hours >= 0 else -1,
+            offset=dt.time(abs(hours)),
+            calendar=rnd.choice(['RU', 'BY', 'KZ', None]),
+        ))
+
+    return schedule
+
+
+def due_working_chats(schedule: MailingSchedule, calendars: CalendarService) -> List[int]:
+    """Выбор чатов для рассылки так же, как в `PollActions.send_lunch_poll`."""
+    schedule.reset()
+
+    return [
+        chat_id for chat_id, current_time in schedule.due(NOW)
+        if calendars.is_working_day(current_time.date(), schedule.get(chat_id).calendar)
+    ]
+
+
+def test_send_lunch_poll_schedule(benchmark, schedule: MailingSchedule) -> None:
+    calendars = CalendarService()
+    due_working_chats(schedule, calendars)
+
+    assert benchmark(due_working_chats, schedule, calendars)
+
+
+TIME_INPUTS = ['12', '9:30', ' 23:59', '24:00', '12:5', 'обед', '07:00']
+TZ_INPUTS = ['+3', '-05:30', '3', '+14:00', '+25', 'UTC+3', '-0:45']
+
+
+def test_parse_time(benchmark) -> None:
+    inputs = TIME_INPUTS * (NUM_MESSAGES // len(TIME_INPUTS))
+
+    benchmark(lambda: [parse_time(text) for text in inputs])
+
+
+def test_parse_timezone(benchmark) -> None:
+    inputs = TZ_INPUTS * (NUM_MESSAGES // len(TZ_INPUTS))
+
+    benchmark(lambda: [parse_timezone(text) for text in inputs])
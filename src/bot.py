@@ -1,66 +1,132 @@
 import asyncio
 import datetime as dt
-from typing import Callable
+import random
+import time
+from typing import Callable, Optional
 
-import pandas as pd
-from aiogram import Bot, Dispatcher, executor, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram import Dispatcher, executor, types
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.dispatcher.filters.builtin import CommandStart
 from aiogram.types import BotCommand
 from aiogram.types.message import ContentTypes, ParseMode
+from loguru import logger
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session
 
-from database import session_scope
+from chat_settings import chat_settings
+from database import ENGINE, run_in_session
+from database.listener import PG_LISTENER
 from database.tables import ChatTimezone, Subscription
+from deadlines import POLLS_CHANNEL
+from fsm_storage import FSM_CHANNEL, PostgresStorage
+from leader import LeaderElection
 from mailing import MailingStates, MailingTime
+from metrics import (
+    PERIODIC_TASK_DURATION,
+    PERIODIC_TASK_ERRORS,
+    PERIODIC_TASK_LAG,
+    HandlerMetricsMiddleware,
+    InstrumentedBot,
+    MetricsServer,
+    instrument_engine,
+)
+from places import PLACES_CHANNEL, PlaceRecord
 from polls import PollActions
-from settings import API_TOKEN
+from retention import RETENTION_INTERVAL, PollsRetention
+from schedule import (
+    CHAT_SETTINGS_CHANNEL,
+    ChatSchedule,
+    MailingSchedule,
+    mailing_schedule,
+    notify_chat_changed,
+)
+from settings import (
+    API_TOKEN,
+    METRICS_HOST,
+    METRICS_PORT,
+    POLL_OPEN_PERIOD,
+    TELEGRAM_API_URL,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+)
 from timezone import Timezone, TimezoneStates
 from translation import Translation
-from utils import REGEX_NORMALIZATION, PlacesInfo
+from users import UserDirectoryMiddleware
+from utils import PlacesInfo, normalize_text
+from votes import VOTES_FLUSH_INTERVAL
+
+
+FSM_CLEANUP_INTERVAL = 60 * 60
+
+
+def subscribe(session: Session, bot_id: int, chat_id: int) -> Optional[ChatSchedule]:
+    """Создание подписки для чата, если ее еще нет.
+
+    :return: параметры рассылки для чата.
+    """
+    try:
+        session.query(Subscription).filter(
+            Subscription.bot_id == bot_id,
+            Subscription.chat_id == chat_id,
+        ).one()
+    except NoResultFound:
+        session.add(
+            Subscription(chat_id=chat_id, bot_id=bot_id)
+        )
+
+        session.add(
+            ChatTimezone(chat_id=chat_id, sign=1, offset=dt.time(hour=3))
+        )
+
+        notify_chat_changed(session, chat_id)
+
+    return MailingSchedule.fetch_chat(session, bot_id=bot_id, chat_id=chat_id)
 
 
 class EatCookiesBot:
     def __init__(self):
-        self.bot = Bot(token=API_TOKEN)
-        self.dp = Dispatcher(self.bot, storage=MemoryStorage())
+        server = TELEGRAM_PRODUCTION
+
+        if TELEGRAM_API_URL:
+            server = TelegramAPIServer.from_base(TELEGRAM_API_URL)
+
+        self.bot = InstrumentedBot(token=API_TOKEN, server=server)
+        instrument_engine(ENGINE)
+        self.metrics_server = MetricsServer()
+        self.storage = PostgresStorage()
+        self.dp = Dispatcher(self.bot, storage=self.storage)
         self.translation = Translation()
         self.places_info = PlacesInfo()
         self.poll_actions = PollActions(
             bot=self.bot,
+            open_period=POLL_OPEN_PERIOD,
             places_info=self.places_info,
             translation=self.translation,
+            # при работе нескольких процессов ответы на опрос могут оставаться в буферах других
+            # процессов еще до `VOTES_FLUSH_INTERVAL` секунд после завершения опроса
+            results_delay=2 * VOTES_FLUSH_INTERVAL if WEBHOOK_URL else 0,
         )
+        self.leader = LeaderElection()
+        self.retention = PollsRetention()
 
     async def start_subscription(self, msg: types.Message) -> None:
         """Начало работы с ботом."""
-        bot_id = self.bot.id
         chat_id = msg.chat.id
-
-        with session_scope() as session:
-            try:
-                session.query(Subscription).filter(
-                    Subscription.bot_id == bot_id,
-                    Subscription.chat_id == chat_id,
-                ).one()
-            except NoResultFound:
-                session.add(
-                    Subscription(chat_id=chat_id, bot_id=bot_id)
-                )
-
-                session.add(
-                    ChatTimezone(chat_id=chat_id, sign=1, offset=dt.time(hour=3))
-                )
+        entry = await run_in_session(subscribe, bot_id=self.bot.id, chat_id=chat_id)
+        chat_settings.invalidate(chat_id)
+        mailing_schedule.update(chat_id, entry)
 
         await msg.answer(f'Я бот. Приятно познакомиться, {msg.from_user.mention}.')
 
-    async def send_link(self, chat_id: int, place: pd.Series) -> None:
+    async def send_link(self, chat_id: int, place: PlaceRecord) -> None:
         url_keyboard = types.InlineKeyboardMarkup().row(
             types.InlineKeyboardButton(text=self.translation.go_to_site, url=place.url)
         )
         await self.bot.send_message(
             chat_id=chat_id,
-            text=f'«{place["name"]}»',
+            text=f'«{place.name}»',
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=url_keyboard,
         )
@@ -76,11 +142,9 @@ class EatCookiesBot:
         if not self.places_info.has_data:
             return
 
-        msg_normalized = REGEX_NORMALIZATION.sub('', msg_lower)
-        matching_place = self.places_info.names_regex.match(msg_normalized)
+        place = self.places_info.find_place(normalize_text(msg_lower))
 
-        if matching_place:
-            place = self.places_info.places.loc[matching_place.group()]
+        if place is not None:
             await self.send_link(chat_id=msg.chat.id, place=place)
 
     async def handle_lunch_command(self, msg: types.Message) -> None:
@@ -88,16 +152,19 @@ class EatCookiesBot:
 
     async def get_random_place(self, msg: types.Message) -> None:
         if self.places_info.has_data:
-            place = self.places_info.places.sample(1).iloc[0]
+            place = random.choice(list(self.places_info.places.values()))
             await self.send_link(chat_id=msg.chat.id, place=place)
         else:
             await msg.answer('Данные не найдены')
 
     async def update_places(self, *_) -> None:
-        """Обновление информации о местах для заказа."""
-        self.places_info.update_places()
+        """Запуск обновления информации о местах для заказа в фоне."""
+        self.places_info.catalog.request_refresh()
 
     def register_handlers(self):
+        self.dp.middleware.setup(HandlerMetricsMiddleware())
+        self.dp.middleware.setup(UserDirectoryMiddleware(self.poll_actions.users))
+
         self.dp.register_message_handler(self.start_subscription, CommandStart())
 
         self.dp.register_message_handler(Timezone.set_timezone, commands=['tz'])
@@ -131,6 +198,7 @@ class EatCookiesBot:
             content_types=ContentTypes.TEXT,
         )
         self.dp.register_poll_answer_handler(self.poll_actions.process_user_answer)
+        self.dp.register_poll_handler(self.poll_actions.process_poll_update)
 
     async def set_commands(self, *_) -> None:
         commands = [
@@ -142,27 +210,126 @@ class EatCookiesBot:
 
         await self.bot.set_my_commands(commands=commands)
 
-    def execute(self):
-        self.register_handlers()
+    async def load_schedule(self) -> None:
+        """Построение расписания рассылки по данным из БД."""
+        await run_in_session(mailing_schedule.load, bot_id=self.bot.id)
+        logger.info(f'Расписание рассылки загружено, чатов: {len(mailing_schedule)}')
+
+    async def run_mailing(self) -> None:
+        """Рассылка опросов по расписанию."""
+        await self.load_schedule()
+        await do_periodic_task(60, self.poll_actions.send_lunch_poll)
+
+    async def reload_chat_schedule(self, chat_id: int) -> None:
+        settings = await chat_settings.get(bot_id=self.bot.id, chat_id=chat_id)
+        mailing_schedule.update(chat_id, settings.schedule if settings is not None else None)
+
+    def on_chat_settings_changed(self, payload: str) -> None:
+        """Обработка уведомления об изменении настроек чата любым из процессов бота.
+
+        Расписание рассылки нужно только ведущему процессу; остальные процессы загрузят его
+        целиком, если станут ведущими.
+        """
+        chat_settings.on_settings_changed(payload)
+
+        if self.leader.is_leader:
+            asyncio.ensure_future(self.reload_chat_schedule(int(payload)))
+
+    async def on_startup(self, dp: Dispatcher) -> None:
+        if METRICS_PORT:
+            await self.metrics_server.start(METRICS_HOST, METRICS_PORT)
+
+        await self.set_commands()
+
+        if WEBHOOK_URL:
+            await self.bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH)
+
+        catalog = self.places_info.catalog
+        await catalog.refresh()
+        await self.places_info.wait_for_update()
+
+        PG_LISTENER.subscribe(PLACES_CHANNEL, catalog.request_refresh)
+        PG_LISTENER.subscribe(POLLS_CHANNEL, self.poll_actions.on_poll_created)
+        PG_LISTENER.subscribe(CHAT_SETTINGS_CHANNEL, self.on_chat_settings_changed)
+        PG_LISTENER.subscribe(FSM_CHANNEL, self.storage.on_state_changed)
+        PG_LISTENER.start()
+
+        # задачи по расписанию выполняются только в одном (ведущем) процессе
+        self.leader.add_task(self.run_mailing)
+        self.leader.add_task(self.poll_actions.run_deadlines)
+        self.leader.add_task(self.poll_actions.outbox.run)
+        self.leader.add_task(
+            lambda: do_periodic_task(FSM_CLEANUP_INTERVAL, self.storage.delete_expired)
+        )
+        self.leader.add_task(
+            lambda: do_periodic_task(RETENTION_INTERVAL, self.retention.run)
+        )
+        self.leader.start()
+
         loop = asyncio.get_event_loop()
 
         loop.create_task(
-            do_periodic_task(60, self.poll_actions.send_lunch_poll)
+            do_periodic_task(60, catalog.refresh_if_stale)
         )
 
         loop.create_task(
-            do_periodic_task(30, self.poll_actions.send_polls_results)
+            do_periodic_task(VOTES_FLUSH_INTERVAL, self.poll_actions.votes.flush)
         )
 
-        executor.start_polling(self.dp, loop=loop, on_startup=self.set_commands)
+    async def on_shutdown(self, dp: Dispatcher) -> None:
+        self.leader.stop()
+        PG_LISTENER.stop()
+
+        num_votes = await self.poll_actions.votes.flush()
+        logger.info(f'Записаны оставшиеся ответы на опросы: {num_votes}')
+
+        await self.metrics_server.stop()
+
+    def execute(self):
+        self.register_handlers()
+
+        if not WEBHOOK_URL:
+            executor.start_polling(
+                self.dp, on_startup=self.on_startup, on_shutdown=self.on_shutdown,
+            )
+            return
+
+        # несколько процессов на одном сервере принимают обновления на общем порту
+        executor.start_webhook(
+            self.dp,
+            webhook_path=WEBHOOK_PATH,
+            on_startup=self.on_startup,
+            on_shutdown=self.on_shutdown,
+            host=WEBAPP_HOST,
+            port=WEBAPP_PORT,
+            reuse_port=True,
+        )
 
 
 async def do_periodic_task(timeout: int, stuff: Callable) -> None:
     """Вызов переданной функции каждые `timeout` секунд.
 
+    Время выполнения функции и задержка ее запуска относительно запланированного времени
+    записываются в метрики с меткой `task` (полное имя функции).
+
     :param timeout: Период (в секундах).
     :param stuff: Функция.
     """
+    task = getattr(stuff, '__qualname__', stuff.__name__)
+    planned = time.monotonic()
+
     while True:
-        await stuff()
+        started = time.monotonic()
+        PERIODIC_TASK_LAG.observe(max(0.0, started - planned), task=task)
+
+        try:
+            await stuff()
+        except Exception:
+            PERIODIC_TASK_ERRORS.inc(task=task)
+            logger.exception(f'Ошибка при выполнении периодической задачи {stuff.__name__}')
+
+        finished = time.monotonic()
+        PERIODIC_TASK_DURATION.observe(finished - started, task=task)
+
+        planned = finished + timeout
         await asyncio.sleep(timeout)
@@ -0,0 +1,86 @@
+import datetime as dt
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+from workalendar.core import Calendar
+from workalendar.registry import registry
+
+
+DEFAULT_CALENDAR = 'RU'
+
+
+class WorkingDays:
+    """Рабочие дни по производственному календарю в виде битовых масок по годам.
+
+    Маска года строится при первом обращении к дате этого года (то есть при наступлении нового
+    года), после чего проверка даты сводится к чтению одного бита. Хранятся маски только
+    текущего и соседних лет.
+    """
+
+    def __init__(self, calendar: Calendar) -> None:
+        self.calendar = calendar
+        # год -> (порядковый номер 1 января, маска рабочих дней)
+        self._years: Dict[int, Tuple[int, bytes]] = {}
+
+    def _build(self, year: int) -> Tuple[int, bytes]:
+        first_day = dt.date(year, 1, 1)
+        num_days = dt.date(year + 1, 1, 1).toordinal() - first_day.toordinal()
+        bitmap = bytearray((num_days + 7) // 8)
+
+        for i in range(num_days):
+            if self.calendar.is_working_day(first_day + dt.timedelta(days=i)):
+                bitmap[i >> 3] |= 1 << (i & 7)
+
+        for old_year in [y for y in self._years if abs(y - year) > 1]:
+            del self._years[old_year]
+
+        self._years[year] = (first_day.toordinal(), bytes(bitmap))
+        return self._years[year]
+
+    def is_working_day(self, day: dt.date) -> bool:
+        year = self._years.get(day.year)
+
+        if year is None:
+            year = self._build(day.year)
+
+        first_ordinal, bitmap = year
+        i = day.toordinal() - first_ordinal
+        return bool(bitmap[i >> 3] >> (i & 7) & 1)
+
+
+class CalendarService:
+    """Производственные календари стран по кодам ISO 3166 (`RU`, `BY`, `KZ`, ...).
+
+    Календарь страны создается при первом обращении; для чатов, у которых календарь не выбран
+    или неизвестен, используется календарь `default`.
+    """
+
+    def __init__(self, default: str = DEFAULT_CALENDAR) -> None:
+        self.default = default
+        self._calendars: Dict[str, WorkingDays] = {}
+
+    def get(self, code: Optional[str] = None) -> WorkingDays:
+        code = (code or self.default).upper()
+        working_days = self._calendars.get(code)
+
+        if working_days is not None:
+            return working_days
+
+        calendar_class = registry.get(code)
+
+        if calendar_class is None:
+            logger.warning(f'Неизвестный производственный календарь {code}, '
+                           f'используется {self.default}')
+            working_days = self.get(self.default)
+        else:
+            working_days = WorkingDays(calendar_class())
+
+        self._calendars[code] = working_days
+        return working_days
+
+    def is_working_day(self, day: dt.date, code: Optional[str] = None) -> bool:
+        """Является ли дата рабочим днем по календарю страны `code`."""
+        return self.get(code).is_working_day(day)
+
+
+calendars = CalendarService()
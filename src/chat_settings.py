@@ -0,0 +1,125 @@
+import datetime as dt
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from database.tables import ChatTimezone, Subscription
+from schedule import ChatSchedule
+
+
+CHAT_SETTINGS_CACHE_SIZE = 10000
+CHAT_SETTINGS_TTL = 60 * 60
+
+
+class ChatSettings(NamedTuple):
+    """Настройки чата: подписка на рассылку и часовой пояс."""
+
+    subscription_id: Optional[int]
+    mailing_time: Optional[dt.time]
+    last_customer_id: Optional[int]
+    sign: int
+    offset: dt.time
+    calendar: Optional[str] = None
+
+    @property
+    def schedule(self) -> Optional[ChatSchedule]:
+        """Параметры рассылки; `None`, если чат не подписан на рассылку."""
+        if self.subscription_id is None:
+            return None
+
+        return ChatSchedule(
+            mailing_time=self.mailing_time,
+            sign=self.sign,
+            offset=self.offset,
+            calendar=self.calendar,
+        )
+
+
+def fetch_chat_settings(session: Session, bot_id: int, chat_id: int) -> Optional[ChatSettings]:
+    """Чтение настроек чата из БД.
+
+    :return: настройки чата или `None`, если для чата не задан часовой пояс.
+    """
+    row = (session
+           .query(Subscription.id,
+                  Subscription.mailing_time,
+                  Subscription.last_customer_id,
+                  ChatTimezone.sign,
+                  ChatTimezone.offset,
+                  Subscription.calendar,
+                  )
+           .select_from(ChatTimezone)
+           .outerjoin(Subscription, and_(
+               Subscription.chat_id == ChatTimezone.chat_id,
+               Subscription.bot_id == bot_id,
+           ))
+           .filter(ChatTimezone.chat_id == chat_id)
+           .first()
+           )
+
+    return ChatSettings(*row) if row is not None else None
+
+
+class ChatSettingsCache:
+    """Кэш настроек чатов.
+
+    Настройки читаются из БД при первом обращении и хранятся не дольше `ttl` секунд; при
+    превышении `size` записей вытесняются настройки, к которым дольше всего не обращались.
+    Обработчики, изменяющие настройки, сразу удаляют их из кэша (`invalidate`), а изменения,
+    сделанные другими процессами бота, приходят уведомлением `CHAT_SETTINGS_CHANNEL`.
+    """
+
+    def __init__(
+        self,
+        size: int = CHAT_SETTINGS_CACHE_SIZE,
+        ttl: float = CHAT_SETTINGS_TTL,
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._cache: 'OrderedDict[int, Tuple[float, Optional[ChatSettings]]]' = OrderedDict()
+        # счетчик удалений из кэша: настройки, прочитанные до удаления, в кэш не попадают
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._cache
+
+    def put(self, chat_id: int, settings: Optional[ChatSettings]) -> None:
+        self._cache[chat_id] = (time.monotonic() + self.ttl, settings)
+        self._cache.move_to_end(chat_id)
+
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._cache.pop(chat_id, None)
+        self._generation += 1
+
+    def on_settings_changed(self, payload: str) -> None:
+        """Обработка уведомления `CHAT_SETTINGS_CHANNEL`."""
+        self.invalidate(int(payload))
+
+    async def get(self, bot_id: int, chat_id: int) -> Optional[ChatSettings]:
+        """Настройки чата (из кэша или из БД)."""
+        cached = self._cache.get(chat_id)
+
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(chat_id)
+            return cached[1]
+
+        generation = self._generation
+        settings = await run_in_session(fetch_chat_settings, bot_id=bot_id, chat_id=chat_id)
+
+        if generation == self._generation:
+            self.put(chat_id, settings)
+
+        return settings
+
+
+chat_settings = ChatSettingsCache()
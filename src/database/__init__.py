@@ -1 +1,9 @@
-from .core import ENGINE, QUERY_WINDOW_SIZE, Session, session_scope
+from .core import (
+    DB_EXECUTOR,
+    ENGINE,
+    QUERY_WINDOW_SIZE,
+    Session,
+    iterate_by_keyset,
+    run_in_session,
+    session_scope,
+)
@@ -1,16 +1,28 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator
+from functools import partial
+from typing import Any, Callable, Generator, Iterator, TypeVar
 
 from sqlalchemy import Column, Identity, Integer, String, create_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.orm.session import Session, sessionmaker
 
 from settings import POSTGRES_DSN
 
 
 QUERY_WINDOW_SIZE = 100
+DB_POOL_SIZE = 5
 
-ENGINE = create_engine(POSTGRES_DSN)
+T = TypeVar('T')
+
+ENGINE = create_engine(POSTGRES_DSN, pool_size=DB_POOL_SIZE)
+
+# Синхронные запросы к БД выполняются в отдельных потоках, чтобы не блокировать цикл событий.
+# Число потоков совпадает с размером пула соединений, поэтому потоки не ждут соединений.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='db')
 
 Base = declarative_base()
 
@@ -46,3 +58,51 @@ def session_scope() -> Generator[Session, None, None]:
         raise e
     finally:
         session.close()
+
+
+def _call_in_session(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    with session_scope() as session:
+        return func(*args, session=session, **kwargs)
+
+
+async def run_in_session(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Асинхронное выполнение `func(*args, session=session, **kwargs)` в рамках
+    `session_scope()`.
+
+    Функция выполняется в пуле потоков `DB_EXECUTOR`; транзакция фиксируется, если функция
+    завершилась без ошибок, и откатывается в противном случае.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        DB_EXECUTOR, partial(_call_in_session, func, *args, **kwargs)
+    )
+
+
+def iterate_by_keyset(
+    query: Query,
+    key: InstrumentedAttribute,
+    window_size: int = QUERY_WINDOW_SIZE,
+) -> Iterator[Any]:
+    """Постраничный обход результатов запроса с пагинацией по ключу (keyset pagination).
+
+    Каждая страница запрашивается условием `key > <последний прочитанный ключ>`, поэтому
+    стоимость чтения страницы не зависит от ее номера, а удаление уже прочитанных строк во время
+    обхода не приводит к пропуску остальных.
+
+    :param query: запрос; колонка `key` должна входить в число выбираемых.
+    :param key: уникальная колонка, по которой упорядочиваются строки.
+    :param window_size: размер страницы.
+    :return: итератор по строкам запроса.
+    """
+    last_key = None
+
+    while True:
+        page_query = query if last_key is None else query.filter(key > last_key)
+        rows = page_query.order_by(key).limit(window_size).all()
+
+        yield from rows
+
+        if len(rows) < window_size:
+            break
+
+        last_key = getattr(rows[-1], key.key)
@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database.core import ENGINE
+
+
+RECONNECT_DELAY = 5
+
+# ID текущего процесса, по которому процесс может отличить свои уведомления от чужих
+INSTANCE_ID = uuid.uuid4().hex
+
+
+def notify(session: Session, channel: str, payload: str = '') -> None:
+    """Отправка уведомления в канал PostgreSQL; уведомление доставляется при фиксации
+    транзакции."""
+    session.execute(select(func.pg_notify(channel, payload)))
+
+
+class PgListener:
+    """Получение уведомлений PostgreSQL (LISTEN/NOTIFY) без блокировки цикла событий.
+
+    Для прослушивания используется отдельное соединение, сокет которого отслеживается циклом
+    событий. При потере соединения выполняется повторное подключение.
+    """
+
+    def __init__(self) -> None:
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = {}
+        self._conn = None
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Подписка на канал.
+
+        :param channel: название канала.
+        :param callback: функция, вызываемая с текстом уведомления.
+        """
+        self._callbacks.setdefault(channel, []).append(callback)
+
+        if self._conn is not None:
+            self._listen(channel)
+
+    def _listen(self, channel: str) -> None:
+        with self._conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{channel}"')
+
+    def start(self) -> None:
+        self._loop = asyncio.get_event_loop()
+
+        try:
+            raw_conn = ENGINE.raw_connection()
+            raw_conn.detach()
+            self._conn = raw_conn.dbapi_connection
+            self._conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+
+            for channel in self._callbacks:
+                self._listen(channel)
+        except Exception:
+            logger.exception('Не удалось подключиться к БД для получения уведомлений')
+            self._reconnect_later()
+            return
+
+        self._fd = self._conn.fileno()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def stop(self) -> None:
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                logger.exception('Ошибка при закрытии соединения для получения уведомлений')
+
+            self._conn = None
+
+    def _reconnect_later(self) -> None:
+        self.stop()
+        self._loop.call_later(RECONNECT_DELAY, self.start)
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except Exception:
+            logger.exception('Потеряно соединение для получения уведомлений')
+            self._reconnect_later()
+            return
+
+        while self._conn.notifies:
+            notification = self._conn.notifies.pop(0)
+
+            for callback in self._callbacks.get(notification.channel, ()):
+                try:
+                    callback(notification.payload)
+                except Exception:
+                    logger.exception(f'Ошибка при обработке уведомления {notification.channel}')
+
+
+PG_LISTENER = PgListener()
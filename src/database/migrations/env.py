@@ -0,0 +1,34 @@
+from alembic import context
+
+import database.tables  # noqa: F401 (регистрация таблиц в Base.metadata)
+from database.core import ENGINE, Base
+from settings import POSTGRES_DSN
+
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Вывод SQL-кода миграций без подключения к БД (`alembic upgrade head --sql`)."""
+    context.configure(
+        url=POSTGRES_DSN,
+        target_metadata=target_metadata,
+        literal_binds=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with ENGINE.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,85 @@
+"""Исходная схема БД
+
+Для БД, созданной до появления миграций, вместо применения этой миграции выполните
+`alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'subscriptions',
+        sa.Column('id', sa.Integer, sa.Identity(always=True, start=1), primary_key=True),
+        sa.Column('chat_id', sa.BigInteger),
+        sa.Column('bot_id', sa.BigInteger),
+        sa.Column('mailing_time', sa.Time),
+        sa.Column('last_customer_id', sa.BigInteger),
+    )
+
+    op.create_table(
+        'place_types',
+        sa.Column('id', sa.Integer, sa.Identity(always=True, start=1), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+    )
+
+    op.create_table(
+        'places',
+        sa.Column('id', sa.Integer, sa.Identity(always=True, start=1), primary_key=True),
+        sa.Column('name', sa.String(500)),
+        sa.Column('url', sa.String),
+        sa.Column('place_type_id', sa.Integer, sa.ForeignKey('place_types.id'), nullable=False),
+        sa.Column('choice_message', sa.String(500)),
+        sa.Column('is_delivery', sa.Boolean, nullable=False),
+    )
+
+    op.create_table(
+        'polls',
+        sa.Column('id', sa.String, nullable=False, unique=True, primary_key=True),
+        sa.Column('chat_id', sa.BigInteger),
+        sa.Column('start_date', sa.DateTime),
+        sa.Column('open_period', sa.Integer),
+        sa.Column('is_closed', sa.Boolean),
+    )
+
+    op.create_table(
+        'polls_options',
+        sa.Column('id', sa.Integer, sa.Identity(always=True, start=1), primary_key=True),
+        sa.Column('poll_id', sa.String),
+        sa.Column('position', sa.Integer),
+        sa.Column('option_id', sa.Integer),
+    )
+
+    op.create_table(
+        'polls_votes',
+        sa.Column('id', sa.Integer, sa.Identity(always=True, start=1), primary_key=True),
+        sa.Column('poll_id', sa.String),
+        sa.Column('user_id', sa.BigInteger),
+        sa.Column('option_number', sa.Integer),
+    )
+
+    op.create_table(
+        'chats_timezones',
+        sa.Column(
+            'chat_id', sa.BigInteger, nullable=False, unique=True, primary_key=True,
+            autoincrement=False,
+        ),
+        sa.Column('sign', sa.Integer),
+        sa.Column('offset', sa.Time),
+    )
+
+
+def downgrade() -> None:
+    for table in ('chats_timezones', 'polls_votes', 'polls_options', 'polls', 'places',
+                  'place_types', 'subscriptions'):
+        op.drop_table(table)
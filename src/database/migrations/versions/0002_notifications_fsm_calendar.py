@@ -0,0 +1,56 @@
+"""Уведомление об изменении справочника мест, состояния диалогов, календарь чата
+
+Миграция применима и к БД, в которой эти изменения уже были сделаны SQL-скриптами.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # уведомление бота об изменении справочника мест (см. src/places.py)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_places_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('places_changed', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute('DROP TRIGGER IF EXISTS places_changed ON places')
+    op.execute("""
+        CREATE TRIGGER places_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON places
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_places_changed()
+    """)
+
+    # состояния диалогов бота (см. src/fsm_storage.py)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            chat_id bigint NOT NULL,
+            user_id bigint NOT NULL,
+            state varchar(200),
+            data jsonb NOT NULL DEFAULT '{}',
+            updated_at timestamp NOT NULL,
+            PRIMARY KEY (chat_id, user_id)
+        )
+    """)
+    op.execute('CREATE INDEX IF NOT EXISTS ix_fsm_states_updated_at ON fsm_states (updated_at)')
+
+    # производственный календарь чата (см. src/calendars.py)
+    op.execute('ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS calendar varchar(10)')
+
+
+def downgrade() -> None:
+    op.drop_column('subscriptions', 'calendar')
+    op.drop_table('fsm_states')
+    op.execute('DROP TRIGGER IF EXISTS places_changed ON places')
+    op.execute('DROP FUNCTION IF EXISTS notify_places_changed()')
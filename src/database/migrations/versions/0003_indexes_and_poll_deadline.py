@@ -0,0 +1,51 @@
+"""Индексы для частых запросов, время завершения опроса, уникальность ответов
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_subscriptions_bot_id_chat_id', 'subscriptions', ['bot_id', 'chat_id'])
+    op.create_index('ix_polls_options_poll_id_position', 'polls_options', ['poll_id', 'position'])
+
+    # время завершения опроса хранится, чтобы поиск завершившихся опросов использовал индекс
+    op.add_column('polls', sa.Column(
+        'deadline',
+        sa.DateTime,
+        sa.Computed("start_date + coalesce(open_period, 0) * interval '1 second'", persisted=True),
+    ))
+    op.create_index(
+        'ix_polls_open_deadline', 'polls', ['deadline'],
+        postgresql_where=sa.text('NOT is_closed'),
+    )
+
+    # удаление повторяющихся ответов перед созданием ограничения уникальности
+    op.execute("""
+        DELETE FROM polls_votes AS a
+        USING polls_votes AS b
+        WHERE a.poll_id = b.poll_id
+          AND a.user_id = b.user_id
+          AND a.option_number = b.option_number
+          AND a.id > b.id
+    """)
+    op.create_unique_constraint(
+        'uq_polls_votes_vote', 'polls_votes', ['poll_id', 'user_id', 'option_number'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_polls_votes_vote', 'polls_votes')
+    op.drop_index('ix_polls_open_deadline', 'polls')
+    op.drop_column('polls', 'deadline')
+    op.drop_index('ix_polls_options_poll_id_position', 'polls_options')
+    op.drop_index('ix_subscriptions_bot_id_chat_id', 'subscriptions')
@@ -0,0 +1,32 @@
+"""Статистика выбора мест в чатах
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'place_stats',
+        sa.Column('chat_id', sa.BigInteger, primary_key=True),
+        sa.Column('place_id', sa.Integer, primary_key=True),
+        sa.Column('wins', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('votes', sa.Integer, nullable=False, server_default='0'),
+    )
+    op.create_index(
+        'ix_place_stats_chat_id_rank', 'place_stats',
+        ['chat_id', sa.text('wins DESC'), sa.text('votes DESC')],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('place_stats')
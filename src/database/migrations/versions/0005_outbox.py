@@ -0,0 +1,34 @@
+"""Очередь исходящих сообщений
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer, sa.Identity(always=True, start=1), primary_key=True),
+        sa.Column('chat_id', sa.BigInteger, nullable=False),
+        sa.Column('method', sa.String(50), nullable=False),
+        sa.Column('payload', JSONB, nullable=False),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime, nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('last_error', sa.String),
+    )
+    op.create_index('ix_outbox_chat_id_id', 'outbox', ['chat_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_table('outbox')
@@ -1,4 +1,19 @@
-from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, String, Time
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    Computed,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Time,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -11,11 +26,15 @@ TUserId = BigInteger
 
 class Subscription(BaseTable):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        Index('ix_subscriptions_bot_id_chat_id', 'bot_id', 'chat_id'),
+    )
 
     chat_id = Column(TChatId)
     bot_id = Column(TUserId)
     mailing_time = Column(Time)
     last_customer_id = Column(TUserId)
+    calendar = Column(String(10))
 
 
 class PlaceType(BaseTable):
@@ -43,10 +62,22 @@ class Poll(BaseTableWithStringID):
     start_date = Column(DateTime, default=func.now())
     open_period = Column(Integer)
     is_closed = Column(Boolean, default=False)
+    # время завершения опроса, вычисляется СУБД
+    deadline = Column(
+        DateTime,
+        Computed("start_date + coalesce(open_period, 0) * interval '1 second'", persisted=True),
+    )
+
+    __table_args__ = (
+        Index('ix_polls_open_deadline', 'deadline', postgresql_where=text('NOT is_closed')),
+    )
 
 
 class PollOption(BaseTable):
     __tablename__ = 'polls_options'
+    __table_args__ = (
+        Index('ix_polls_options_poll_id_position', 'poll_id', 'position'),
+    )
 
     poll_id = Column(String)
     position = Column(Integer)
@@ -55,6 +86,10 @@ class PollOption(BaseTable):
 
 class PollVote(BaseTable):
     __tablename__ = 'polls_votes'
+    # индекс ограничения также используется для поиска ответов по ID опроса
+    __table_args__ = (
+        UniqueConstraint('poll_id', 'user_id', 'option_number', name='uq_polls_votes_vote'),
+    )
 
     poll_id = Column(String)
     user_id = Column(TUserId)
@@ -67,3 +102,40 @@ class ChatTimezone(Base):
     chat_id = Column(TChatId, nullable=False, unique=True, primary_key=True)
     sign = Column(Integer)
     offset = Column(Time)
+
+
+class FsmState(Base):
+    __tablename__ = 'fsm_states'
+
+    chat_id = Column(TChatId, primary_key=True)
+    user_id = Column(TUserId, primary_key=True)
+    state = Column(String(200))
+    data = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False, default=dict)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+
+class PlaceStat(Base):
+    __tablename__ = 'place_stats'
+    __table_args__ = (
+        Index('ix_place_stats_chat_id_rank', 'chat_id', text('wins DESC'), text('votes DESC')),
+    )
+
+    chat_id = Column(TChatId, primary_key=True)
+    place_id = Column(Integer, primary_key=True)
+    wins = Column(Integer, nullable=False, default=0)
+    votes = Column(Integer, nullable=False, default=0)
+
+
+class OutboxMessage(BaseTable):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        Index('ix_outbox_chat_id_id', 'chat_id', 'id'),
+    )
+
+    chat_id = Column(TChatId, nullable=False)
+    method = Column(String(50), nullable=False)
+    payload = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
@@ -0,0 +1,119 @@
+import asyncio
+import datetime as dt
+import heapq
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from database.tables import Poll
+
+
+DEFAULT_RETRY_DELAY = 30
+POLLS_CHANNEL = 'poll_created'
+
+
+def get_open_polls(session: Session) -> List[Tuple[str, dt.datetime]]:
+    """Незакрытые опросы: пары вида (ID опроса, время завершения по UTC)."""
+    query = session.query(Poll.id, Poll.deadline).filter(
+        Poll.is_closed == False,
+    )
+
+    return query.all()
+
+
+class DeadlineScheduler:
+    """Очередь с приоритетом из сроков завершения опросов.
+
+    Обработчик вызывается в момент завершения опроса (а не при периодической проверке) со списком
+    ID всех опросов, срок которых истек. Если обработчик завершился с ошибкой, опросы повторно
+    обрабатываются через `retry_delay` секунд.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[List[str]], Awaitable[None]],
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+    ) -> None:
+        self.callback = callback
+        self.retry_delay = retry_delay
+        self._heap: List[Tuple[dt.datetime, str]] = []
+        self._wakeup = asyncio.Event()
+        self.is_running = False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def next_deadline(self) -> Optional[dt.datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def clear(self) -> None:
+        self._heap.clear()
+
+    def push(self, poll_id: str, deadline: Optional[dt.datetime] = None) -> None:
+        """Добавление опроса в очередь.
+
+        :param poll_id: ID опроса.
+        :param deadline: время завершения опроса по UTC; по умолчанию — текущее время.
+        """
+        if deadline is None:
+            deadline = dt.datetime.utcnow()
+
+        heapq.heappush(self._heap, (deadline, poll_id))
+
+        if self._heap[0][1] == poll_id:
+            self._wakeup.set()
+
+    def pop_due(self, now: dt.datetime) -> List[str]:
+        """Извлечение из очереди опросов, срок которых истек к моменту `now`."""
+        poll_ids = []
+
+        while self._heap and self._heap[0][0] <= now:
+            _, poll_id = heapq.heappop(self._heap)
+
+            if poll_id not in poll_ids:
+                poll_ids.append(poll_id)
+
+        return poll_ids
+
+    async def _wait(self, timeout: Optional[float]) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        self._wakeup.clear()
+
+    async def run(self) -> None:
+        self.is_running = True
+
+        try:
+            await self._run()
+        finally:
+            self.is_running = False
+
+    async def _run(self) -> None:
+        while True:
+            deadline = self.next_deadline
+
+            if deadline is None:
+                await self._wait(timeout=None)
+                continue
+
+            delay = (deadline - dt.datetime.utcnow()).total_seconds()
+
+            if delay > 0:
+                await self._wait(timeout=delay)
+                continue
+
+            poll_ids = self.pop_due(dt.datetime.utcnow())
+
+            try:
+                await self.callback(poll_ids)
+            except Exception:
+                logger.exception(f'Ошибка при обработке завершившихся опросов {poll_ids}')
+                retry_at = dt.datetime.utcnow() + dt.timedelta(seconds=self.retry_delay)
+
+                for poll_id in poll_ids:
+                    self.push(poll_id, retry_at)
@@ -0,0 +1,255 @@
+import copy
+import datetime as dt
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+from aiogram.dispatcher.storage import BaseStorage
+from loguru import logger
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from database.listener import INSTANCE_ID, notify
+from database.tables import FsmState
+
+
+FSM_STATE_TTL = 24 * 60 * 60
+FSM_CACHE_SIZE = 10000
+FSM_CLEANUP_BATCH_SIZE = 1000
+FSM_CHANNEL = 'fsm_state_changed'
+
+TAddress = Union[str, int, None]
+
+
+class CachedState(NamedTuple):
+    state: Optional[str]
+    data: Dict
+    expires_at: float
+
+
+def read_state(
+    session: Session,
+    chat_id: int,
+    user_id: int,
+    ttl: float = FSM_STATE_TTL,
+) -> Tuple[Optional[str], Dict]:
+    """Чтение состояния пользователя в чате.
+
+    :return: пара (состояние, данные); для отсутствующих и устаревших записей — `(None, {})`.
+    """
+    expired_at = dt.datetime.utcnow() - dt.timedelta(seconds=ttl)
+    row = session.query(FsmState.state, FsmState.data).filter(
+        FsmState.chat_id == chat_id,
+        FsmState.user_id == user_id,
+        FsmState.updated_at > expired_at,
+    ).one_or_none()
+
+    return (row.state, row.data) if row is not None else (None, {})
+
+
+def write_state(
+    session: Session,
+    chat_id: int,
+    user_id: int,
+    state: Optional[str],
+    data: Dict,
+) -> None:
+    """Запись состояния пользователя в чате; пустое состояние удаляется.
+
+    Остальные процессы бота получают уведомление `FSM_CHANNEL` об изменении состояния.
+    """
+    notify(session, FSM_CHANNEL, f'{INSTANCE_ID}:{chat_id}:{user_id}')
+
+    if state is None and not data:
+        session.query(FsmState).filter(
+            FsmState.chat_id == chat_id,
+            FsmState.user_id == user_id,
+        ).delete(synchronize_session=False)
+        return
+
+    values = {'state': state, 'data': data, 'updated_at': dt.datetime.utcnow()}
+    statement = insert(FsmState).values(chat_id=chat_id, user_id=user_id, **values)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[FsmState.chat_id, FsmState.user_id],
+        set_=values,
+    ))
+
+
+def delete_expired_states(
+    session: Session,
+    ttl: float = FSM_STATE_TTL,
+    batch_size: int = FSM_CLEANUP_BATCH_SIZE,
+) -> int:
+    """Удаление не более `batch_size` состояний, не изменявшихся дольше `ttl` секунд.
+
+    :return: количество удаленных состояний.
+    """
+    expired_at = dt.datetime.utcnow() - dt.timedelta(seconds=ttl)
+    keys = session.query(FsmState.chat_id, FsmState.user_id).filter(
+        FsmState.updated_at <= expired_at,
+    ).limit(batch_size).all()
+
+    if keys:
+        session.query(FsmState).filter(
+            tuple_(FsmState.chat_id, FsmState.user_id).in_(keys)
+        ).delete(synchronize_session=False)
+
+    return len(keys)
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище состояний конечного автомата aiogram в таблице `fsm_states`.
+
+    Прочитанные и записанные состояния хранятся в LRU-кэше на `cache_size` записей; запись
+    выполняется одновременно в кэш и в БД, поэтому повторное чтение не обращается к БД. Если
+    состояние изменил другой процесс бота, запись удаляется из кэша по уведомлению
+    (см. `on_state_changed`). Состояния, не изменявшиеся дольше `ttl` секунд, считаются пустыми и
+    удаляются `delete_expired`.
+    """
+
+    def __init__(self, cache_size: int = FSM_CACHE_SIZE, ttl: float = FSM_STATE_TTL) -> None:
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache: 'OrderedDict[Tuple[int, int], CachedState]' = OrderedDict()
+
+    def _resolve(self, chat: TAddress, user: TAddress) -> Tuple[int, int]:
+        chat, user = self.check_address(chat=chat, user=user)
+        return int(chat), int(user)
+
+    def _put(self, key: Tuple[int, int], state: Optional[str], data: Dict) -> None:
+        if not self.cache_size:
+            return
+
+        self._cache[key] = CachedState(state, data, time.monotonic() + self.ttl)
+        self._cache.move_to_end(key)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key: Tuple[int, int]) -> CachedState:
+        cached = self._cache.get(key)
+
+        if cached is not None and cached.expires_at > time.monotonic():
+            self._cache.move_to_end(key)
+            return cached
+
+        chat_id, user_id = key
+        state, data = await run_in_session(
+            read_state, chat_id=chat_id, user_id=user_id, ttl=self.ttl,
+        )
+        self._put(key, state, data)
+        return CachedState(state, data, 0)
+
+    async def _store(self, key: Tuple[int, int], state: Optional[str], data: Dict) -> None:
+        self._put(key, state, data)
+        chat_id, user_id = key
+
+        try:
+            await run_in_session(
+                write_state, chat_id=chat_id, user_id=user_id, state=state, data=data,
+            )
+        except Exception:
+            self._cache.pop(key, None)
+            raise
+
+    async def get_state(
+        self,
+        *,
+        chat: TAddress = None,
+        user: TAddress = None,
+        default: Optional[str] = None,
+    ) -> Optional[str]:
+        cached = await self._load(self._resolve(chat, user))
+        return cached.state if cached.state is not None else self.resolve_state(default)
+
+    async def get_data(
+        self,
+        *,
+        chat: TAddress = None,
+        user: TAddress = None,
+        default: Optional[Dict] = None,
+    ) -> Dict:
+        cached = await self._load(self._resolve(chat, user))
+        return copy.deepcopy(cached.data)
+
+    async def set_state(
+        self,
+        *,
+        chat: TAddress = None,
+        user: TAddress = None,
+        state: Optional[str] = None,
+    ) -> None:
+        key = self._resolve(chat, user)
+        cached = await self._load(key)
+        await self._store(key, self.resolve_state(state), cached.data)
+
+    async def set_data(
+        self,
+        *,
+        chat: TAddress = None,
+        user: TAddress = None,
+        data: Optional[Dict] = None,
+    ) -> None:
+        key = self._resolve(chat, user)
+        cached = await self._load(key)
+        await self._store(key, cached.state, copy.deepcopy(data or {}))
+
+    async def update_data(
+        self,
+        *,
+        chat: TAddress = None,
+        user: TAddress = None,
+        data: Optional[Dict] = None,
+        **kwargs,
+    ) -> None:
+        key = self._resolve(chat, user)
+        cached = await self._load(key)
+        new_data = copy.deepcopy(cached.data)
+        new_data.update(data or {}, **kwargs)
+        await self._store(key, cached.state, new_data)
+
+    async def reset_state(
+        self,
+        *,
+        chat: TAddress = None,
+        user: TAddress = None,
+        with_data: Optional[bool] = True,
+    ) -> None:
+        key = self._resolve(chat, user)
+        cached = await self._load(key)
+        await self._store(key, None, {} if with_data else cached.data)
+
+    def on_state_changed(self, payload: str) -> None:
+        """Обработка уведомления `FSM_CHANNEL`: удаление из кэша состояния, измененного другим
+        процессом."""
+        instance_id, chat_id, user_id = payload.split(':')
+
+        if instance_id != INSTANCE_ID:
+            self._cache.pop((int(chat_id), int(user_id)), None)
+
+    async def delete_expired(self) -> int:
+        """Удаление устаревших состояний из БД пакетами по `FSM_CLEANUP_BATCH_SIZE` записей.
+
+        :return: количество удаленных состояний.
+        """
+        num_deleted = 0
+
+        while True:
+            num_batch = await run_in_session(delete_expired_states, ttl=self.ttl)
+            num_deleted += num_batch
+
+            if num_batch < FSM_CLEANUP_BATCH_SIZE:
+                break
+
+        if num_deleted:
+            logger.info(f'Удалено устаревших состояний диалогов: {num_deleted}')
+
+        return num_deleted
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+    async def wait_closed(self) -> None:
+        pass
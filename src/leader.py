@@ -0,0 +1,131 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from database import DB_EXECUTOR, ENGINE
+
+
+# ключ рекомендательной блокировки, которую удерживает ведущий процесс
+LEADER_LOCK_ID = 0x45434272
+LEADER_CHECK_INTERVAL = 5
+
+TTaskFactory = Callable[[], Awaitable[None]]
+
+
+def try_lock(conn, lock_id: int) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', (lock_id,))
+        return cursor.fetchone()[0]
+
+
+def ping(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        return True
+
+
+class LeaderElection:
+    """Выбор ведущего процесса среди нескольких экземпляров бота.
+
+    Ведущим становится процесс, захвативший рекомендательную блокировку PostgreSQL
+    `LEADER_LOCK_ID`. Блокировка удерживается отдельным соединением и освобождается сервером при
+    его закрытии, поэтому при остановке или падении ведущего процесса блокировку в течение
+    `check_interval` секунд захватывает один из остальных. Пока процесс остается ведущим, в нем
+    выполняются задачи, добавленные через `add_task`; при потере блокировки они отменяются.
+    """
+
+    def __init__(
+        self,
+        lock_id: int = LEADER_LOCK_ID,
+        check_interval: float = LEADER_CHECK_INTERVAL,
+    ) -> None:
+        self.lock_id = lock_id
+        self.check_interval = check_interval
+        self.is_leader = False
+        self._conn = None
+        self._factories: List[TTaskFactory] = []
+        self._tasks: List[asyncio.Future] = []
+        self._run_task: Optional[asyncio.Task] = None
+
+    def add_task(self, factory: TTaskFactory) -> None:
+        """Добавление задачи, выполняемой только в ведущем процессе.
+
+        :param factory: функция, возвращающая корутину задачи; вызывается при каждом
+            избрании процесса ведущим.
+        """
+        self._factories.append(factory)
+
+    @staticmethod
+    def _connect():
+        raw_conn = ENGINE.raw_connection()
+        raw_conn.detach()
+        conn = raw_conn.dbapi_connection
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _close(self) -> None:
+        if self._conn is None:
+            return
+
+        try:
+            self._conn.close()
+        except Exception:
+            logger.exception('Ошибка при закрытии соединения для выбора ведущего процесса')
+
+        self._conn = None
+
+    async def _check(self) -> bool:
+        """Проверка, удерживает ли процесс блокировку (с попыткой захватить ее)."""
+        loop = asyncio.get_running_loop()
+
+        if self._conn is None:
+            self._conn = await loop.run_in_executor(DB_EXECUTOR, self._connect)
+
+        if self.is_leader:
+            return await loop.run_in_executor(DB_EXECUTOR, ping, self._conn)
+
+        return await loop.run_in_executor(DB_EXECUTOR, try_lock, self._conn, self.lock_id)
+
+    def _start_tasks(self) -> None:
+        self.is_leader = True
+        logger.info('Процесс стал ведущим')
+        self._tasks = [asyncio.ensure_future(factory()) for factory in self._factories]
+
+    def _stop_tasks(self) -> None:
+        self.is_leader = False
+
+        for task in self._tasks:
+            task.cancel()
+
+        self._tasks = []
+
+    async def run(self) -> None:
+        while True:
+            try:
+                is_leader = await self._check()
+            except Exception:
+                logger.exception('Ошибка при проверке блокировки ведущего процесса')
+                self._close()
+                is_leader = False
+
+            if is_leader and not self.is_leader:
+                self._start_tasks()
+            elif not is_leader and self.is_leader:
+                logger.warning('Процесс перестал быть ведущим')
+                self._stop_tasks()
+
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        self._run_task = asyncio.ensure_future(self.run())
+
+    def stop(self) -> None:
+        """Остановка задач и освобождение блокировки."""
+        if self._run_task is not None:
+            self._run_task.cancel()
+            self._run_task = None
+
+        self._stop_tasks()
+        self._close()
@@ -1,13 +1,16 @@
 import datetime
 import re
+from typing import Optional
 
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from sqlalchemy.orm import Query, Session
 
-from database import session_scope
+from chat_settings import chat_settings
+from database import run_in_session
 from database.tables import Subscription
+from schedule import ChatSchedule, MailingSchedule, mailing_schedule, notify_chat_changed
 from translation import default_translation as translation
 
 
@@ -16,6 +19,16 @@ TIME_PATTERN = r'\s*(?P<h>' + HOUR_PATTERN + r')(?P<m>:[0-5]\d|)'
 TIME_REGEX = re.compile('^' + TIME_PATTERN + '$')
 
 
+def parse_time(text: str) -> Optional[datetime.time]:
+    """Разбор времени вида `12` или `12:30`; `None`, если формат неверный."""
+    m = TIME_REGEX.match(text)
+
+    if not m:
+        return None
+
+    return datetime.time(hour=int(m.group('h')), minute=int(m.group('m')[1:] or 0))
+
+
 class MailingStates(StatesGroup):
     choice_action = State()
     enter_time = State()
@@ -23,19 +36,42 @@ class MailingStates(StatesGroup):
 
 class MailingTime:
     @classmethod
-    def subs_query(cls, session: Session, msg: types.Message) -> Query:
+    def subs_query(cls, session: Session, bot_id: int, chat_id: int) -> Query:
         # noinspection PyTypeChecker
         return (session
                 .query(Subscription)
-                .filter(Subscription.bot_id == msg.bot.id, Subscription.chat_id == msg.chat.id)
+                .filter(Subscription.bot_id == bot_id, Subscription.chat_id == chat_id)
                 )
 
-    @staticmethod
-    async def change(msg: types.Message) -> None:
-        with session_scope() as session:
-            q = session.query(Subscription.mailing_time)
-            q = q.filter(Subscription.chat_id == msg.chat.id, Subscription.bot_id == msg.bot.id)
-            mailing_time, = q.one()
+    @classmethod
+    def set_mailing_time(
+        cls,
+        session: Session,
+        bot_id: int,
+        chat_id: int,
+        mailing_time: Optional[datetime.time],
+    ) -> Optional[ChatSchedule]:
+        """Изменение времени рассылки.
+
+        Функция выполняется в потоке `DB_EXECUTOR` (см. `run_in_session`), где бот текущего
+        обновления (`msg.bot`) недоступен, поэтому ID бота и чата передаются явно.
+
+        :return: новые параметры рассылки для чата.
+        """
+        subs = cls.subs_query(session, bot_id=bot_id, chat_id=chat_id).one()
+        subs.mailing_time = mailing_time
+        notify_chat_changed(session, chat_id)
+        return MailingSchedule.fetch_chat(session, bot_id=bot_id, chat_id=chat_id)
+
+    @classmethod
+    async def change(cls, msg: types.Message) -> None:
+        settings = await chat_settings.get(bot_id=msg.bot.id, chat_id=msg.chat.id)
+
+        if settings is None or settings.subscription_id is None:
+            await msg.answer(translation.not_subscribed)
+            return
+
+        mailing_time = settings.mailing_time
 
         buttons = [
             types.KeyboardButton(text=translation.mailing_change),
@@ -65,9 +101,11 @@ class MailingTime:
     @classmethod
     async def cancel_mailing(cls, msg: types.Message) -> None:
         """Отмена подписки на ежедневный опрос."""
-        with session_scope() as session:
-            subs = cls.subs_query(session, msg).one()
-            subs.mailing_time = None
+        entry = await run_in_session(
+            cls.set_mailing_time, bot_id=msg.bot.id, chat_id=msg.chat.id, mailing_time=None,
+        )
+        chat_settings.invalidate(msg.chat.id)
+        mailing_schedule.update(msg.chat.id, entry)
 
         await msg.answer(
             translation.subscription_cancelled,
@@ -103,17 +141,17 @@ class MailingTime:
             await cls.on_cancel(msg, state)
             return
 
-        m = TIME_REGEX.match(msg.text)
+        time_ = parse_time(msg.text)
 
-        if not m:
+        if time_ is None:
             await msg.answer(translation.invalid_input_format)
             return
 
-        time_ = datetime.time(hour=int(m.group('h')), minute=int(m.group('m')[1:] or 0))
-
-        with session_scope() as session:
-            subs = cls.subs_query(session, msg).one()
-            subs.mailing_time = time_
+        entry = await run_in_session(
+            cls.set_mailing_time, bot_id=msg.bot.id, chat_id=msg.chat.id, mailing_time=time_,
+        )
+        chat_settings.invalidate(msg.chat.id)
+        mailing_schedule.update(msg.chat.id, entry)
 
         await msg.answer(
             f'{translation.mailing_time_changed}: {time_.strftime("%H:%M")}.',
@@ -0,0 +1,183 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+
+DEFAULT_SIMILARITY = 0.55
+# более короткие тексты нечетко не сравниваются: у них слишком мало триграмм
+MIN_FUZZY_LENGTH = 4
+
+REGEX_NON_WORD = re.compile(r'[\W_]')
+
+TRANSLITERATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+})
+
+
+def fuzzy_key(text: str) -> str:
+    """Приведение текста к виду для нечеткого сравнения: без знаков препинания, латиницей."""
+    return REGEX_NON_WORD.sub('', text.lower()).translate(TRANSLITERATION)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatcher:
+    """Поиск названий в тексте (алгоритм Ахо — Корасик).
+
+    Все вхождения всех названий находятся за один проход по тексту, время поиска не зависит от
+    количества названий. Автомат неизменяем: при изменении списка названий строится новый.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # длина самого длинного названия, которое оканчивается в данном состоянии
+        self._longest: List[int] = [0]
+        self._size = 0
+
+        for name in names:
+            self._add(name)
+
+        self._build()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _add(self, name: str) -> None:
+        if not name:
+            return
+
+        state = 0
+
+        for char in name:
+            next_state = self._goto[state].get(char)
+
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._longest.append(0)
+
+            state = next_state
+
+        if not self._longest[state]:
+            self._size += 1
+
+        self._longest[state] = len(name)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+
+                if not self._longest[next_state]:
+                    self._longest[next_state] = self._longest[fail]
+
+    def find_longest(self, text: str) -> Optional[str]:
+        """Самое длинное из названий, встречающихся в тексте (при равной длине — первое).
+
+        :param text: текст, приведенный к тому же виду, что и названия.
+        :return: найденное название или `None`.
+        """
+        goto, fail, longest = self._goto, self._fail, self._longest
+        state = 0
+        best_length, best_end = 0, 0
+
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(char, 0)
+
+            if longest[state] > best_length:
+                best_length, best_end = longest[state], i + 1
+
+        if not best_length:
+            return None
+
+        return text[best_end - best_length:best_end]
+
+
+class TrigramIndex:
+    """Нечеткий поиск названий по совпадающим триграммам символов.
+
+    Для каждой триграммы хранится список названий, в которые она входит, поэтому при поиске
+    просматриваются только названия, имеющие с текстом хотя бы одну общую триграмму. Сходство
+    оценивается коэффициентом Дайса по множествам триграмм. Тексты сравниваются в виде
+    `fuzzy_key`, поэтому названия, записанные латиницей, находятся и по русскому написанию.
+    """
+
+    def __init__(self, names: Iterable[str], threshold: float = DEFAULT_SIMILARITY) -> None:
+        self.threshold = threshold
+        self._names: List[str] = []
+        self._sizes: List[int] = []
+        self._index: Dict[str, List[int]] = {}
+        self._max_length = 0
+
+        for name in names:
+            key = fuzzy_key(name)
+
+            if not key:
+                continue
+
+            name_trigrams = trigrams(key)
+            self._max_length = max(self._max_length, len(key))
+
+            for trigram in name_trigrams:
+                self._index.setdefault(trigram, []).append(len(self._names))
+
+            self._names.append(name)
+            self._sizes.append(len(name_trigrams))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def find(self, text: str) -> Optional[str]:
+        """Название, наиболее похожее на текст.
+
+        Текст целиком сравнивается с названиями, поэтому слишком короткие тексты и тексты, которые
+        намного длиннее самого длинного названия, не рассматриваются.
+
+        :param text: текст.
+        :return: название со сходством не ниже `threshold` или `None`.
+        """
+        key = fuzzy_key(text)
+
+        if len(key) < MIN_FUZZY_LENGTH or len(key) > 2 * self._max_length:
+            return None
+
+        text_trigrams = trigrams(key)
+        counts: Dict[int, int] = {}
+
+        for trigram in text_trigrams:
+            for idx in self._index.get(trigram, ()):
+                counts[idx] = counts.get(idx, 0) + 1
+
+        best_idx, best_score = None, self.threshold
+
+        for idx, count in counts.items():
+            score = 2 * count / (len(text_trigrams) + self._sizes[idx])
+
+            if score >= best_score:
+                best_idx, best_score = idx, score
+
+        return self._names[best_idx] if best_idx is not None else None
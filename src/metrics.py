@@ -0,0 +1,412 @@
+import abc
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram import Bot, types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiohttp import web
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Границы интервалов гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+TLabels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+
+    pairs = []
+
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+        pairs.append(f'{name}="{escaped}"')
+
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric(abc.ABC):
+    """Метрика в формате Prometheus с набором меток `labelnames`.
+
+    Значения метрик обновляются и из цикла событий, и из потоков `DB_EXECUTOR`, поэтому доступ
+    к ним защищен блокировкой.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> TLabels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'Метрика {self.name} требует метки {self.labelnames}')
+
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """Значения метрики: (суффикс имени, имена меток, значения меток, значение)."""
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f'{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}'
+            )
+
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[TLabels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+
+        return [('', self.labelnames, key, value) for key, value in values]
+
+
+class Gauge(Metric):
+    """Метрика без меток, значение которой вычисляется функцией в момент чтения метрик."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        with self._lock:
+            self._function = function
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        with self._lock:
+            function = self._function
+
+        return [('', (), (), function())] if function is not None else []
+
+
+class Histogram(Metric):
+    """Гистограмма: количество наблюдений в интервалах `buckets`, их сумма и количество."""
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # количество наблюдений в каждом интервале (не накопленное) и сумма наблюдений
+        self._counts: Dict[TLabels, List[int]] = {}
+        self._sums: Dict[TLabels, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts = self._counts.get(key)
+
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+                self._sums[key] = 0.0
+
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Замер времени выполнения блока кода."""
+        started = time.monotonic()
+
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        with self._lock:
+            values = sorted(
+                (key, list(counts), self._sums[key]) for key, counts in self._counts.items()
+            )
+
+        names = self.labelnames + ('le',)
+        result = []
+
+        for key, counts, total in values:
+            cumulative = 0
+
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                result.append(('_bucket', names, key + (_format_value(bound),), cumulative))
+
+            result.append(('_sum', self.labelnames, key, total))
+            result.append(('_count', self.labelnames, key, cumulative))
+
+        return result
+
+
+class MetricsRegistry:
+    """Набор метрик, выводимых на странице `/metrics`."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Значения всех метрик в текстовом формате Prometheus."""
+        lines = []
+
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_DURATION = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Время обработки обновлений', ['update_type', 'handler'],
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    'bot_handler_errors_total', 'Ошибки при обработке обновлений', ['update_type', 'handler'],
+)
+DB_QUERY_DURATION = REGISTRY.histogram(
+    'bot_db_query_duration_seconds', 'Время выполнения SQL-запросов', ['operation'],
+)
+DB_QUERY_ERRORS = REGISTRY.counter(
+    'bot_db_query_errors_total', 'Ошибки при выполнении SQL-запросов', ['operation'],
+)
+API_REQUEST_DURATION = REGISTRY.histogram(
+    'bot_api_request_duration_seconds', 'Время выполнения запросов к Bot API', ['method'],
+)
+API_ERRORS = REGISTRY.counter(
+    'bot_api_errors_total', 'Ошибки запросов к Bot API', ['method', 'error'],
+)
+PERIODIC_TASK_DURATION = REGISTRY.histogram(
+    'bot_periodic_task_duration_seconds', 'Время выполнения периодических задач', ['task'],
+)
+PERIODIC_TASK_LAG = REGISTRY.histogram(
+    'bot_periodic_task_lag_seconds',
+    'Задержка запуска периодических задач относительно запланированного времени',
+    ['task'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+PERIODIC_TASK_ERRORS = REGISTRY.counter(
+    'bot_periodic_task_errors_total', 'Ошибки при выполнении периодических задач', ['task'],
+)
+PLACES_SNAPSHOT_AGE = REGISTRY.gauge(
+    'bot_places_snapshot_age_seconds', 'Время, прошедшее с построения снимка справочника мест',
+)
+PLACES_SNAPSHOT_BUILD_DURATION = REGISTRY.histogram(
+    'bot_places_snapshot_build_duration_seconds', 'Время построения снимка справочника мест',
+)
+
+
+# обработчик и тип обновления, которое обрабатывается в текущей задаче
+_current_handler: 'ContextVar[Optional[Tuple[str, str]]]' = ContextVar(
+    'metrics_handler', default=None,
+)
+
+
+def handler_name(handler) -> str:
+    func = getattr(handler, '__func__', handler)
+    return getattr(func, '__qualname__', repr(func))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Замер времени выполнения обработчиков обновлений.
+
+    Время отсчитывается от вызова обработчика, прошедшего фильтры (`current_handler`), до
+    завершения обработки обновления; обновления, для которых не нашлось обработчика, не
+    учитываются.
+    """
+
+    KEY = '_metrics_started'
+
+    def _start(self, update_type: str, data: dict) -> None:
+        name = handler_name(current_handler.get())
+        _current_handler.set((update_type, name))
+        data[self.KEY] = (name, time.monotonic())
+
+    def _finish(self, update_type: str, data: dict) -> None:
+        started = data.pop(self.KEY, None)
+
+        if started is not None:
+            name, started_at = started
+            HANDLER_DURATION.observe(
+                time.monotonic() - started_at, update_type=update_type, handler=name,
+            )
+
+    async def on_pre_process_update(self, update: types.Update, data: dict) -> None:
+        _current_handler.set(None)
+
+    async def on_process_message(self, message: types.Message, data: dict) -> None:
+        self._start('message', data)
+
+    async def on_post_process_message(self, message: types.Message, results, data: dict) -> None:
+        self._finish('message', data)
+
+    async def on_process_poll(self, poll: types.Poll, data: dict) -> None:
+        self._start('poll', data)
+
+    async def on_post_process_poll(self, poll: types.Poll, results, data: dict) -> None:
+        self._finish('poll', data)
+
+    async def on_process_poll_answer(self, answer: types.PollAnswer, data: dict) -> None:
+        self._start('poll_answer', data)
+
+    async def on_post_process_poll_answer(
+        self, answer: types.PollAnswer, results, data: dict,
+    ) -> None:
+        self._finish('poll_answer', data)
+
+    async def on_pre_process_error(
+        self, update: types.Update, error: Exception, data: dict,
+    ) -> None:
+        current = _current_handler.get()
+
+        if current is not None:
+            update_type, name = current
+            HANDLER_ERRORS.inc(update_type=update_type, handler=name)
+
+
+def sql_operation(statement: str) -> str:
+    """Тип SQL-запроса (`SELECT`, `INSERT`, ...) для меток метрик."""
+    words = statement.lstrip(' (\n').split(None, 1)
+    return words[0].upper() if words else ''
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Замер времени выполнения SQL-запросов через события `engine`."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.monotonic())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_started')
+
+        if started:
+            DB_QUERY_DURATION.observe(
+                time.monotonic() - started.pop(), operation=sql_operation(statement),
+            )
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        started = context.connection.info.get('metrics_started') if context.connection else None
+
+        if started:
+            started.pop()
+
+        DB_QUERY_ERRORS.inc(operation=sql_operation(context.statement or ''))
+
+
+class InstrumentedBot(Bot):
+    """`Bot` с замером времени выполнения запросов к Bot API и подсчетом ошибок."""
+
+    async def request(
+        self, method: str, data: Optional[dict] = None, files: Optional[dict] = None, **kwargs,
+    ):
+        started = time.monotonic()
+
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception as e:
+            API_ERRORS.inc(method=method, error=type(e).__name__)
+            raise
+        finally:
+            API_REQUEST_DURATION.observe(time.monotonic() - started, method=method)
+
+
+class MetricsServer:
+    """HTTP-сервер, отдающий метрики `registry` на странице `/metrics`."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY) -> None:
+        self.registry = registry
+        self.app = web.Application()
+        self.app.router.add_get('/metrics', self.handle)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode(), headers={
+            'Content-Type': CONTENT_TYPE,
+        })
+
+    async def start(self, host: str, port: int) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f'Метрики доступны по адресу http://{host}:{port}/metrics')
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
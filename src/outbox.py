@@ -0,0 +1,233 @@
+import asyncio
+import datetime as dt
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from aiogram import Bot
+from aiogram.utils.exceptions import BadRequest, RetryAfter, Unauthorized
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from database.tables import OutboxMessage
+from sending import RateLimiter
+
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 5
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_BASE_DELAY = 1
+OUTBOX_MAX_DELAY = 60 * 60
+
+
+class OutgoingMessage(NamedTuple):
+    """Сообщение для отправки: метод `Bot` и его аргументы (кроме `chat_id`)."""
+
+    chat_id: int
+    method: str
+    payload: Dict
+
+
+class QueuedMessage(NamedTuple):
+    id: int
+    chat_id: int
+    method: str
+    payload: Dict
+    attempts: int
+
+
+class SendFailure(NamedTuple):
+    """Неудачная попытка отправки; при `retry_at=None` сообщение больше не отправляется."""
+
+    id: int
+    retry_at: Optional[dt.datetime]
+    error: str
+
+
+def enqueue_messages(session: Session, messages: Sequence[OutgoingMessage]) -> None:
+    """Добавление сообщений в очередь `outbox` (в транзакции сессии)."""
+    if not messages:
+        return
+
+    now = dt.datetime.utcnow()
+    session.execute(insert(OutboxMessage).values([
+        {
+            'chat_id': message.chat_id,
+            'method': message.method,
+            'payload': message.payload,
+            'created_at': now,
+            'next_attempt_at': now,
+        }
+        for message in messages
+    ]))
+
+
+def fetch_due_messages(session: Session, limit: int = OUTBOX_BATCH_SIZE) -> List[QueuedMessage]:
+    """Сообщения, которые пора отправить: не больше одного (самого раннего) сообщения на чат.
+
+    Если самое раннее сообщение чата ожидает повторной попытки, остальные сообщения этого чата
+    тоже ждут, поэтому порядок сообщений в чате сохраняется.
+    """
+    first = (session
+             .query(OutboxMessage.id, OutboxMessage.next_attempt_at)
+             .distinct(OutboxMessage.chat_id)
+             .order_by(OutboxMessage.chat_id, OutboxMessage.id)
+             .subquery())
+
+    due = (session
+           .query(first.c.id)
+           .filter(first.c.next_attempt_at <= dt.datetime.utcnow())
+           .order_by(first.c.id)
+           .limit(limit))
+
+    query = (session
+             .query(OutboxMessage.id,
+                    OutboxMessage.chat_id,
+                    OutboxMessage.method,
+                    OutboxMessage.payload,
+                    OutboxMessage.attempts)
+             .filter(OutboxMessage.id.in_(due.scalar_subquery()))
+             .order_by(OutboxMessage.id))
+
+    return [QueuedMessage(*row) for row in query]
+
+
+def record_attempts(session: Session, sent_ids: List[int], failures: List[SendFailure]) -> None:
+    """Удаление отправленных и отброшенных сообщений, планирование повторных попыток."""
+    dropped_ids = [failure.id for failure in failures if failure.retry_at is None]
+
+    if sent_ids or dropped_ids:
+        session.query(OutboxMessage).filter(
+            OutboxMessage.id.in_(sent_ids + dropped_ids),
+        ).delete(synchronize_session=False)
+
+    for failure in failures:
+        if failure.retry_at is not None:
+            session.query(OutboxMessage).filter(OutboxMessage.id == failure.id).update({
+                OutboxMessage.attempts: OutboxMessage.attempts + 1,
+                OutboxMessage.next_attempt_at: failure.retry_at,
+                OutboxMessage.last_error: failure.error,
+            }, synchronize_session=False)
+
+
+class OutboxDispatcher:
+    """Отправка сообщений из очереди `outbox`.
+
+    Сообщения добавляются в очередь в той же транзакции, что и изменения, к которым они относятся
+    (например, закрытие опроса), поэтому не теряются при сбоях и перезапуске бота: неотправленные
+    сообщения отправляются после запуска `run`. Сообщения одного чата отправляются по порядку,
+    частота отправки ограничивается `limiter`. После `RetryAfter` сообщение отправляется повторно
+    через указанное Telegram время, после прочих временных ошибок — с экспоненциально растущей
+    задержкой; после `max_attempts` попыток и при постоянных ошибках (бот заблокирован, чат не
+    найден и т. п.) сообщение удаляется из очереди.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        limiter: RateLimiter,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        base_delay: float = OUTBOX_BASE_DELAY,
+        max_delay: float = OUTBOX_MAX_DELAY,
+    ) -> None:
+        self.bot = bot
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def wake(self) -> None:
+        """Немедленная проверка очереди (после добавления сообщений)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        """Задержка перед следующей попыткой после `attempts` неудачных попыток."""
+        return min(self.max_delay, self.base_delay * 2 ** attempts)
+
+    async def _send(self, message: QueuedMessage) -> Optional[Tuple[Optional[float], str]]:
+        """Отправка сообщения.
+
+        :return: `None` при успешной отправке, иначе пара (задержка перед повторной попыткой
+            в секундах или `None`, если повторять не нужно; текст ошибки).
+        """
+        try:
+            await self.limiter.acquire(message.chat_id)
+            await getattr(self.bot, message.method)(chat_id=message.chat_id, **message.payload)
+        except RetryAfter as e:
+            self.limiter.pause(message.chat_id, e.timeout)
+            return float(e.timeout), str(e)
+        except (Unauthorized, BadRequest) as e:
+            logger.warning(f'Сообщение в чат {message.chat_id} не отправлено: {e}')
+            return None, str(e)
+        except Exception as e:
+            if message.attempts + 1 >= self.max_attempts:
+                logger.error(f'Сообщение в чат {message.chat_id} не отправлено '
+                             f'за {self.max_attempts} попыток: {e}')
+                return None, str(e)
+
+            return self.backoff(message.attempts), str(e)
+
+        return None
+
+    async def dispatch(self) -> int:
+        """Отправка одной пачки сообщений.
+
+        :return: количество сообщений в пачке.
+        """
+        messages = await run_in_session(fetch_due_messages, limit=self.batch_size)
+
+        if not messages:
+            return 0
+
+        started = time.monotonic()
+        outcomes = await asyncio.gather(*(self._send(message) for message in messages))
+        now = dt.datetime.utcnow()
+
+        sent_ids, failures = [], []
+
+        for message, outcome in zip(messages, outcomes):
+            if outcome is None:
+                sent_ids.append(message.id)
+                continue
+
+            delay, error = outcome
+            retry_at = now + dt.timedelta(seconds=delay) if delay is not None else None
+            failures.append(SendFailure(message.id, retry_at, error[:1000]))
+
+        await run_in_session(record_attempts, sent_ids=sent_ids, failures=failures)
+
+        logger.debug(f'Очередь сообщений: отправлено {len(sent_ids)}, ошибок {len(failures)} '
+                     f'за {time.monotonic() - started:.2f} с')
+
+        return len(messages)
+
+    async def run(self) -> None:
+        """Отправка сообщений по мере их появления в очереди (только в ведущем процессе)."""
+        self._wakeup = asyncio.Event()
+
+        try:
+            while True:
+                self._wakeup.clear()
+
+                try:
+                    num_messages = await self.dispatch()
+                except Exception:
+                    logger.exception('Ошибка при отправке сообщений из очереди')
+                    num_messages = 0
+
+                if num_messages:
+                    continue
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
@@ -0,0 +1,216 @@
+"""Статистика выбора мест в чатах: сколько раз место побеждало в опросах чата и сколько голосов
+за него было отдано.
+
+Статистика обновляется при подведении итогов опросов (`update_place_stats`) и используется для
+выбора вариантов ответа в новых опросах (`select_poll_options`). Полный пересчет по сохраненным
+опросам (`recompute_place_stats`) запускается из каталога `src`:
+
+    python -m place_stats
+
+Опросы старше `POLLS_RETENTION_DAYS` дней удаляются (см. `retention`), поэтому пересчет мог бы
+потерять накопленную по ним статистику; в этом случае пересчет не выполняется без флага `--force`.
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import session_scope
+from database.tables import PlaceStat, Poll, PollOption, PollVote
+from utils import MIN_VOTES_FOR_ORDER, rank_polls_winners
+
+
+# ограничение Telegram на количество вариантов ответа в опросе
+MAX_POLL_OPTIONS = 10
+
+TPollOption = Tuple[int, str]
+
+
+def count_place_votes(session: Session, poll_ids: List[str]) -> Dict[Tuple[int, int], int]:
+    """Количество голосов в опросах по парам (ID чата, ID места)."""
+    query = (session
+             .query(Poll.chat_id, PollOption.option_id, func.count(PollVote.id))
+             .join(PollVote, PollVote.poll_id == Poll.id)
+             .join(PollOption, (PollOption.poll_id == PollVote.poll_id) &
+                   (PollOption.position == PollVote.option_number))
+             .filter(Poll.id.in_(poll_ids))
+             .group_by(Poll.chat_id, PollOption.option_id)
+             )
+
+    return {(chat_id, place_id): num_votes for chat_id, place_id, num_votes in query}
+
+
+def update_place_stats(
+    session: Session,
+    poll_ids: List[str],
+    wins: Sequence[Tuple[int, int]] = (),
+) -> None:
+    """Добавление к статистике голосов из завершившихся опросов и побед мест.
+
+    Вызывается в той же транзакции, что и закрытие опросов, поэтому опрос учитывается ровно
+    один раз.
+
+    :param poll_ids: ID завершившихся опросов.
+    :param wins: пары (ID чата, ID места-победителя).
+    """
+    stats = {key: [0, num_votes] for key, num_votes in count_place_votes(session, poll_ids).items()}
+
+    for key in wins:
+        stats.setdefault(key, [0, 0])[0] += 1
+
+    if not stats:
+        return
+
+    statement = insert(PlaceStat).values([
+        {'chat_id': chat_id, 'place_id': place_id, 'wins': num_wins, 'votes': num_votes}
+        for (chat_id, place_id), (num_wins, num_votes) in stats.items()
+    ])
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[PlaceStat.chat_id, PlaceStat.place_id],
+        set_={
+            'wins': PlaceStat.wins + statement.excluded.wins,
+            'votes': PlaceStat.votes + statement.excluded.votes,
+        },
+    ))
+
+
+def get_top_places(session: Session, chat_id: int, limit: int = MAX_POLL_OPTIONS) -> List[int]:
+    """ID мест, чаще всего побеждавших в опросах чата (не более `limit`)."""
+    query = (session
+             .query(PlaceStat.place_id)
+             .filter(PlaceStat.chat_id == chat_id)
+             .order_by(PlaceStat.wins.desc(), PlaceStat.votes.desc())
+             .limit(limit)
+             )
+
+    return [place_id for place_id, in query]
+
+
+def select_poll_options(
+    options: List[TPollOption],
+    top_place_ids: List[int],
+    not_delivery_ids: List[int],
+    limit: int = MAX_POLL_OPTIONS,
+) -> List[TPollOption]:
+    """Выбор вариантов ответа для опроса в чате.
+
+    В опрос всегда входят места без доставки, затем — популярные в чате места, оставшиеся
+    варианты заполняются местами в порядке справочника. Порядок вариантов совпадает с порядком
+    справочника.
+
+    :param options: все варианты ответа (пары вида (ID места, название)).
+    :param top_place_ids: ID популярных в чате мест по убыванию популярности.
+    :param not_delivery_ids: ID мест без доставки.
+    :param limit: максимальное количество вариантов ответа.
+    """
+    if len(options) <= limit:
+        return options
+
+    positions = {place_id: i for i, (place_id, _) in enumerate(options)}
+    chosen: Dict[int, None] = {}
+
+    for place_id in (*not_delivery_ids, *top_place_ids, *positions):
+        if len(chosen) == limit:
+            break
+
+        if place_id in positions:
+            chosen[place_id] = None
+
+    return [options[i] for i in sorted(positions[place_id] for place_id in chosen)]
+
+
+def recompute_place_stats(session: Session, force: bool = False) -> Optional[int]:
+    """Пересчет статистики по всем закрытым опросам, сохраненным в БД.
+
+    Опросы, удаленные по сроку хранения (см. `retention`), в пересчете не участвуют. Если после
+    пересчета количество голосов за какое-либо место уменьшилось бы (статистика учитывает
+    удаленные опросы), пересчет выполняется только при `force=True`. Количество побед для этой
+    проверки не подходит: при равенстве голосов победитель при закрытии опроса выбирается
+    случайно, а при пересчете — вариант с наименьшим номером, поэтому победа может перейти к
+    другому месту. Удаленный опрос с победителем всегда уменьшает и количество голосов.
+
+    :param force: пересчитать статистику, даже если часть ее будет потеряна.
+    :return: количество записей статистики или `None`, если пересчет не выполнен.
+    """
+    votes = (select(Poll.chat_id,
+                    PollVote.poll_id,
+                    PollVote.option_number,
+                    func.count().label('num_votes'))
+             .join(PollVote, PollVote.poll_id == Poll.id)
+             .where(Poll.is_closed == True)
+             .group_by(Poll.chat_id, PollVote.poll_id, PollVote.option_number)
+             .subquery())
+    winners = rank_polls_winners(votes, random_ties=False).subquery()
+
+    place_votes = (select(votes.c.chat_id,
+                          PollOption.option_id,
+                          func.sum(votes.c.num_votes).label('votes'))
+                   .join(PollOption, (PollOption.poll_id == votes.c.poll_id) &
+                         (PollOption.position == votes.c.option_number))
+                   .group_by(votes.c.chat_id, PollOption.option_id)
+                   .subquery())
+    place_wins = (select(winners.c.chat_id,
+                         PollOption.option_id,
+                         func.count().label('wins'))
+                  .join(PollOption, (PollOption.poll_id == winners.c.poll_id) &
+                        (PollOption.position == winners.c.option_number))
+                  .where(winners.c.num_votes >= MIN_VOTES_FOR_ORDER)
+                  .group_by(winners.c.chat_id, PollOption.option_id)
+                  .subquery())
+
+    stats = (select(place_votes.c.chat_id,
+                    place_votes.c.option_id,
+                    func.coalesce(place_wins.c.wins, 0).label('wins'),
+                    place_votes.c.votes)
+             .outerjoin(place_wins, (place_wins.c.chat_id == place_votes.c.chat_id) &
+                        (place_wins.c.option_id == place_votes.c.option_id)))
+
+    # строки статистики вычисляются один раз и используются и для проверки, и для записи
+    rows = session.execute(stats).all()
+    new_votes = {(chat_id, place_id): num_votes for chat_id, place_id, _, num_votes in rows}
+    num_reduced = sum(
+        num_votes > new_votes.get((chat_id, place_id), 0)
+        for chat_id, place_id, num_votes in session.query(
+            PlaceStat.chat_id, PlaceStat.place_id, PlaceStat.votes,
+        )
+    )
+
+    if num_reduced:
+        logger.warning(f'Пересчет уменьшит статистику {num_reduced} мест (например, статистика '
+                       f'учитывает опросы, удаленные по сроку хранения)')
+
+        if not force:
+            return None
+
+    session.execute(delete(PlaceStat))
+
+    if rows:
+        session.execute(insert(PlaceStat).values([
+            {'chat_id': chat_id, 'place_id': place_id, 'wins': wins, 'votes': num_votes}
+            for chat_id, place_id, wins, num_votes in rows
+        ]))
+
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пересчет статистики мест по сохраненным опросам')
+    parser.add_argument('--force', action='store_true',
+                        help='пересчитать, даже если статистика удаленных опросов будет потеряна')
+    args = parser.parse_args()
+    started = time.monotonic()
+
+    with session_scope() as session:
+        num_rows = recompute_place_stats(session, force=args.force)
+
+    if num_rows is None:
+        logger.error('Статистика не пересчитана; для пересчета запустите с флагом --force')
+        sys.exit(1)
+
+    logger.info(f'Статистика мест пересчитана за {time.monotonic() - started:.1f} с, '
+                f'записей: {num_rows}')
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from database.tables import Place
+
+
+PLACES_CHANNEL = 'places_changed'
+PLACES_TTL = 600
+
+
+class PlaceRecord(NamedTuple):
+    id: int
+    name: str
+    url: Optional[str]
+    place_type_id: int
+    choice_message: Optional[str]
+    is_delivery: bool
+
+
+def load_places(session: Session) -> Tuple[PlaceRecord, ...]:
+    """Чтение всех мест для заказа в порядке следования вариантов ответа в опросе."""
+    query = (session
+             .query(Place.id,
+                    Place.name,
+                    Place.url,
+                    Place.place_type_id,
+                    Place.choice_message,
+                    Place.is_delivery,
+                    )
+             .order_by(Place.place_type_id, Place.id)
+             )
+
+    return tuple(PlaceRecord(*row) for row in query)
+
+
+class PlacesCatalog:
+    """Справочник мест для заказа, общий для всех обработчиков.
+
+    Справочник читается из БД один раз и перечитывается при получении уведомления об изменении
+    таблицы `places` (триггер `places_changed`), а также если с момента последнего чтения
+    прошло больше `ttl` секунд. При каждом изменении данных увеличивается номер версии и
+    вызываются функции, переданные в `subscribe`.
+    """
+
+    def __init__(self, ttl: float = PLACES_TTL) -> None:
+        self.ttl = ttl
+        self.places: Tuple[PlaceRecord, ...] = ()
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self.refresh_duration: Optional[float] = None
+        self._callbacks: List[Callable[['PlacesCatalog'], None]] = []
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_pending = False
+
+    @property
+    def has_data(self) -> bool:
+        return bool(self.places)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Время в секундах, прошедшее с последнего чтения справочника из БД."""
+        return time.monotonic() - self.loaded_at if self.loaded_at is not None else None
+
+    @property
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or self.age > self.ttl
+
+    @property
+    def poll_options(self) -> List[Tuple[int, str]]:
+        """Варианты ответа для опроса: пары вида (ID места, название)."""
+        return [(place.id, place.name) for place in self.places]
+
+    def subscribe(self, callback: Callable[['PlacesCatalog'], None]) -> None:
+        self._callbacks.append(callback)
+
+    def set_places(self, places: Tuple[PlaceRecord, ...]) -> None:
+        self.loaded_at = time.monotonic()
+
+        if places == self.places and self.version:
+            return
+
+        self.places = places
+        self.version += 1
+        logger.info(f'Справочник мест обновлен, версия {self.version}, мест: {len(places)}')
+
+        for callback in self._callbacks:
+            callback(self)
+
+    async def refresh(self) -> None:
+        """Чтение справочника из БД."""
+        started = time.monotonic()
+        places = await run_in_session(load_places)
+        self.refresh_duration = time.monotonic() - started
+        logger.debug(f'Справочник мест прочитан за {self.refresh_duration:.3f} с')
+        self.set_places(places)
+
+    async def refresh_if_stale(self) -> None:
+        if self.is_stale:
+            await self.refresh()
+
+    def request_refresh(self, *_) -> None:
+        """Запуск чтения справочника в фоне.
+
+        Запросы, полученные во время чтения, объединяются в одно повторное чтение.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_pending = True
+            return
+
+        self._refresh_task = asyncio.ensure_future(self._refresh_in_background())
+
+    async def _refresh_in_background(self) -> None:
+        while True:
+            self._refresh_pending = False
+
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('Ошибка при обновлении справочника мест')
+
+            if not self._refresh_pending:
+                break
+
+
+places_catalog = PlacesCatalog()
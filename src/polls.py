@@ -1,45 +1,69 @@
-from typing import Optional, Union
+import asyncio
+import datetime as dt
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
-import pandas as pd
 from aiogram import Bot, types
 from aiogram.types import ParseMode
-from aiogram.utils.exceptions import BotBlocked, ChatNotFound
-from dateutil.relativedelta import relativedelta
+from aiogram.utils.exceptions import BotBlocked, ChatNotFound, RetryAfter
 from loguru import logger
+from sqlalchemy import insert, tuple_
 from sqlalchemy.orm import Session
-from workalendar.europe import Russia
 
-from database import ENGINE, QUERY_WINDOW_SIZE, session_scope
-from database.tables import ChatTimezone, Place, Poll, PollOption, PollVote, Subscription
+from calendars import CalendarService, calendars
+from chat_settings import chat_settings
+from database import run_in_session
+from database.listener import notify
+from database.tables import Place, Poll, PollOption, PollVote, Subscription
+from deadlines import POLLS_CHANNEL, DeadlineScheduler, get_open_polls
+from outbox import OutboxDispatcher, OutgoingMessage, enqueue_messages
+from place_stats import (
+    MAX_POLL_OPTIONS,
+    get_top_places,
+    select_poll_options,
+    update_place_stats,
+)
+from schedule import mailing_schedule, notify_chat_changed
+from sending import FanOut, RateLimiter
 from translation import Translation
-from utils import PlacesInfo, get_polls_votes, get_polls_winners, get_utc_now
+from users import UserDirectory
+from utils import MIN_VOTES_FOR_ORDER, PlacesInfo, get_utc_now, select_polls_winners
+from votes import VoteBuffer
 
 
 DEFAULT_POLL_OPEN_PERIOD = 300
-MIN_VOTES_FOR_ORDER = 2
 
 
 def on_poll_creation(
     poll: types.Poll,
     chat_id: int,
     session: Session,
-    options: Optional[pd.DataFrame] = None,
+    option_ids: Optional[Sequence[int]] = None,
 ) -> None:
-    """Действия после создания опроса."""
+    """Действия после создания опроса.
+
+    Опрос и его варианты ответа сохраняются в одной транзакции, варианты ответа — одним
+    многострочным INSERT. После фиксации транзакции все процессы бота получают уведомление
+    `POLLS_CHANNEL` о новом опросе.
+
+    :param poll: созданный опрос.
+    :param chat_id: ID чата.
+    :param session: экземпляр сессии.
+    :param option_ids: ID мест в порядке следования вариантов ответа.
+    """
     session.add(
         Poll(id=poll.id, chat_id=chat_id, open_period=poll.open_period)
     )
-    session.commit()
 
-    if options is not None:
-        options = pd.DataFrame({
-            'poll_id': poll.id,
-            'position': options.index,
-            'option_id': options.id,
-        })
+    if option_ids:
+        session.execute(
+            insert(PollOption).values([
+                {'poll_id': poll.id, 'position': position, 'option_id': option_id}
+                for position, option_id in enumerate(option_ids)
+            ])
+        )
 
-        options.to_sql(PollOption.__tablename__, ENGINE, if_exists='append', index=False)
+    notify(session, POLLS_CHANNEL, f'{poll.id}:{poll.open_period or 0}')
 
 
 class PollActions:
@@ -49,231 +73,496 @@ class PollActions:
         open_period: int = DEFAULT_POLL_OPEN_PERIOD,
         places_info: Optional[PlacesInfo] = None,
         translation: Optional[Translation] = None,
+        limiter: Optional[RateLimiter] = None,
+        calendar_service: Optional[CalendarService] = None,
+        results_delay: float = 0,
     ) -> None:
         self.bot = bot
         self.open_period = open_period
-        self.cal = Russia()
+        # задержка подведения итогов после завершения опроса, за которую другие процессы бота
+        # успевают записать в БД накопленные ответы
+        self.results_delay = results_delay
+        self.calendars = calendar_service or calendars
         self.places_info = places_info or PlacesInfo()
         self.translation = translation or Translation()
+        self.limiter = limiter or RateLimiter()
+        self.fan_out = FanOut(limiter=self.limiter)
+        self.deadlines = DeadlineScheduler(self.send_polls_results)
+        self.votes = VoteBuffer()
+        self.users = UserDirectory()
+        self.outbox = OutboxDispatcher(bot, limiter=self.limiter)
 
     async def create_lunch_poll(self, chat_id: int) -> None:
-        """Создание и отправка опроса."""
-        with session_scope() as session:
-            query = (session
-                     .query(Place.id, Place.name)
-                     .order_by(Place.place_type_id, Place.id)
-                     )
-
-            options = pd.read_sql(query.statement, ENGINE)
-
-            if options.empty:
-                await self.bot.send_message(chat_id=chat_id, text='Нет данных для создания опроса')
-                return
-
-            msg = await self.bot.send_poll(
-                chat_id=chat_id,
-                question='Откуда заказываем / куда идем?',
-                options=options.name.to_list(),
-                is_anonymous=False,
-                open_period=self.open_period,
+        """Создание и отправка опроса.
+
+        Если мест больше, чем вариантов ответа в опросе, в опрос попадают места без доставки и
+        места, чаще всего выбираемые в чате (см. `place_stats`).
+        """
+        options = self.places_info.catalog.poll_options
+
+        if not options:
+            await self.bot.send_message(chat_id=chat_id, text='Нет данных для создания опроса')
+            return
+
+        if len(options) > MAX_POLL_OPTIONS:
+            top_place_ids = await run_in_session(get_top_places, chat_id=chat_id)
+            options = select_poll_options(
+                options,
+                top_place_ids=top_place_ids,
+                not_delivery_ids=self.places_info.not_delivery_ids,
             )
 
-            on_poll_creation(poll=msg.poll, chat_id=chat_id, session=session, options=options)
+        msg = await self.bot.send_poll(
+            chat_id=chat_id,
+            question='Откуда заказываем / куда идем?',
+            options=[name for _, name in options],
+            is_anonymous=False,
+            open_period=self.open_period,
+        )
+        self.users.add_poll(msg.poll.id, chat_id)
+
+        await run_in_session(
+            on_poll_creation,
+            poll=msg.poll,
+            chat_id=chat_id,
+            option_ids=[place_id for place_id, _ in options],
+        )
+
+        if self.deadlines.is_running:
+            self.push_deadline(msg.poll.id, open_period=msg.poll.open_period or 0)
+
+    async def send_scheduled_poll(self, chat_id: int) -> None:
+        try:
+            await self.create_lunch_poll(chat_id=chat_id)
+        except BotBlocked:
+            logger.info('bot id=%d is blocked for chat id=%d, removing' %
+                        (self.bot.id, chat_id))
+
+            await run_in_session(remove_subscription, bot_id=self.bot.id, chat_id=chat_id)
+            chat_settings.invalidate(chat_id)
+            mailing_schedule.remove(chat_id)
 
     async def send_lunch_poll(self) -> None:
         """Создание и отправка опроса по расписанию."""
         now = get_utc_now()
 
-        with session_scope() as session:
-            idx = 0
-            query_subs = (session
-                          .query(Subscription.chat_id,
-                                 Subscription.mailing_time,
-                                 ChatTimezone.sign,
-                                 ChatTimezone.offset,
-                                 )
-                          .filter(Subscription.bot_id == self.bot.id)
-                          .join(ChatTimezone, Subscription.chat_id == ChatTimezone.chat_id)
-                          )
-
-            while True:
-                start, stop = QUERY_WINDOW_SIZE * idx, QUERY_WINDOW_SIZE * (idx + 1)
-                instances = query_subs.slice(start, stop).all()
-
-                if instances is None:
-                    break
-
-                for (chat_id, mailing_time, sign, offset) in instances:
-                    current_time = (
-                        now + sign * relativedelta(hours=offset.hour, minutes=offset.minute)
-                    )
-
-                    if not self.cal.is_working_day(current_time.date()):
-                        continue
-
-                    if mailing_time == current_time.time():
-                        try:
-                            await self.create_lunch_poll(chat_id=chat_id)
-                        except BotBlocked:
-                            logger.info('bot id=%d is blocked for chat id=%d, removing' %
-                                        (self.bot.id, chat_id))
-                            query_subs.filter(Subscription.chat_id == chat_id).delete()
-
-                if len(instances) < QUERY_WINDOW_SIZE:
-                    break
-
-                idx += 1
-
-    @staticmethod
-    async def process_user_answer(ans: types.PollAnswer) -> None:
-        """Добавление/обновление ответа пользователя на опрос."""
-        poll_id = ans.poll_id
-        user_id = ans.user.id
+        chat_ids = [
+            chat_id for chat_id, current_time in mailing_schedule.due(now)
+            if self.calendars.is_working_day(
+                current_time.date(), mailing_schedule.get(chat_id).calendar,
+            )
+        ]
+
+        await self.fan_out.run(chat_ids, self.send_scheduled_poll, name='Рассылка опросов')
+
+    def push_deadline(
+        self,
+        poll_id: str,
+        deadline: Optional[dt.datetime] = None,
+        open_period: int = 0,
+    ) -> None:
+        """Добавление опроса в очередь подведения итогов.
+
+        :param poll_id: ID опроса.
+        :param deadline: время завершения опроса по UTC; по умолчанию — через `open_period`
+            секунд.
+        :param open_period: время в секундах, в течение которого опрос будет активен.
+        """
+        if deadline is None:
+            deadline = dt.datetime.utcnow() + dt.timedelta(seconds=open_period)
+
+        self.deadlines.push(poll_id, deadline + dt.timedelta(seconds=self.results_delay))
+
+    async def load_deadlines(self) -> None:
+        """Заполнение очереди сроков завершения незакрытыми опросами из БД."""
+        self.deadlines.clear()
+
+        for poll_id, deadline in await run_in_session(get_open_polls):
+            self.push_deadline(poll_id, deadline)
+
+        logger.info(f'Загружены сроки завершения опросов: {len(self.deadlines)}')
+
+    async def run_deadlines(self) -> None:
+        """Подведение итогов опросов в моменты их завершения (только в ведущем процессе)."""
+        await self.load_deadlines()
+        await self.deadlines.run()
 
-        with session_scope() as session:
-            if ans.option_ids:
-                objs = []
+    def on_poll_created(self, payload: str) -> None:
+        """Обработка уведомления `POLLS_CHANNEL` о создании опроса любым из процессов бота."""
+        if not self.deadlines.is_running:
+            return
 
-                for option_id in ans.option_ids:
-                    obj = PollVote(poll_id=poll_id, user_id=user_id, option_number=option_id)
-                    objs.append(obj)
+        poll_id, open_period = payload.rsplit(':', 1)
+        self.push_deadline(poll_id, open_period=int(open_period))
 
-                session.bulk_save_objects(objs)
-            else:
-                # отмена голоса
-                session.query(PollVote).filter(PollVote.poll_id == poll_id,
-                                               PollVote.user_id == user_id).delete()
+    async def process_poll_update(self, poll: types.Poll) -> None:
+        """Обработка закрытия опроса до истечения срока (например, при остановке опроса)."""
+        if poll.is_closed and self.deadlines.is_running:
+            self.push_deadline(poll.id)
+
+    async def process_user_answer(self, ans: types.PollAnswer) -> None:
+        """Добавление/обновление ответа пользователя на опрос."""
+        self.votes.add(poll_id=ans.poll_id, user_id=ans.user.id, option_ids=ans.option_ids)
+        self.users.add_answer(ans.poll_id, ans.user)
 
     async def get_customer(
         self,
-        session: Session,
         chat_id: int,
-        poll_id: str,
-        last_customer_id: int,
+        user_ids: Set[int],
+        last_customer_id: Optional[int],
     ) -> Union[types.User, None]:
         """Определение пользователя для создания заказа.
 
-        :param session: экземпляр сессии.
+        Данные пользователя берутся из `UserDirectory`; запрос к Telegram выполняется, только если
+        пользователя там нет.
+
         :param chat_id: ID чата.
-        :param poll_id: ID опроса.
+        :param user_ids: ID пользователей, проголосовавших за вариант с доставкой.
         :param last_customer_id: ID пользователя, который был выбран в прошлый раз.
         :return: случайный пользователь, проголосовавший за вариант с доставкой,
         который не был выбран в предыдущий раз.
         """
-        query = session.query(
-            PollVote.user_id,
-        ).join(
-            PollOption,
-            (PollOption.poll_id == PollVote.poll_id) &
-            (PollOption.position == PollVote.option_number)
-        ).filter(
-            PollVote.poll_id == poll_id,
-            PollOption.option_id.not_in(self.places_info.not_delivery_ids),
-        )
+        user_ids = user_ids - {last_customer_id}
 
-        user_ids = set(x for x, in query.all())
+        if not user_ids:
+            return None
 
-        if last_customer_id in user_ids:
-            user_ids.remove(last_customer_id)
+        user_id = int(np.random.choice(list(user_ids)))
+        chosen_user = self.users.get(chat_id, user_id)
 
-        chosen_user = None
+        if chosen_user is not None:
+            return chosen_user
 
+        # запросы к Telegram ограничиваются так же, как отправка сообщений; ошибка в одном чате
+        # не должна мешать подведению итогов в остальных, поэтому пользователь не выбирается
         try:
-            chat_member = await self.bot.get_chat_member(
-                chat_id=chat_id,
-                user_id=np.random.choice(list(user_ids))
-            )
+            await self.limiter.acquire(chat_id)
+            chat_member = await self.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
             chosen_user = chat_member.user
+            self.users.add(chat_id, chosen_user)
         except ChatNotFound:
             logger.info(f'Нет доступа к чату {chat_id}, пользователь не определен')
+        except RetryAfter as e:
+            self.limiter.pause(chat_id, e.timeout)
+            logger.warning(f'Пользователь в чате {chat_id} не определен: {e}')
+        except Exception:
+            logger.exception(f'Ошибка при получении пользователя {user_id} в чате {chat_id}')
 
         return chosen_user
 
-    async def send_polls_results(self) -> None:
-        """Отправка информации о результатах опроса."""
-        with session_scope() as session:
-            votes = get_polls_votes(session)
-            winners = get_polls_winners(votes)
-            chats_to_process = winners.chat_id.unique().tolist()
-
-            query_customer = session.query(
-                Subscription.chat_id,
-                Subscription.last_customer_id,
-            ).filter(Subscription.chat_id.in_(chats_to_process))
-
-            last_customers = dict(query_customer.all())
-            polls_to_close = []
-
-            for poll_id, row in winners.iterrows():
-                chat_id = row.chat_id
-
-                if row.num_votes < MIN_VOTES_FOR_ORDER:
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=self.translation.not_enough_votes_to_delivery,
-                    )
-                    polls_to_close.append(poll_id)
-                    continue
-
-                name, url, choice_message = (
-                    session
-                    .query(Place.name, Place.url, Place.choice_message)
-                    .join(PollOption, Place.id == PollOption.option_id)
-                    .filter(PollOption.poll_id == poll_id,
-                            PollOption.position == row.option_number,
-                            )
-                    .one()
+    async def build_poll_result(
+        self,
+        result: 'PollResult',
+        last_customer_id: Optional[int],
+    ) -> Tuple[List[OutgoingMessage], Optional[types.User]]:
+        """Сообщения с результатами опроса для отправки в чат.
+
+        :return: сообщения и пользователь, выбранный для создания заказа.
+        """
+        chat_id = result.chat_id
+
+        if result.num_votes < MIN_VOTES_FOR_ORDER:
+            return [OutgoingMessage(chat_id, 'send_message', {
+                'text': self.translation.not_enough_votes_to_delivery,
+            })], None
+
+        if result.choice_message:
+            return [OutgoingMessage(chat_id, 'send_message', {
+                'text': result.choice_message,
+            })], None
+
+        if result.name is None:
+            return [], None
+
+        url_keyboard = types.InlineKeyboardMarkup().row(
+            types.InlineKeyboardButton(text=self.translation.go_to_site, url=result.url)
+        )
+
+        customer_text = ''
+
+        user = await self.get_customer(
+            chat_id=chat_id,
+            user_ids=result.voters,
+            last_customer_id=last_customer_id,
+        )
+
+        if user:
+            customer_text = f'\n{user.mention}, я выбираю тебя!'
+
+        return [OutgoingMessage(chat_id, 'send_message', {
+            'text': f'Заказываем из *«{result.name}»*' + customer_text,
+            'parse_mode': ParseMode.MARKDOWN,
+            'reply_markup': url_keyboard.to_python(),
+        })], user
+
+    async def build_chat_results(self, chat_results: List['PollResult']) -> 'ChatResults':
+        """Сообщения с результатами опросов одного чата.
+
+        Пользователь для заказа выбирается по очереди для каждого опроса, чтобы в нескольких
+        опросах чата подряд не выбирался один и тот же пользователь. Опросы, итоги которых не
+        удалось подвести, не мешают остальным опросам чата и возвращаются в `failed`.
+
+        :param chat_results: результаты опросов чата.
+        :return: сообщения, выбранные пользователи и закрываемые опросы.
+        """
+        built = ChatResults(messages=[], customers={}, closed=[], failed=[])
+        last_customer_id = chat_results[0].last_customer_id
+
+        for result in chat_results:
+            try:
+                messages, user = await self.build_poll_result(
+                    result, last_customer_id=last_customer_id,
                 )
+            except Exception:
+                logger.exception(f'Ошибка при подведении итогов опроса {result.poll_id}')
+                built.failed.append(result.poll_id)
+                continue
 
-                if choice_message:
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=choice_message,
-                    )
-                else:
-                    url_keyboard = types.InlineKeyboardMarkup().row(
-                        types.InlineKeyboardButton(text=self.translation.go_to_site, url=url)
-                    )
-
-                    customer_text = ''
-
-                    user = await self.get_customer(
-                        session=session,
-                        chat_id=chat_id,
-                        poll_id=poll_id,
-                        last_customer_id=last_customers[chat_id],
-                    )
-
-                    if user:
-                        customer_text = f'\n{user.mention}, я выбираю тебя!'
-                        last_customers[chat_id] = user.id
-
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=f'Заказываем из *«{name}»*' + customer_text,
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=url_keyboard,
-                    )
-
-                polls_to_close.append(poll_id)
-
-            subs = session.query(Subscription).filter(
-                Subscription.chat_id.in_(chats_to_process)
-            )
+            built.messages.extend(messages)
+            built.closed.append(result)
 
-            # TODO: переписать на bulk_update_mappings
-            for row in subs:
-                row.last_customer_id = last_customers[row.chat_id]
+            if user:
+                last_customer_id = user.id
 
-            # Проставление флага закрытия для обработанных опросов
-            session.query(Poll).filter(Poll.id.in_(polls_to_close)).update({Poll.is_closed: True})
+                if result.subscription_id is not None:
+                    built.customers[result.subscription_id] = user.id
 
+        return built
 
-def _clean_polls():
-    with session_scope() as session:
-        polls_to_delete = session.query(Poll.id).filter(Poll.is_closed == True).all()
-        polls_to_delete = [x[0] for x in polls_to_delete]
+    def retry_polls_results(self, poll_ids: List[str]) -> None:
+        """Повторное подведение итогов опросов через `retry_delay` секунд; опросы остаются
+        открытыми."""
+        retry_at = dt.datetime.utcnow() + dt.timedelta(seconds=self.deadlines.retry_delay)
 
-        session.query(PollVote).filter(PollVote.poll_id.in_(polls_to_delete)).delete()
-        session.query(PollOption).filter(PollOption.poll_id.in_(polls_to_delete)).delete()
-        session.query(Poll).filter(Poll.id.in_(polls_to_delete)).delete()
+        for poll_id in poll_ids:
+            self.push_deadline(poll_id, deadline=retry_at)
+
+    async def close_polls_results(self, built: 'ChatResults') -> None:
+        """Закрытие опросов и постановка сообщений с результатами в очередь `outbox`.
+
+        Сообщения добавляются в одной транзакции с закрытием опросов, поэтому результаты
+        закрытого опроса не теряются при ошибках отправки.
+        """
+        if not built.closed:
+            return
+
+        await run_in_session(
+            close_polls,
+            poll_ids=[result.poll_id for result in built.closed],
+            customers=built.customers,
+            wins=[
+                (result.chat_id, result.place_id) for result in built.closed
+                if result.place_id is not None
+            ],
+            messages=built.messages,
+        )
+        self.outbox.wake()
+
+        for chat_id in {result.chat_id for result in built.closed}:
+            chat_settings.invalidate(chat_id)
+
+    async def send_polls_results(self, poll_ids: List[str]) -> None:
+        """Отправка информации о результатах опросов.
+
+        :param poll_ids: ID завершившихся опросов.
+        """
+        await self.votes.flush()
+
+        results = await run_in_session(
+            get_polls_results,
+            poll_ids=poll_ids,
+            not_delivery_ids=self.places_info.not_delivery_ids,
+        )
+        results_by_chat: Dict[int, List[PollResult]] = {}
+
+        for result in results:
+            results_by_chat.setdefault(result.chat_id, []).append(result)
+
+        # пользователи, которых нет в `self.users`, запрашиваются у Telegram параллельно с
+        # ограничением частоты `self.limiter`; ошибки запросов не прерывают подведение итогов
+        built = ChatResults.merge(await asyncio.gather(
+            *map(self.build_chat_results, results_by_chat.values())
+        ))
+
+        self.retry_polls_results(built.failed)
+        await self.close_polls_results(built)
+
+
+class PollResult(NamedTuple):
+    poll_id: str
+    chat_id: int
+    num_votes: int
+    subscription_id: Optional[int] = None
+    last_customer_id: Optional[int] = None
+    place_id: Optional[int] = None
+    name: Optional[str] = None
+    url: Optional[str] = None
+    choice_message: Optional[str] = None
+    voters: Set[int] = frozenset()
+
+
+class ChatResults(NamedTuple):
+    """Итоги опросов, подготовленные для закрытия."""
+
+    messages: List[OutgoingMessage]
+    # ID подписки -> ID пользователя, выбранного для заказа
+    customers: Dict[int, int]
+    closed: List[PollResult]
+    # ID опросов, итоги которых не удалось подвести
+    failed: List[str]
+
+    @classmethod
+    def merge(cls, items: Sequence['ChatResults']) -> 'ChatResults':
+        merged = cls(messages=[], customers={}, closed=[], failed=[])
+
+        for item in items:
+            merged.messages.extend(item.messages)
+            merged.customers.update(item.customers)
+            merged.closed.extend(item.closed)
+            merged.failed.extend(item.failed)
+
+        return merged
+
+
+def remove_subscription(session: Session, bot_id: int, chat_id: int) -> None:
+    session.query(Subscription).filter(
+        Subscription.bot_id == bot_id,
+        Subscription.chat_id == chat_id,
+    ).delete()
+
+    notify_chat_changed(session, chat_id)
+
+
+def get_delivery_voters(
+    session: Session,
+    poll_ids: List[str],
+    not_delivery_ids: List[int],
+) -> Dict[str, Set[int]]:
+    """ID пользователей, проголосовавших в опросах за варианты с доставкой, по ID опросов."""
+    query = session.query(
+        PollVote.poll_id,
+        PollVote.user_id,
+    ).join(
+        PollOption,
+        (PollOption.poll_id == PollVote.poll_id) &
+        (PollOption.position == PollVote.option_number)
+    ).filter(
+        PollVote.poll_id.in_(poll_ids),
+        PollOption.option_id.not_in(not_delivery_ids),
+    )
+
+    voters: Dict[str, Set[int]] = {}
+
+    for poll_id, user_id in query:
+        voters.setdefault(poll_id, set()).add(user_id)
+
+    return voters
+
+
+def get_polls_results(
+    session: Session,
+    poll_ids: List[str],
+    not_delivery_ids: List[int],
+) -> List[PollResult]:
+    """Результаты завершившихся опросов.
+
+    Независимо от количества опросов выполняется фиксированное число запросов: победители
+    опросов, подписки чатов, выбранные места и проголосовавшие за доставку пользователи.
+    """
+    winners = select_polls_winners(session, poll_ids)
+
+    if not winners:
+        return []
+
+    query_subs = session.query(
+        Subscription.chat_id,
+        Subscription.id,
+        Subscription.last_customer_id,
+    ).filter(Subscription.chat_id.in_({row.chat_id for row in winners}))
+
+    subscriptions = {
+        chat_id: (subs_id, customer_id) for chat_id, subs_id, customer_id in query_subs
+    }
+
+    enough_votes = [
+        (row.poll_id, row.option_number) for row in winners
+        if row.num_votes >= MIN_VOTES_FOR_ORDER
+    ]
+
+    places = {}
+    voters = {}
+
+    if enough_votes:
+        query_places = (
+            session
+            .query(PollOption.poll_id, Place.id, Place.name, Place.url, Place.choice_message)
+            .join(PollOption, Place.id == PollOption.option_id)
+            .filter(tuple_(PollOption.poll_id, PollOption.position).in_(enough_votes))
+        )
+
+        places = {poll_id: place for poll_id, *place in query_places}
+
+        delivery_polls = [poll_id for poll_id, (*_, message) in places.items() if not message]
+
+        if delivery_polls:
+            voters = get_delivery_voters(session, delivery_polls, not_delivery_ids)
+
+    results = []
+
+    for row in winners:
+        subscription_id, last_customer_id = subscriptions.get(row.chat_id, (None, None))
+
+        result = PollResult(
+            poll_id=row.poll_id,
+            chat_id=row.chat_id,
+            num_votes=row.num_votes,
+            subscription_id=subscription_id,
+            last_customer_id=last_customer_id,
+        )
+
+        if row.poll_id in places:
+            place_id, name, url, choice_message = places[row.poll_id]
+
+            result = result._replace(
+                place_id=place_id,
+                name=name,
+                url=url,
+                choice_message=choice_message,
+                voters=voters.get(row.poll_id, set()),
+            )
+        elif row.num_votes >= MIN_VOTES_FOR_ORDER:
+            logger.warning(f'Не найдено место для варианта-победителя опроса {row.poll_id}')
+
+        results.append(result)
+
+    return results
+
+
+def close_polls(
+    session: Session,
+    poll_ids: List[str],
+    customers: Dict[int, int],
+    wins: Sequence[Tuple[int, int]] = (),
+    messages: Sequence[OutgoingMessage] = (),
+) -> None:
+    """Закрытие обработанных опросов, сохранение выбранных для заказа пользователей,
+    обновление статистики мест и постановка сообщений с результатами в очередь отправки.
+
+    :param session: экземпляр сессии.
+    :param poll_ids: ID опросов.
+    :param customers: ID выбранных пользователей по ID подписок.
+    :param wins: пары (ID чата, ID места-победителя).
+    :param messages: сообщения с результатами опросов.
+    """
+    update_place_stats(session, poll_ids=poll_ids, wins=wins)
+    enqueue_messages(session, messages)
+
+    session.bulk_update_mappings(Subscription, [
+        {'id': subscription_id, 'last_customer_id': user_id}
+        for subscription_id, user_id in customers.items()
+    ])
+
+    # Проставление флага закрытия для обработанных опросов
+    session.query(Poll).filter(Poll.id.in_(poll_ids)).update(
+        {Poll.is_closed: True}, synchronize_session=False,
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import datetime as dt
+import time
+from typing import NamedTuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from database.tables import Poll, PollOption, PollVote
+from settings import POLLS_RETENTION_DAYS
+
+
+RETENTION_CHUNK_SIZE = 500
+RETENTION_PAUSE = 1
+RETENTION_INTERVAL = 24 * 60 * 60
+
+
+class RetentionReport(NamedTuple):
+    """Количество удаленных записей."""
+
+    polls: int = 0
+    options: int = 0
+    votes: int = 0
+
+    def __add__(self, other: 'RetentionReport') -> 'RetentionReport':
+        return RetentionReport(*(x + y for x, y in zip(self, other)))
+
+
+def delete_old_polls(
+    session: Session,
+    older_than: dt.datetime,
+    chunk_size: int = RETENTION_CHUNK_SIZE,
+) -> RetentionReport:
+    """Удаление не более `chunk_size` закрытых опросов, созданных раньше `older_than`, вместе
+    с их вариантами ответа и ответами пользователей.
+
+    Опросы, заблокированные другими транзакциями, пропускаются.
+
+    :return: количество удаленных записей.
+    """
+    poll_ids = [row.id for row in session.query(Poll.id).filter(
+        Poll.is_closed == True,
+        Poll.start_date < older_than,
+    ).limit(chunk_size).with_for_update(skip_locked=True)]
+
+    if not poll_ids:
+        return RetentionReport()
+
+    num_votes = session.query(PollVote).filter(
+        PollVote.poll_id.in_(poll_ids),
+    ).delete(synchronize_session=False)
+    num_options = session.query(PollOption).filter(
+        PollOption.poll_id.in_(poll_ids),
+    ).delete(synchronize_session=False)
+    num_polls = session.query(Poll).filter(
+        Poll.id.in_(poll_ids),
+    ).delete(synchronize_session=False)
+
+    return RetentionReport(polls=num_polls, options=num_options, votes=num_votes)
+
+
+class PollsRetention:
+    """Удаление закрытых опросов старше `max_age` дней.
+
+    Опросы удаляются пакетами по `chunk_size` штук, каждый пакет — в отдельной транзакции; между
+    пакетами выдерживается пауза `pause` секунд, чтобы не удерживать блокировки и не мешать
+    обработке обновлений.
+    """
+
+    def __init__(
+        self,
+        max_age: int = POLLS_RETENTION_DAYS,
+        chunk_size: int = RETENTION_CHUNK_SIZE,
+        pause: float = RETENTION_PAUSE,
+    ) -> None:
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.pause = pause
+
+    async def run(self) -> RetentionReport:
+        """Удаление всех устаревших опросов.
+
+        :return: общее количество удаленных записей.
+        """
+        started = time.monotonic()
+        older_than = dt.datetime.utcnow() - dt.timedelta(days=self.max_age)
+        report = RetentionReport()
+
+        while True:
+            chunk = await run_in_session(
+                delete_old_polls, older_than=older_than, chunk_size=self.chunk_size,
+            )
+            report += chunk
+
+            if chunk.polls < self.chunk_size:
+                break
+
+            await asyncio.sleep(self.pause)
+
+        if report.polls:
+            logger.info(f'Удалено устаревших опросов: {report.polls}, вариантов ответа: '
+                        f'{report.options}, ответов: {report.votes} '
+                        f'за {time.monotonic() - started:.1f} с')
+
+        return report
@@ -0,0 +1,179 @@
+import datetime as dt
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Query, Session
+
+from database import iterate_by_keyset
+from database.listener import notify
+from database.tables import ChatTimezone, Subscription
+
+
+MINUTES_PER_DAY = 24 * 60
+CHAT_SETTINGS_CHANNEL = 'chat_settings_changed'
+
+
+def minute_of_day(value: dt.time) -> int:
+    """Номер минуты в сутках."""
+    return value.hour * 60 + value.minute
+
+
+def notify_chat_changed(session: Session, chat_id: int) -> None:
+    """Уведомление всех процессов бота об изменении параметров рассылки чата."""
+    notify(session, CHAT_SETTINGS_CHANNEL, str(chat_id))
+
+
+class ChatSchedule(NamedTuple):
+    """Параметры рассылки для чата."""
+
+    mailing_time: Optional[dt.time]
+    sign: int
+    offset: dt.time
+    # код страны производственного календаря (см. `calendars.py`)
+    calendar: Optional[str] = None
+
+    @property
+    def shift(self) -> dt.timedelta:
+        """Смещение часового пояса чата относительно UTC."""
+        return self.sign * dt.timedelta(hours=self.offset.hour, minutes=self.offset.minute)
+
+    @property
+    def utc_minute(self) -> Optional[int]:
+        """Минута суток (UTC), в которую чату нужно отправить опрос."""
+        if self.mailing_time is None:
+            return None
+
+        shift = minute_of_day(self.offset)
+        return (minute_of_day(self.mailing_time) - self.sign * shift) % MINUTES_PER_DAY
+
+    def local_time(self, utc_time: dt.datetime) -> dt.datetime:
+        """Перевод времени UTC во время чата."""
+        return utc_time + self.shift
+
+
+class MailingSchedule:
+    """Расписание рассылки: чаты, сгруппированные по минуте суток (UTC), в которую им нужно
+    отправить опрос.
+
+    Индекс строится один раз при запуске бота и далее обновляется обработчиками, изменяющими
+    время рассылки или часовой пояс чата, поэтому на каждом шаге рассылки просматриваются только
+    чаты, время рассылки которых наступило.
+    """
+
+    def __init__(self) -> None:
+        self._chats: Dict[int, ChatSchedule] = {}
+        self._buckets: Dict[int, Set[int]] = {}
+        self._last_tick: Optional[dt.datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._chats
+
+    @staticmethod
+    def query(session: Session, bot_id: int) -> Query:
+        # noinspection PyTypeChecker
+        return (session
+                .query(Subscription.id,
+                       Subscription.chat_id,
+                       Subscription.mailing_time,
+                       ChatTimezone.sign,
+                       ChatTimezone.offset,
+                       Subscription.calendar,
+                       )
+                .filter(Subscription.bot_id == bot_id)
+                .join(ChatTimezone, Subscription.chat_id == ChatTimezone.chat_id)
+                )
+
+    @classmethod
+    def fetch_chat(cls, session: Session, bot_id: int, chat_id: int) -> Optional[ChatSchedule]:
+        """Чтение параметров рассылки чата из БД."""
+        row = cls.query(session, bot_id).filter(Subscription.chat_id == chat_id).one_or_none()
+
+        if row is None:
+            return None
+
+        _, _, *entry = row
+        return ChatSchedule(*entry)
+
+    def load(self, session: Session, bot_id: int) -> None:
+        """Построение расписания по всем подпискам бота.
+
+        Расписание загружается при получении процессом роли ведущего, поэтому пропущенные минуты
+        не обрабатываются: за это время рассылку выполнял другой процесс.
+        """
+        self._chats.clear()
+        self._buckets.clear()
+        self.reset()
+
+        rows = iterate_by_keyset(self.query(session, bot_id), key=Subscription.id)
+
+        for (_, chat_id, *entry) in rows:
+            self.update(chat_id, ChatSchedule(*entry))
+
+    def reset(self) -> None:
+        """Сброс времени предыдущего вызова `due`: следующий вызов вернет только текущую минуту."""
+        self._last_tick = None
+
+    def get(self, chat_id: int) -> Optional[ChatSchedule]:
+        return self._chats.get(chat_id)
+
+    def update(self, chat_id: int, entry: Optional[ChatSchedule]) -> None:
+        """Обновление параметров рассылки чата.
+
+        :param chat_id: ID чата.
+        :param entry: новые параметры рассылки; `None` удаляет чат из расписания.
+        """
+        self.remove(chat_id)
+
+        if entry is None:
+            return
+
+        self._chats[chat_id] = entry
+        minute = entry.utc_minute
+
+        if minute is not None:
+            self._buckets.setdefault(minute, set()).add(chat_id)
+
+    def remove(self, chat_id: int) -> None:
+        entry = self._chats.pop(chat_id, None)
+
+        if entry is None or entry.utc_minute is None:
+            return
+
+        bucket = self._buckets.get(entry.utc_minute)
+
+        if bucket is not None:
+            bucket.discard(chat_id)
+
+            if not bucket:
+                del self._buckets[entry.utc_minute]
+
+    def due(self, now: dt.datetime) -> List[Tuple[int, dt.datetime]]:
+        """Чаты, время рассылки которых наступило с момента предыдущего вызова.
+
+        Если предыдущий вызов был больше минуты назад, пропущенные минуты тоже обрабатываются.
+
+        :param now: текущее время UTC, округленное до минуты.
+        :return: пары вида (ID чата, время рассылки в часовом поясе чата).
+        """
+        if self._last_tick is None:
+            moments = [now]
+        elif now <= self._last_tick:
+            moments = []
+        else:
+            num_minutes = min(int((now - self._last_tick).total_seconds()) // 60,
+                              MINUTES_PER_DAY)
+            moments = [now - dt.timedelta(minutes=i) for i in reversed(range(num_minutes))]
+
+        self._last_tick = now
+        result = []
+
+        for moment in moments:
+            for chat_id in tuple(self._buckets.get(minute_of_day(moment.time()), ())):
+                result.append((chat_id, self._chats[chat_id].local_time(moment)))
+
+        return result
+
+
+mailing_schedule = MailingSchedule()
@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple, Tuple
+
+from aiogram.utils.exceptions import RetryAfter
+from loguru import logger
+
+
+# Ограничения Telegram Bot API на отправку сообщений
+GLOBAL_RATE = 30
+GROUP_CHAT_RATE = 20 / 60
+PRIVATE_CHAT_RATE = 1
+
+MAX_CONCURRENT_SENDS = 50
+MAX_RETRIES = 5
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Алгоритм «ведро с токенами»: не более `rate` операций в секунду с допустимым всплеском
+    до `capacity` операций."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Резервирование токена.
+
+        :return: время (в секундах), через которое можно воспользоваться токеном.
+        """
+        self._refill()
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, timeout: float) -> None:
+        """Запрет на выдачу токенов в течение `timeout` секунд."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - timeout * self.rate
+
+
+class RateLimiter:
+    """Ограничение частоты отправки сообщений: общее для бота и отдельное для каждого чата."""
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        group_chat_rate: float = GROUP_CHAT_RATE,
+        private_chat_rate: float = PRIVATE_CHAT_RATE,
+        max_chats: int = MAX_CHAT_BUCKETS,
+    ) -> None:
+        self.group_chat_rate = group_chat_rate
+        self.private_chat_rate = private_chat_rate
+        self.max_chats = max_chats
+        self._global = TokenBucket(rate=global_rate, capacity=global_rate)
+        # ведра чатов в порядке последнего использования; при превышении `max_chats`
+        # удаляются давно не использованные
+        self._chats: 'OrderedDict[int, TokenBucket]' = OrderedDict()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+
+        if bucket is not None:
+            self._chats.move_to_end(chat_id)
+            return bucket
+
+        # ID групповых чатов отрицательные; для них ограничение задается в минуту
+        if chat_id < 0:
+            bucket = TokenBucket(rate=self.group_chat_rate, capacity=self.group_chat_rate * 60)
+        else:
+            bucket = TokenBucket(rate=self.private_chat_rate, capacity=1)
+
+        self._chats[chat_id] = bucket
+
+        if len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+
+        return bucket
+
+    async def acquire(self, chat_id: int) -> None:
+        """Ожидание возможности отправить сообщение в чат."""
+        delay = self._chat_bucket(chat_id).reserve()
+
+        if delay:
+            await asyncio.sleep(delay)
+
+        delay = self._global.reserve()
+
+        if delay:
+            await asyncio.sleep(delay)
+
+    def pause(self, chat_id: int, timeout: float) -> None:
+        """Приостановка отправки сообщений в чат (например, после `RetryAfter`)."""
+        self._chat_bucket(chat_id).pause(timeout)
+
+
+class FanOutResult(NamedTuple):
+    sent: int
+    failed: int
+    retried: int
+    duration: float
+
+
+class FanOut:
+    """Параллельная отправка сообщений в несколько чатов.
+
+    Одновременно выполняется не более `max_concurrency` отправок, частота отправки ограничивается
+    `limiter`. Чаты, для которых Telegram вернул `RetryAfter`, повторно ставятся в очередь по
+    истечении указанного времени.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        max_concurrency: int = MAX_CONCURRENT_SENDS,
+        max_retries: int = MAX_RETRIES,
+    ) -> None:
+        self.limiter = limiter
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+    async def run(
+        self,
+        chat_ids: Iterable[int],
+        send: Callable[[int], Awaitable[None]],
+        name: str = 'fan-out',
+    ) -> FanOutResult:
+        """Вызов `send` для каждого чата из `chat_ids`.
+
+        :param chat_ids: ID чатов.
+        :param send: функция отправки сообщения в чат.
+        :param name: название рассылки (для логирования).
+        :return: статистика рассылки.
+        """
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        for chat_id in chat_ids:
+            queue.put_nowait((chat_id, 0))
+
+        if queue.empty():
+            return FanOutResult(sent=0, failed=0, retried=0, duration=0.0)
+
+        stats = {'sent': 0, 'failed': 0, 'retried': 0}
+        num_workers = min(self.max_concurrency, queue.qsize())
+        workers = [
+            asyncio.create_task(self._worker(queue, send, stats)) for _ in range(num_workers)
+        ]
+
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        result = FanOutResult(duration=time.monotonic() - started, **stats)
+        logger.info(f'{name}: отправлено {result.sent}, ошибок {result.failed}, '
+                    f'повторов {result.retried} за {result.duration:.2f} с')
+
+        return result
+
+    async def _worker(
+        self,
+        queue: asyncio.Queue,
+        send: Callable[[int], Awaitable[None]],
+        stats: Dict[str, int],
+    ) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item: Tuple[int, int] = await queue.get()
+            chat_id, attempt = item
+
+            try:
+                await self.limiter.acquire(chat_id)
+                await send(chat_id)
+            except RetryAfter as e:
+                if attempt < self.max_retries:
+                    stats['retried'] += 1
+                    self.limiter.pause(chat_id, e.timeout)
+                    # задача будет считаться выполненной только после повторной постановки в очередь
+                    loop.call_later(e.timeout, _requeue, queue, (chat_id, attempt + 1))
+                    continue
+
+                stats['failed'] += 1
+                logger.warning(f'Не удалось отправить сообщение в чат {chat_id}: {e}')
+            except Exception:
+                stats['failed'] += 1
+                logger.exception(f'Ошибка при отправке сообщения в чат {chat_id}')
+            else:
+                stats['sent'] += 1
+
+            queue.task_done()
+
+
+def _requeue(queue: asyncio.Queue, item: Tuple[int, int]) -> None:
+    queue.put_nowait(item)
+    queue.task_done()
@@ -13,3 +13,24 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 
 POSTGRES_DSN = f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+# Если задан адрес вебхука (например, https://example.com), бот получает обновления через
+# вебхук; в этом режиме можно запустить несколько процессов бота.
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', '8080'))
+
+# Закрытые опросы старше указанного количества дней удаляются вместе с ответами
+POLLS_RETENTION_DAYS = int(os.getenv('POLLS_RETENTION_DAYS', '180'))
+
+# Адрес сервера Bot API (например, локального сервера для нагрузочного тестирования,
+# см. `benchmarks/load_test.py`); по умолчанию — api.telegram.org
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+# Время в секундах, в течение которого опрос принимает ответы
+POLL_OPEN_PERIOD = int(os.getenv('POLL_OPEN_PERIOD', '300'))
+
+# Если задан порт, метрики в формате Prometheus доступны по адресу
+# http://METRICS_HOST:METRICS_PORT/metrics; каждому процессу бота нужен свой порт
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0')) or None
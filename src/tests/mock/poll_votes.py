@@ -101,3 +101,34 @@ def polls_votes(draw):
         dfs.append(votes)
 
     return pd.concat([all_df] + dfs, axis=0)
+
+
+def generate_polls_votes(
+    num_polls: int,
+    max_options: int = MAX_OPTIONS,
+    max_votes: int = MAX_VOTES_FOR_OPTION,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Генерация выгрузки о количестве голосов в `num_polls` опросах (для бенчмарков).
+
+    В отличие от `polls_votes`, выгрузка строится векторно и подходит для сотен тысяч опросов.
+    """
+    rng = np.random.default_rng(seed)
+    num_options = rng.integers(1, max_options + 1, size=num_polls)
+    poll_index = np.repeat(np.arange(num_polls), num_options)
+    # номера вариантов внутри каждого опроса: 0, 1, ..., num_options - 1
+    option_number = np.arange(len(poll_index)) - np.repeat(np.cumsum(num_options) - num_options,
+                                                           num_options)
+
+    start_date = pd.Timestamp('2022-01-01') + pd.to_timedelta(
+        rng.integers(0, 365 * 24 * 60, size=num_polls), unit='min',
+    )
+
+    return pd.DataFrame({
+        'chat_id': rng.integers(-10 ** 12, 0, size=num_polls)[poll_index],
+        'poll_id': np.arange(num_polls).astype(str)[poll_index],
+        'start_date': start_date[poll_index],
+        'open_period': rng.integers(10, 500, size=num_polls)[poll_index],
+        'option_number': option_number,
+        'num_votes': rng.integers(0, max_votes + 1, size=len(poll_index)),
+    }, columns=COLUMNS)
@@ -0,0 +1,31 @@
+import datetime as dt
+
+from workalendar.europe import Belarus, Russia
+
+from calendars import CalendarService, WorkingDays
+
+
+def test_working_days_match_calendar() -> None:
+    calendar = Russia()
+    working_days = WorkingDays(calendar)
+    day = dt.date(2023, 12, 1)
+
+    while day < dt.date(2024, 2, 1):
+        assert working_days.is_working_day(day) == calendar.is_working_day(day)
+        day += dt.timedelta(days=1)
+
+    assert sorted(working_days._years) == [2023, 2024]
+
+    working_days.is_working_day(dt.date(2026, 1, 1))
+    assert sorted(working_days._years) == [2026]
+
+
+def test_calendar_service() -> None:
+    service = CalendarService(default='RU')
+    # 7 ноября — выходной в Беларуси, но не в России
+    day = dt.date(2022, 11, 7)
+
+    assert service.is_working_day(day)
+    assert service.is_working_day(day, 'ru')
+    assert not service.is_working_day(day, 'BY') and not Belarus().is_working_day(day)
+    assert service.get('XX') is service.get('RU')
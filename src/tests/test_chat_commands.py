@@ -0,0 +1,95 @@
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
+import pytest
+from aiogram import Bot, types
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database.core
+from database.tables import ChatTimezone, Subscription
+from mailing import MailingTime
+from schedule import mailing_schedule
+from timezone import Timezone
+from translation import default_translation as translation
+
+
+BOT_ID = 123456
+CHAT_ID = -100
+
+
+@pytest.fixture
+def session(monkeypatch: pytest.MonkeyPatch) -> Session:
+    """БД SQLite, через которую `run_in_session` выполняет функции в потоках `DB_EXECUTOR`."""
+    engine = create_engine(
+        'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool,
+    )
+
+    @event.listens_for(engine, 'connect')
+    def add_pg_notify(dbapi_connection, connection_record):
+        dbapi_connection.create_function('pg_notify', 2, lambda channel, payload: None)
+
+    Subscription.__table__.create(engine)
+    ChatTimezone.__table__.create(engine)
+    monkeypatch.setattr(database.core, 'DBSession', sessionmaker(bind=engine))
+
+    with Session(engine) as session:
+        session.add(Subscription(chat_id=CHAT_ID, bot_id=BOT_ID, mailing_time=dt.time(12)))
+        session.add(ChatTimezone(chat_id=CHAT_ID, sign=1, offset=dt.time(3)))
+        session.commit()
+
+        yield session
+
+    mailing_schedule.remove(CHAT_ID)
+
+
+def run_handler(handler, text: str) -> None:
+    bot = Bot(token=f'{BOT_ID}:fake-token')
+    answers = []
+
+    async def send_message(chat_id: int, text: str, **kwargs) -> None:
+        answers.append(text)
+
+    async def finish() -> None:
+        pass
+
+    bot.send_message = send_message
+    msg = types.Message(
+        message_id=1,
+        date=0,
+        chat={'id': CHAT_ID, 'type': 'group'},
+        text=text,
+    )
+
+    async def main() -> None:
+        # бот доступен через `Bot.get_current()` только в цикле событий, но не в потоках БД
+        Bot.set_current(bot)
+        await handler(msg, SimpleNamespace(finish=finish))
+
+    asyncio.run(main())
+    assert answers
+
+
+def test_mailing_time_chosen(session: Session) -> None:
+    run_handler(MailingTime.time_chosen, '13:30')
+
+    session.expire_all()
+    assert session.query(Subscription.mailing_time).scalar() == dt.time(13, 30)
+    assert mailing_schedule.get(CHAT_ID).mailing_time == dt.time(13, 30)
+
+
+def test_mailing_cancel(session: Session) -> None:
+    run_handler(MailingTime.option_chosen, translation.mailing_cancel)
+
+    session.expire_all()
+    assert session.query(Subscription.mailing_time).scalar() is None
+
+
+def test_tz_chosen(session: Session) -> None:
+    run_handler(Timezone.tz_chosen, '-05:30')
+
+    session.expire_all()
+    assert session.query(ChatTimezone.sign, ChatTimezone.offset).one() == (-1, dt.time(5, 30))
+    assert mailing_schedule.get(CHAT_ID).sign == -1
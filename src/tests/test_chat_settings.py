@@ -0,0 +1,67 @@
+import asyncio
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import chat_settings as chat_settings_module
+from chat_settings import ChatSettings, ChatSettingsCache, fetch_chat_settings
+from database.tables import ChatTimezone, Subscription
+from schedule import ChatSchedule
+
+
+def test_fetch_chat_settings() -> None:
+    engine = create_engine('sqlite://')
+
+    for table in (Subscription, ChatTimezone):
+        table.__table__.create(engine)
+
+    with Session(engine) as session:
+        session.add_all([
+            Subscription(id=1, chat_id=10, bot_id=1, mailing_time=dt.time(12), last_customer_id=5),
+            Subscription(id=2, chat_id=10, bot_id=2, mailing_time=dt.time(13)),
+            ChatTimezone(chat_id=10, sign=1, offset=dt.time(3)),
+            ChatTimezone(chat_id=20, sign=-1, offset=dt.time(2)),
+        ])
+        session.flush()
+
+        settings = fetch_chat_settings(session, bot_id=1, chat_id=10)
+        assert settings == ChatSettings(1, dt.time(12), 5, 1, dt.time(3))
+        assert settings.schedule == ChatSchedule(dt.time(12), 1, dt.time(3))
+
+        # часовой пояс есть, подписки нет
+        settings = fetch_chat_settings(session, bot_id=1, chat_id=20)
+        assert settings.subscription_id is None
+        assert settings.schedule is None
+
+        assert fetch_chat_settings(session, bot_id=1, chat_id=30) is None
+
+
+def test_chat_settings_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    async def fake_run_in_session(func, bot_id, chat_id):
+        calls.append(chat_id)
+        return ChatSettings(None, None, None, 1, dt.time(chat_id))
+
+    monkeypatch.setattr(chat_settings_module, 'run_in_session', fake_run_in_session)
+
+    async def main() -> None:
+        cache = ChatSettingsCache(size=2)
+
+        assert (await cache.get(bot_id=1, chat_id=1)).offset == dt.time(1)
+        await cache.get(bot_id=1, chat_id=1)
+        assert calls == [1]
+
+        await cache.get(bot_id=1, chat_id=2)
+        await cache.get(bot_id=1, chat_id=1)
+        await cache.get(bot_id=1, chat_id=3)
+        assert 2 not in cache
+        assert len(cache) == 2
+
+        cache.on_settings_changed('1')
+        await cache.get(bot_id=1, chat_id=1)
+        assert calls == [1, 2, 3, 1]
+
+    asyncio.run(main())
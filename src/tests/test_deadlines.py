@@ -0,0 +1,44 @@
+import asyncio
+import datetime as dt
+from typing import List
+
+from deadlines import DeadlineScheduler
+
+
+def test_pop_due() -> None:
+    now = dt.datetime(2022, 9, 1, 12, 0)
+    scheduler = DeadlineScheduler(callback=None)
+
+    scheduler.push('b', now + dt.timedelta(seconds=10))
+    scheduler.push('a', now)
+    scheduler.push('a', now - dt.timedelta(seconds=5))
+    scheduler.push('c', now + dt.timedelta(seconds=20))
+
+    assert scheduler.pop_due(now) == ['a']
+    assert scheduler.pop_due(now + dt.timedelta(seconds=20)) == ['b', 'c']
+    assert scheduler.next_deadline is None
+
+
+def test_run() -> None:
+    processed = []
+
+    async def callback(poll_ids: List[str]) -> None:
+        processed.append(poll_ids)
+
+    async def main() -> None:
+        scheduler = DeadlineScheduler(callback=callback)
+        task = asyncio.create_task(scheduler.run())
+
+        scheduler.push('late', dt.datetime.utcnow() + dt.timedelta(seconds=0.2))
+        await asyncio.sleep(0.05)
+        assert scheduler.is_running
+        scheduler.push('early', dt.datetime.utcnow() + dt.timedelta(seconds=0.05))
+        await asyncio.sleep(0.3)
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert not scheduler.is_running
+
+    asyncio.run(main())
+
+    assert processed == [['early'], ['late']]
@@ -0,0 +1,77 @@
+import asyncio
+import datetime as dt
+from typing import Dict, Optional, Tuple
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import fsm_storage
+from database.tables import FsmState
+from fsm_storage import PostgresStorage, delete_expired_states, read_state
+
+
+def test_read_and_delete_expired_states() -> None:
+    engine = create_engine('sqlite://')
+    FsmState.__table__.create(engine)
+    now = dt.datetime.utcnow()
+
+    with Session(engine) as session:
+        session.add_all([
+            FsmState(chat_id=1, user_id=1, state='a', data={'x': 1}, updated_at=now),
+            FsmState(
+                chat_id=1, user_id=2, state='b', data={}, updated_at=now - dt.timedelta(days=2),
+            ),
+            FsmState(
+                chat_id=2, user_id=1, state='c', data={}, updated_at=now - dt.timedelta(days=3),
+            ),
+        ])
+
+        assert read_state(session, chat_id=1, user_id=1) == ('a', {'x': 1})
+        assert read_state(session, chat_id=1, user_id=2) == (None, {})
+        assert read_state(session, chat_id=3, user_id=1) == (None, {})
+
+        assert delete_expired_states(session, batch_size=1) == 1
+        assert delete_expired_states(session, batch_size=1) == 1
+        assert delete_expired_states(session, batch_size=1) == 0
+        assert session.query(FsmState.chat_id, FsmState.user_id).all() == [(1, 1)]
+
+
+def test_storage_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows: Dict[Tuple[int, int], Tuple[Optional[str], Dict]] = {(1, 2): ('saved', {'x': 1})}
+    calls = []
+
+    async def fake_run_in_session(func, **kwargs):
+        calls.append(func.__name__)
+        key = (kwargs['chat_id'], kwargs['user_id'])
+
+        if func is fsm_storage.read_state:
+            return rows.get(key, (None, {}))
+
+        rows[key] = (kwargs['state'], kwargs['data'])
+
+    monkeypatch.setattr(fsm_storage, 'run_in_session', fake_run_in_session)
+
+    async def main() -> None:
+        storage = PostgresStorage(cache_size=2)
+
+        assert await storage.get_state(chat=1, user=2) == 'saved'
+        assert await storage.get_data(chat=1, user=2) == {'x': 1}
+        assert calls == ['read_state']
+
+        await storage.update_data(chat=1, user=2, y=2)
+        await storage.set_state(chat=1, user=2, state='next')
+        assert rows[(1, 2)] == ('next', {'x': 1, 'y': 2})
+        assert await storage.get_state(chat=1, user=2) == 'next'
+        assert calls == ['read_state', 'write_state', 'write_state']
+
+        await storage.get_state(chat=1, user=3)
+        await storage.get_state(chat=1, user=4)
+        # самая давно использованная запись вытеснена из кэша
+        assert await storage.get_state(chat=1, user=2) == 'next'
+        assert calls.count('read_state') == 4
+
+        await storage.finish(chat=1, user=2)
+        assert rows[(1, 2)] == (None, {})
+
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import iterate_by_keyset
+from database.tables import Subscription
+
+
+def test_iterate_by_keyset() -> None:
+    engine = create_engine('sqlite://')
+    Subscription.__table__.create(engine)
+
+    with Session(engine) as session:
+        session.add_all(Subscription(chat_id=chat_id, bot_id=1) for chat_id in range(25))
+        session.commit()
+
+        query = session.query(Subscription.id, Subscription.chat_id)
+        chat_ids = []
+
+        for _, chat_id in iterate_by_keyset(query, key=Subscription.id, window_size=10):
+            chat_ids.append(chat_id)
+
+            # удаление строк во время обхода не должно приводить к пропуску оставшихся
+            if chat_id % 3 == 0:
+                session.query(Subscription).filter(Subscription.chat_id == chat_id).delete()
+
+        assert chat_ids == list(range(25))
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from leader import LeaderElection
+
+
+def test_leader_tasks_follow_lock(monkeypatch: pytest.MonkeyPatch) -> None:
+    results = iter([False, True, True, False])
+    runs = []
+
+    async def fake_check() -> bool:
+        return next(results, False)
+
+    async def leader_task() -> None:
+        runs.append('started')
+
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            runs.append('cancelled')
+            raise
+
+    async def main() -> None:
+        election = LeaderElection(check_interval=0.01)
+        monkeypatch.setattr(election, '_check', fake_check)
+        election.add_task(leader_task)
+        election.start()
+
+        await asyncio.sleep(0.025)
+        assert election.is_leader
+        assert runs == ['started']
+
+        await asyncio.sleep(0.03)
+        assert not election.is_leader
+        assert runs == ['started', 'cancelled']
+
+        election.stop()
+
+    asyncio.run(main())
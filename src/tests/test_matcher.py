@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+from hypothesis import given, strategies as st
+
+from matcher import NameMatcher, TrigramIndex, fuzzy_key
+
+
+def find_longest(names: List[str], text: str) -> Optional[str]:
+    """Эталонная реализация `NameMatcher.find_longest`."""
+    best = None
+
+    for end in range(1, len(text) + 1):
+        for name in names:
+            if name and text[:end].endswith(name) and (best is None or len(name) > len(best)):
+                best = name
+
+    return best
+
+
+def test_find_longest() -> None:
+    matcher = NameMatcher(['урок', 'смола', 'madamevy', 'madame'])
+
+    assert len(matcher) == 4
+    assert matcher.find_longest('давайтевурок') == 'урок'
+    assert matcher.find_longest('madamevyилисмола') == 'madamevy'
+    assert matcher.find_longest('madamevi') == 'madame'
+    assert matcher.find_longest('привет') is None
+    assert NameMatcher([]).find_longest('урок') is None
+
+
+def test_trigram_index() -> None:
+    index = TrigramIndex(['урок', 'смола', 'madamevy', 'яндекславка'])
+
+    assert len(index) == 4
+    assert fuzzy_key('Мадам Ви!') == 'madamvi'
+    assert index.find('мадамви') == 'madamevy'
+    assert index.find('urok!') == 'урок'
+    assert index.find('яндекслафка') == 'яндекславка'
+    assert index.find('да') is None
+    assert index.find('привет') is None
+    assert index.find('давайтезакажемчтонибудьвсмоле') is None
+    assert TrigramIndex([]).find('урок') is None
+
+
+@given(
+    names=st.lists(st.text(alphabet='abc', max_size=4)),
+    text=st.text(alphabet='abcd', max_size=20),
+)
+def test_find_longest_reference(names: List[str], text: str) -> None:
+    assert NameMatcher(names).find_longest(text) == find_longest(names, text)
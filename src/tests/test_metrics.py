@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, types
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from metrics import (
+    DB_QUERY_DURATION,
+    DB_QUERY_ERRORS,
+    HANDLER_DURATION,
+    HANDLER_ERRORS,
+    HandlerMetricsMiddleware,
+    Metric,
+    MetricsRegistry,
+    instrument_engine,
+    sql_operation,
+)
+
+
+def test_render() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter('requests_total', 'Requests', ['method'])
+    histogram = registry.histogram('duration_seconds', 'Duration', buckets=(0.1, 1))
+
+    counter.inc(method='get')
+    counter.inc(2, method='get')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{method="get"} 3',
+        '# HELP duration_seconds Duration',
+        '# TYPE duration_seconds histogram',
+        'duration_seconds_bucket{le="0.1"} 1',
+        'duration_seconds_bucket{le="1"} 2',
+        'duration_seconds_bucket{le="+Inf"} 3',
+        'duration_seconds_sum 5.55',
+        'duration_seconds_count 3',
+    ]
+
+    with pytest.raises(ValueError):
+        counter.inc(path='/')
+
+
+def test_gauge() -> None:
+    registry = MetricsRegistry()
+    gauge = registry.gauge('age_seconds', 'Age')
+    assert gauge.render() == ['# HELP age_seconds Age', '# TYPE age_seconds gauge']
+
+    gauge.set_function(lambda: 1.5)
+    assert registry.render().splitlines()[-1] == 'age_seconds 1.5'
+
+
+def test_metric_requires_samples() -> None:
+    class Untyped(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Untyped('untyped', 'Untyped')
+
+
+def test_sql_operation() -> None:
+    assert sql_operation('SELECT polls.id FROM polls') == 'SELECT'
+    assert sql_operation('\n(select 1) UNION (select 2)') == 'SELECT'
+    assert sql_operation('insert into outbox') == 'INSERT'
+
+
+def test_instrument_engine() -> None:
+    engine = create_engine('sqlite://')
+    instrument_engine(engine)
+    selects = DB_QUERY_DURATION.count(operation='SELECT')
+    errors = DB_QUERY_ERRORS.get(operation='SELECT')
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql('SELECT 1')
+
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql('SELECT * FROM missing')
+
+    assert DB_QUERY_DURATION.count(operation='SELECT') == selects + 1
+    assert DB_QUERY_ERRORS.get(operation='SELECT') == errors + 1
+
+
+async def handle_hello(message: types.Message) -> None:
+    if message.text == 'fail':
+        raise ValueError
+
+
+def test_handler_middleware() -> None:
+    dp = Dispatcher(Bot(token='123456:fake-token'))
+    dp.middleware.setup(HandlerMetricsMiddleware())
+    dp.register_message_handler(handle_hello)
+    labels = {'update_type': 'message', 'handler': 'handle_hello'}
+
+    def make_update(text: str) -> types.Update:
+        return types.Update(update_id=1, message={
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'User'},
+            'text': text,
+        })
+
+    async def process() -> None:
+        await dp.process_update(make_update('hello'))
+
+        with pytest.raises(ValueError):
+            await dp.process_update(make_update('fail'))
+
+    asyncio.run(process())
+
+    assert HANDLER_DURATION.count(**labels) == 2
+    assert HANDLER_ERRORS.get(**labels) == 1
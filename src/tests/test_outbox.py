@@ -0,0 +1,66 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+from aiogram.utils.exceptions import BotBlocked, NetworkError, RetryAfter
+
+import outbox
+from outbox import OutboxDispatcher, QueuedMessage
+from sending import RateLimiter
+
+
+class FakeBot:
+    def __init__(self, errors: Dict[int, Exception]) -> None:
+        self.errors = errors
+        self.sent: List[int] = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+
+        self.sent.append(chat_id)
+
+
+def test_dispatch(monkeypatch: pytest.MonkeyPatch) -> None:
+    messages = [
+        QueuedMessage(id=i, chat_id=i, method='send_message', payload={'text': 'x'}, attempts=i)
+        for i in range(1, 6)
+    ]
+    bot = FakeBot({
+        2: RetryAfter(7),
+        3: BotBlocked('Forbidden: bot was blocked by the user'),
+        4: NetworkError('timeout'),
+        5: NetworkError('timeout'),
+    })
+    recorded = {}
+
+    async def fake_run_in_session(func, **kwargs):
+        if func is outbox.fetch_due_messages:
+            return messages
+
+        recorded.update(kwargs)
+
+    monkeypatch.setattr(outbox, 'run_in_session', fake_run_in_session)
+
+    dispatcher = OutboxDispatcher(
+        bot, limiter=RateLimiter(global_rate=1000, private_chat_rate=1000), max_attempts=6,
+    )
+    assert asyncio.run(dispatcher.dispatch()) == 5
+
+    assert bot.sent == [1]
+    assert recorded['sent_ids'] == [1]
+
+    failures = {failure.id: failure for failure in recorded['failures']}
+    assert set(failures) == {2, 3, 4, 5}
+    # повтор после RetryAfter и временных ошибок, отказ после постоянной ошибки и
+    # исчерпания попыток
+    assert failures[2].retry_at is not None
+    assert failures[3].retry_at is None
+    assert (failures[4].retry_at - failures[2].retry_at).total_seconds() == pytest.approx(16 - 7)
+    assert failures[5].retry_at is None
+
+
+def test_backoff() -> None:
+    dispatcher = OutboxDispatcher(bot=None, limiter=RateLimiter(), base_delay=2, max_delay=60)
+
+    assert [dispatcher.backoff(i) for i in range(7)] == [2, 4, 8, 16, 32, 60, 60]
@@ -0,0 +1,18 @@
+import datetime as dt
+
+from mailing import parse_time
+from timezone import parse_timezone
+
+
+def test_parse_time() -> None:
+    assert parse_time('12') == dt.time(12)
+    assert parse_time(' 9:30') == dt.time(9, 30)
+    assert parse_time('24:00') is None
+    assert parse_time('12:5') is None
+
+
+def test_parse_timezone() -> None:
+    assert parse_timezone('3') == (1, dt.time(3))
+    assert parse_timezone('+3') == (1, dt.time(3))
+    assert parse_timezone('-05:30') == (-1, dt.time(5, 30))
+    assert parse_timezone('UTC+3') is None
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from database.tables import PlaceStat, PollOption, PollVote
+from place_stats import recompute_place_stats, select_poll_options
+
+
+OPTIONS = [(place_id, f'place {place_id}') for place_id in range(1, 16)]
+
+
+def test_all_options_fit() -> None:
+    options = select_poll_options(OPTIONS[:10], top_place_ids=[3], not_delivery_ids=[1])
+
+    assert options == OPTIONS[:10]
+
+
+def test_top_places_and_not_delivery_first() -> None:
+    options = select_poll_options(
+        OPTIONS,
+        top_place_ids=[14, 12, 99, 1],
+        not_delivery_ids=[15],
+        limit=5,
+    )
+
+    assert [place_id for place_id, _ in options] == [1, 2, 12, 14, 15]
+
+
+def test_without_statistics() -> None:
+    options = select_poll_options(OPTIONS, top_place_ids=[], not_delivery_ids=[], limit=3)
+
+    assert options == OPTIONS[:3]
+
+
+@pytest.fixture
+def session() -> Session:
+    engine = create_engine('sqlite://')
+    # у `polls.deadline` вычисляемое выражение PostgreSQL, поэтому таблица создается без него
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE polls (id VARCHAR PRIMARY KEY, chat_id BIGINT, is_closed BOOLEAN)'
+        )
+
+    for table in (PollOption, PollVote, PlaceStat):
+        table.__table__.create(engine)
+
+    with Session(engine) as session:
+        # в опросе голоса поровну: 2 за место 10 и 2 за место 20
+        session.execute(text(
+            "INSERT INTO polls (id, chat_id, is_closed) VALUES ('p1', 1, 1), ('p2', 1, 0)"
+        ))
+        session.add_all([
+            PollOption(poll_id='p1', position=0, option_id=10),
+            PollOption(poll_id='p1', position=1, option_id=20),
+            *(PollVote(poll_id='p1', user_id=user_id, option_number=user_id % 2)
+              for user_id in range(4)),
+        ])
+        session.commit()
+
+        yield session
+
+
+def read_stats(session: Session) -> dict:
+    return {
+        (row.chat_id, row.place_id): (row.wins, row.votes) for row in session.query(PlaceStat)
+    }
+
+
+def test_recompute_with_tie(session: Session) -> None:
+    # при закрытии опроса среди равных вариантов случайно было выбрано место 20
+    session.add_all([
+        PlaceStat(chat_id=1, place_id=10, wins=0, votes=2),
+        PlaceStat(chat_id=1, place_id=20, wins=1, votes=2),
+    ])
+    session.commit()
+
+    for _ in range(3):
+        assert recompute_place_stats(session) == 2
+        assert read_stats(session) == {(1, 10): (1, 2), (1, 20): (0, 2)}
+
+
+def test_recompute_refuses_to_lose_votes(session: Session) -> None:
+    # статистика опроса, удаленного по сроку хранения
+    session.add(PlaceStat(chat_id=1, place_id=30, wins=1, votes=3))
+    session.commit()
+
+    assert recompute_place_stats(session) is None
+    assert (1, 30) in read_stats(session)
+
+    assert recompute_place_stats(session, force=True) == 2
+    assert (1, 30) not in read_stats(session)
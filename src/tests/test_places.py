@@ -0,0 +1,69 @@
+import asyncio
+
+from metrics import PLACES_SNAPSHOT_AGE, PLACES_SNAPSHOT_BUILD_DURATION
+from places import PlaceRecord, PlacesCatalog
+from utils import PlacesInfo
+
+
+PLACES = (
+    PlaceRecord(1, 'Madame Vy', 'https://madamevy.ru', 1, None, True),
+    PlaceRecord(2, 'Яндекс.Лавка', 'https://lavka.yandex.ru', 2, None, True),
+    PlaceRecord(3, 'Не заказываю', None, 3, 'Мало голосов для доставки', False),
+)
+
+
+def test_places_info_follows_catalog() -> None:
+    catalog = PlacesCatalog()
+    places_info = PlacesInfo(catalog)
+    assert not places_info.has_data
+
+    catalog.set_places(PLACES)
+    assert catalog.version == 1
+    assert catalog.poll_options == [(1, 'Madame Vy'), (2, 'Яндекс.Лавка'), (3, 'Не заказываю')]
+    assert sorted(places_info.places) == ['madamevy', 'яндекславка']
+    assert places_info.not_delivery_ids == [3]
+    assert places_info.find_place('закажемяндекславка!') == PLACES[1]
+    assert places_info.find_place('мадамви') == PLACES[0]
+
+    catalog.set_places(PLACES)
+    assert catalog.version == 1
+
+    catalog.set_places(PLACES[1:])
+    assert catalog.version == 2
+    assert list(places_info.places) == ['яндекславка']
+    assert places_info.find_place('madamevy') is None
+
+
+def test_places_info_rebuilds_in_background() -> None:
+    async def main() -> None:
+        catalog = PlacesCatalog()
+        places_info = PlacesInfo(catalog)
+        snapshot = places_info.snapshot
+
+        catalog.set_places(PLACES)
+        # снимок строится в пуле потоков, до его готовности используется прежний
+        assert places_info.snapshot is snapshot
+
+        await places_info.wait_for_update()
+        assert places_info.version == 1
+        assert places_info.find_place('madamevy') == PLACES[0]
+        assert places_info.snapshot_age >= 0
+
+        # снимок более старой версии справочника не заменяет текущий
+        places_info.set_snapshot(snapshot)
+        assert places_info.version == 1
+
+    asyncio.run(main())
+
+
+def test_places_snapshot_metrics() -> None:
+    catalog = PlacesCatalog()
+    places_info = PlacesInfo(catalog)
+    num_builds = PLACES_SNAPSHOT_BUILD_DURATION.count()
+
+    catalog.set_places(PLACES)
+    assert PLACES_SNAPSHOT_BUILD_DURATION.count() == num_builds + 1
+
+    # возраст снимка вычисляется при чтении метрик
+    [(_, _, _, age)] = PLACES_SNAPSHOT_AGE.samples()
+    assert 0 <= age <= places_info.snapshot_age
@@ -1,8 +1,19 @@
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
 import pandas as pd
+import pytest
 from hypothesis import HealthCheck, given, settings
+from sqlalchemy import column, create_engine, table
 
+import polls
+from polls import ChatResults, PollActions, PollResult
 from tests.mock.poll_votes import polls_votes
-from utils import get_polls_winners
+from utils import get_polls_winners, rank_polls_winners
+
+
+VOTES_COLUMNS = ['chat_id', 'poll_id', 'option_number', 'num_votes']
 
 
 @given(polls_votes())
@@ -11,3 +22,125 @@ def test_polls_results(df: pd.DataFrame) -> None:
     res = get_polls_winners(df)
     assert res.index.name == 'poll_id'
     assert res.index.is_unique
+
+
+@given(polls_votes())
+@settings(suppress_health_check=(HealthCheck.too_slow,), deadline=None)
+def test_polls_winners_query(df: pd.DataFrame) -> None:
+    expected = get_polls_winners(df)
+
+    # ID чатов генерируются без ограничений на размер, поэтому хранятся в виде строк
+    votes = df[VOTES_COLUMNS].astype({
+        'chat_id': str,
+        'poll_id': str,
+        'option_number': int,
+        'num_votes': int,
+    })
+
+    engine = create_engine('sqlite://')
+    votes.to_sql('votes', engine, index=False)
+
+    with engine.connect() as conn:
+        query = rank_polls_winners(table('votes', *map(column, VOTES_COLUMNS)))
+        res = conn.execute(query).all()
+
+    assert sorted(row.poll_id for row in res) == sorted(expected.index)
+
+    for row in res:
+        poll_votes = votes[votes.poll_id == row.poll_id]
+
+        assert row.chat_id == str(expected.loc[row.poll_id, 'chat_id'])
+        assert row.num_votes == expected.loc[row.poll_id, 'num_votes']
+        assert row.num_votes == poll_votes.num_votes.max()
+        assert row.option_number in poll_votes.option_number.tolist()
+
+
+def make_actions(monkeypatch: pytest.MonkeyPatch, fail_poll_ids=()) -> PollActions:
+    actions = PollActions(bot=SimpleNamespace())
+    build_poll_result = actions.build_poll_result
+
+    async def failing_build(result, last_customer_id):
+        if result.poll_id in fail_poll_ids:
+            raise RuntimeError
+
+        return await build_poll_result(result, last_customer_id)
+
+    monkeypatch.setattr(actions, 'build_poll_result', failing_build)
+    return actions
+
+
+def test_build_chat_results(monkeypatch: pytest.MonkeyPatch) -> None:
+    actions = make_actions(monkeypatch, fail_poll_ids={'a'})
+    results = [
+        PollResult(poll_id='a', chat_id=1, num_votes=0),
+        PollResult(poll_id='b', chat_id=1, num_votes=0),
+    ]
+
+    built = asyncio.run(actions.build_chat_results(results))
+
+    # опрос с ошибкой не мешает подвести итоги остальных опросов чата
+    assert built.failed == ['a']
+    assert built.closed == results[1:]
+    assert [message.chat_id for message in built.messages] == [1]
+
+
+def test_retry_polls_results() -> None:
+    actions = PollActions(bot=SimpleNamespace())
+    actions.retry_polls_results(['a', 'b'])
+
+    assert len(actions.deadlines) == 2
+    assert actions.deadlines.next_deadline > dt.datetime.utcnow()
+
+
+def test_close_polls_results(monkeypatch: pytest.MonkeyPatch) -> None:
+    closed = {}
+    woken = []
+
+    async def fake_run_in_session(func, **kwargs):
+        assert func is polls.close_polls
+        closed.update(kwargs)
+
+    monkeypatch.setattr(polls, 'run_in_session', fake_run_in_session)
+    actions = PollActions(bot=SimpleNamespace())
+    monkeypatch.setattr(actions.outbox, 'wake', lambda: woken.append(True))
+
+    asyncio.run(actions.close_polls_results(ChatResults([], {}, [], ['a'])))
+    assert not closed
+
+    result = PollResult(poll_id='b', chat_id=1, num_votes=2, subscription_id=5, place_id=7)
+    asyncio.run(actions.close_polls_results(ChatResults([], {5: 3}, [result], [])))
+
+    assert closed['poll_ids'] == ['b']
+    assert closed['customers'] == {5: 3}
+    assert closed['wins'] == [(1, 7)]
+    assert woken == [True]
+
+
+def test_send_polls_results_isolates_failures(monkeypatch: pytest.MonkeyPatch) -> None:
+    results = [
+        PollResult(poll_id='a', chat_id=1, num_votes=0),
+        PollResult(poll_id='b', chat_id=1, num_votes=0),
+        PollResult(poll_id='c', chat_id=2, num_votes=0),
+    ]
+    closed = {}
+
+    async def fake_run_in_session(func, **kwargs):
+        if func is polls.get_polls_results:
+            return results
+
+        closed.update(kwargs)
+
+    async def flush() -> int:
+        return 0
+
+    monkeypatch.setattr(polls, 'run_in_session', fake_run_in_session)
+    actions = make_actions(monkeypatch, fail_poll_ids={'a'})
+    monkeypatch.setattr(actions.votes, 'flush', flush)
+    monkeypatch.setattr(actions.outbox, 'wake', lambda: None)
+
+    asyncio.run(actions.send_polls_results(['a', 'b', 'c']))
+
+    # опрос с ошибкой остается открытым и ставится в очередь повторно, остальные закрываются
+    assert closed['poll_ids'] == ['b', 'c']
+    assert [message.chat_id for message in closed['messages']] == [1, 2]
+    assert actions.deadlines.pop_due(actions.deadlines.next_deadline) == ['a']
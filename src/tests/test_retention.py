@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import retention
+from retention import PollsRetention, RetentionReport
+
+
+def test_retention_runs_in_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    chunks = [RetentionReport(2, 6, 9), RetentionReport(2, 6, 4), RetentionReport(1, 3, 0)]
+    calls, pauses = [], []
+
+    async def fake_run_in_session(func, **kwargs):
+        calls.append(kwargs['chunk_size'])
+        return chunks[len(calls) - 1]
+
+    async def fake_sleep(delay: float) -> None:
+        pauses.append(delay)
+
+    monkeypatch.setattr(retention, 'run_in_session', fake_run_in_session)
+    monkeypatch.setattr(retention.asyncio, 'sleep', fake_sleep)
+
+    report = asyncio.run(PollsRetention(max_age=30, chunk_size=2, pause=0.5).run())
+
+    assert report == RetentionReport(polls=5, options=15, votes=13)
+    assert calls == [2, 2, 2]
+    assert pauses == [0.5, 0.5]
+
+
+def test_retention_without_old_polls(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_run_in_session(func, **kwargs):
+        return RetentionReport()
+
+    monkeypatch.setattr(retention, 'run_in_session', fake_run_in_session)
+
+    assert asyncio.run(PollsRetention(chunk_size=2).run()) == RetentionReport()
@@ -0,0 +1,68 @@
+import datetime as dt
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database.tables import ChatTimezone, Subscription
+from schedule import ChatSchedule, MailingSchedule
+
+
+MSK = ChatSchedule(mailing_time=dt.time(12, 0), sign=1, offset=dt.time(3))
+
+
+def test_utc_minute() -> None:
+    assert MSK.utc_minute == 9 * 60
+    assert MSK._replace(sign=-1, offset=dt.time(13, 30)).utc_minute == 60 + 30
+    assert MSK._replace(mailing_time=dt.time(1), sign=1, offset=dt.time(3)).utc_minute == 22 * 60
+    assert MSK._replace(mailing_time=None).utc_minute is None
+
+
+def test_due() -> None:
+    schedule = MailingSchedule()
+    schedule.update(1, MSK)
+    schedule.update(2, MSK._replace(mailing_time=dt.time(12, 1)))
+    schedule.update(3, MSK._replace(mailing_time=None))
+
+    now = dt.datetime(2022, 9, 1, 9, 0)
+    assert schedule.due(now) == [(1, dt.datetime(2022, 9, 1, 12, 0))]
+    assert schedule.due(now) == []
+
+    # пропущенные минуты обрабатываются на следующем шаге
+    assert [x for x, _ in schedule.due(now + dt.timedelta(minutes=2))] == [2]
+
+
+def test_update() -> None:
+    schedule = MailingSchedule()
+    schedule.update(1, MSK)
+    schedule.update(1, MSK._replace(offset=dt.time(4)))
+
+    assert schedule.due(dt.datetime(2022, 9, 1, 8, 0)) == [(1, dt.datetime(2022, 9, 1, 12, 0))]
+    assert schedule.due(dt.datetime(2022, 9, 1, 9, 0)) == []
+
+    schedule = MailingSchedule()
+    schedule.update(1, MSK)
+    schedule.update(1, None)
+
+    assert 1 not in schedule
+    assert schedule.due(dt.datetime(2022, 9, 1, 9, 0)) == []
+
+
+def test_load_after_reelection() -> None:
+    engine = create_engine('sqlite://')
+    Subscription.__table__.create(engine)
+    ChatTimezone.__table__.create(engine)
+
+    with Session(engine) as session:
+        session.add(Subscription(chat_id=1, bot_id=1, mailing_time=dt.time(12, 0)))
+        session.add(ChatTimezone(chat_id=1, sign=1, offset=dt.time(3)))
+        session.commit()
+
+        schedule = MailingSchedule()
+        schedule.load(session, bot_id=1)
+        assert schedule.due(dt.datetime(2022, 9, 1, 8, 0)) == []
+
+        # процесс снова стал ведущим через сутки: рассылка, выполненная за это время другим
+        # процессом, не повторяется
+        schedule.load(session, bot_id=1)
+        assert schedule.due(dt.datetime(2022, 9, 2, 9, 30)) == []
+        assert schedule.due(dt.datetime(2022, 9, 2, 9, 31)) == []
@@ -0,0 +1,44 @@
+import asyncio
+
+from aiogram.utils.exceptions import RetryAfter
+
+from sending import FanOut, RateLimiter, TokenBucket
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(rate=1, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0.9 < bucket.reserve() <= 1
+
+
+def test_fan_out_retry_after() -> None:
+    attempts = {}
+
+    async def send(chat_id: int) -> None:
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+
+        if chat_id == 2 and attempts[chat_id] == 1:
+            raise RetryAfter(0)
+
+        if chat_id == 3:
+            raise ValueError
+
+    fan_out = FanOut(limiter=RateLimiter(global_rate=1000), max_concurrency=2)
+    result = asyncio.run(fan_out.run([1, 2, 3, 4], send))
+
+    assert attempts == {1: 1, 2: 2, 3: 1, 4: 1}
+    assert (result.sent, result.failed, result.retried) == (3, 1, 1)
+
+
+def test_rate_limiter_evicts_least_recently_used() -> None:
+    limiter = RateLimiter(max_chats=2)
+
+    for chat_id in (-1, -2):
+        limiter.pause(chat_id, 60)
+
+    limiter.pause(-1, 60)
+    limiter.pause(-3, 60)
+
+    assert list(limiter._chats) == [-1, -3]
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import types
+from aiogram.utils.exceptions import BadRequest, NetworkError, RetryAfter
+
+from polls import PollActions
+from users import UserDirectory
+
+
+def make_user(user_id: int) -> types.User:
+    return types.User(id=user_id, is_bot=False, first_name=f'user{user_id}')
+
+
+def test_user_directory() -> None:
+    users = UserDirectory(chat_size=2, max_chats=2)
+    users.add_poll('p', chat_id=1)
+    users.add_answer('p', make_user(1))
+    users.add_answer('unknown', make_user(9))
+    users.add(1, make_user(2))
+
+    assert users.get(1, 1).first_name == 'user1'
+    assert users.get(1, 9) is None
+
+    # в чате 1 вытесняется пользователь 2, к которому дольше всего не обращались
+    users.add(1, make_user(3))
+    assert users.get(1, 2) is None
+    assert users.get(1, 1) is not None
+
+    users.add(2, make_user(1))
+    users.add(3, make_user(1))
+    assert len(users) == 2
+    assert users.get(1, 1) is None
+
+
+def test_get_customer_without_api_call() -> None:
+    calls = []
+
+    async def get_chat_member(chat_id: int, user_id: int):
+        calls.append((chat_id, user_id))
+        return SimpleNamespace(user=make_user(user_id))
+
+    actions = PollActions(bot=SimpleNamespace(get_chat_member=get_chat_member))
+    actions.users.add(1, make_user(5))
+
+    async def main() -> None:
+        user = await actions.get_customer(chat_id=1, user_ids={5, 6}, last_customer_id=6)
+        assert user.id == 5
+        assert calls == []
+
+        user = await actions.get_customer(chat_id=1, user_ids={7}, last_customer_id=None)
+        assert user.id == 7
+        assert calls == [(1, 7)]
+        assert actions.users.get(1, 7) is user
+
+    asyncio.run(main())
+
+
+def test_get_customer_errors() -> None:
+    errors = {-1: NetworkError('timeout'), -2: RetryAfter(5), -3: BadRequest('User not found')}
+
+    async def get_chat_member(chat_id: int, user_id: int):
+        if chat_id in errors:
+            raise errors[chat_id]
+
+        return SimpleNamespace(user=make_user(user_id))
+
+    actions = PollActions(bot=SimpleNamespace(get_chat_member=get_chat_member))
+
+    async def main() -> list:
+        return await asyncio.gather(*[
+            actions.get_customer(chat_id=chat_id, user_ids={7}, last_customer_id=None)
+            for chat_id in (-1, -2, -3, -4)
+        ])
+
+    # ошибки в одних чатах не мешают выбрать пользователя в остальных
+    users = asyncio.run(main())
+    assert users[:3] == [None, None, None]
+    assert users[3].id == 7
+    # после RetryAfter отправка в чат приостанавливается
+    assert actions.limiter._chat_bucket(-2).reserve() > 0
+    assert actions.limiter._chat_bucket(-4).reserve() == 0
@@ -0,0 +1,34 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database.tables import PollVote
+from votes import VoteBuffer, write_votes
+
+
+def test_vote_buffer() -> None:
+    buffer = VoteBuffer()
+    buffer.add('a', 1, [0])
+    buffer.add('a', 1, [])
+    buffer.add('a', 1, [2])
+    buffer.add('a', 2, [1])
+    buffer.add('a', 2, [])
+
+    assert len(buffer) == 2
+    assert buffer._pending == {('a', 1): (2,), ('a', 2): ()}
+
+
+def test_write_votes() -> None:
+    engine = create_engine('sqlite://')
+    PollVote.__table__.create(engine)
+
+    with Session(engine) as session:
+        session.add_all([
+            PollVote(poll_id='a', user_id=1, option_number=0),
+            PollVote(poll_id='a', user_id=2, option_number=0),
+            PollVote(poll_id='b', user_id=1, option_number=0),
+        ])
+
+        write_votes(session, votes={('a', 1): (2,), ('a', 2): (), ('a', 3): (1,)})
+
+        votes = session.query(PollVote.poll_id, PollVote.user_id, PollVote.option_number).all()
+        assert sorted(votes) == [('a', 1, 2), ('a', 3, 1), ('b', 1, 0)]
@@ -1,13 +1,17 @@
 import datetime
 import re
+from typing import Optional, Tuple
 
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
+from sqlalchemy.orm import Session
 
-from database import session_scope
+from chat_settings import chat_settings
+from database import run_in_session
 from database.tables import ChatTimezone
 from mailing import TIME_PATTERN
+from schedule import ChatSchedule, MailingSchedule, mailing_schedule, notify_chat_changed
 from translation import default_translation as translation
 from utils import get_sign
 
@@ -16,6 +20,20 @@ SIGN_PATTERN = r'(?P<sign>\+|-|)'
 TZ_REGEX = re.compile('^' + SIGN_PATTERN + TIME_PATTERN + '$')
 
 
+def parse_timezone(text: str) -> Optional[Tuple[int, datetime.time]]:
+    """Разбор смещения часового пояса вида `+3` или `-05:30`.
+
+    :return: пара (знак смещения, смещение) или `None`, если формат неверный.
+    """
+    m = TZ_REGEX.match(text)
+
+    if not m:
+        return None
+
+    sign = 1 if m.group('sign') in ('', '+') else -1
+    return sign, datetime.time(hour=int(m.group('h')), minute=int(m.group('m')[1:] or 0))
+
+
 class TimezoneStates(StatesGroup):
     waiting_for_choice = State()
     waiting_for_tz = State()
@@ -23,15 +41,34 @@ class TimezoneStates(StatesGroup):
 
 class Timezone:
     @staticmethod
-    async def set_timezone(msg: types.Message) -> None:
-        with session_scope() as session:
-            sign, offset = (session
-                            .query(ChatTimezone.sign, ChatTimezone.offset)
-                            .filter(ChatTimezone.chat_id == msg.chat.id)
-                            .one()
-                            )
+    def update_timezone(
+        session: Session,
+        bot_id: int,
+        chat_id: int,
+        sign: int,
+        offset: datetime.time,
+    ) -> Optional[ChatSchedule]:
+        """Изменение часового пояса чата.
+
+        Функция выполняется в потоке `DB_EXECUTOR` (см. `run_in_session`), поэтому ID бота и
+        чата передаются явно.
+
+        :return: новые параметры рассылки для чата.
+        """
+        record = session.query(ChatTimezone).filter(ChatTimezone.chat_id == chat_id).one()
+        record.sign, record.offset = sign, offset
+        notify_chat_changed(session, chat_id)
+        return MailingSchedule.fetch_chat(session, bot_id=bot_id, chat_id=chat_id)
 
-            sign = get_sign(sign)
+    @classmethod
+    async def set_timezone(cls, msg: types.Message) -> None:
+        settings = await chat_settings.get(bot_id=msg.bot.id, chat_id=msg.chat.id)
+
+        if settings is None:
+            await msg.answer(translation.not_subscribed)
+            return
+
+        sign, offset = get_sign(settings.sign), settings.offset
 
         keyboard = types.ReplyKeyboardMarkup(
             resize_keyboard=True,
@@ -74,21 +111,19 @@ class Timezone:
             await cls.on_cancel(msg, state)
             return
 
-        m = TZ_REGEX.match(msg.text)
+        timezone = parse_timezone(msg.text)
 
-        if not m:
+        if timezone is None:
             await msg.answer(translation.invalid_input_format)
             return
 
-        sign = 1 if m.group('sign') in ('', '+') else -1
-        h = int(m.group('h'))
-        m = int(m.group('m')[1:] or 0)
+        sign, offset = timezone
 
-        offset = datetime.time(hour=h, minute=m)
-
-        with session_scope() as session:
-            record = session.query(ChatTimezone).filter(ChatTimezone.chat_id == msg.chat.id).one()
-            record.sign, record.offset = sign, offset
+        entry = await run_in_session(
+            cls.update_timezone, bot_id=msg.bot.id, chat_id=msg.chat.id, sign=sign, offset=offset,
+        )
+        chat_settings.invalidate(msg.chat.id)
+        mailing_schedule.update(msg.chat.id, entry)
 
         await msg.answer(
             f'{translation.tz_changed}: UTC {get_sign(sign)}{offset.strftime("%H:%M")}.',
@@ -11,6 +11,7 @@ class Translation(BaseModel):
     subscription_cancelled: str = 'Подписка отменена.'
     go_to_site: str = 'Перейти на сайт'
     not_set: str = 'не установлено'
+    not_subscribed: str = 'Чат не подписан на бота, отправьте /start.'
 
     current_mailing_params: str = 'Текущее время рассылки'
     mailing_change: str = 'Изменить время рассылки'
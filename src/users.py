@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+
+USERS_PER_CHAT = 500
+USERS_MAX_CHATS = 10000
+USERS_MAX_POLLS = 10000
+
+
+def _touch(cache: OrderedDict, key, value, size: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+class UserDirectory:
+    """Пользователи, которых бот видел в чатах.
+
+    Пользователи добавляются из сообщений (см. `UserDirectoryMiddleware`) и ответов на опросы;
+    ответ на опрос не содержит ID чата, поэтому бот запоминает чаты созданных им опросов. Для
+    каждого чата хранится не больше `chat_size` пользователей, всего — не больше `max_chats`
+    чатов; вытесняются записи, к которым дольше всего не обращались.
+    """
+
+    def __init__(
+        self,
+        chat_size: int = USERS_PER_CHAT,
+        max_chats: int = USERS_MAX_CHATS,
+        max_polls: int = USERS_MAX_POLLS,
+    ) -> None:
+        self.chat_size = chat_size
+        self.max_chats = max_chats
+        self.max_polls = max_polls
+        self._chats: 'OrderedDict[int, OrderedDict[int, types.User]]' = OrderedDict()
+        self._poll_chats: 'OrderedDict[str, int]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def add(self, chat_id: int, user: types.User) -> None:
+        users = self._chats.get(chat_id)
+
+        if users is None:
+            users = OrderedDict()
+
+        _touch(self._chats, chat_id, users, self.max_chats)
+        _touch(users, user.id, user, self.chat_size)
+
+    def add_poll(self, poll_id: str, chat_id: int) -> None:
+        """Запоминание чата, в который отправлен опрос."""
+        _touch(self._poll_chats, poll_id, chat_id, self.max_polls)
+
+    def add_answer(self, poll_id: str, user: types.User) -> None:
+        """Добавление пользователя, ответившего на опрос (если чат опроса известен)."""
+        chat_id = self._poll_chats.get(poll_id)
+
+        if chat_id is not None:
+            self.add(chat_id, user)
+
+    def get(self, chat_id: int, user_id: int) -> Optional[types.User]:
+        users = self._chats.get(chat_id)
+
+        if users is None:
+            return None
+
+        user = users.get(user_id)
+
+        if user is not None:
+            users.move_to_end(user_id)
+
+        return user
+
+
+class UserDirectoryMiddleware(BaseMiddleware):
+    """Добавление авторов сообщений в `UserDirectory`."""
+
+    def __init__(self, users: UserDirectory) -> None:
+        super().__init__()
+        self.users = users
+
+    async def on_pre_process_message(self, message: types.Message, data: dict) -> None:
+        if message.from_user is not None and not message.from_user.is_bot:
+            self.users.add(message.chat.id, message.from_user)
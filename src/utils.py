@@ -1,55 +1,181 @@
+import asyncio
 import datetime as dt
 import re
-from typing import Optional
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import pandas as pd
 from loguru import logger
-from sqlalchemy import func
-from sqlalchemy.dialects.postgresql import INTERVAL
-from sqlalchemy.orm import Session
-from sqlalchemy.sql.functions import concat
+from sqlalchemy import func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import FromClause, Select
 
-from database import ENGINE, session_scope
-from database.tables import Place, Poll, PollVote
+from database import ENGINE
+from database.tables import Poll, PollVote
+from matcher import NameMatcher, TrigramIndex
+from metrics import PLACES_SNAPSHOT_AGE, PLACES_SNAPSHOT_BUILD_DURATION
+from places import PlaceRecord, PlacesCatalog, places_catalog
 
 
 REGEX_NORMALIZATION = re.compile(r'[.\s-]')
 POLL_ID = 'poll_id'
+# минимальное количество голосов за вариант-победитель, чтобы по нему был сделан заказ
+MIN_VOTES_FOR_ORDER = 2
+
+
+def normalize_text(text: str) -> str:
+    """Приведение текста к виду, в котором сравниваются названия мест."""
+    return REGEX_NORMALIZATION.sub('', text.lower())
+
+
+class PlacesSnapshot(NamedTuple):
+    """Неизменяемый снимок информации о местах, построенный по одной версии справочника."""
+    version: int
+    places: Dict[str, PlaceRecord]
+    matcher: NameMatcher
+    fuzzy_index: TrigramIndex
+    not_delivery_ids: List[int]
+    built_at: float
+    build_duration: float
+
+
+def build_places_snapshot(places: Tuple[PlaceRecord, ...], version: int) -> PlacesSnapshot:
+    """Построение снимка информации о местах по данным справочника.
+
+    :param places: места из справочника.
+    :param version: версия справочника.
+    """
+    started = time.monotonic()
+    delivery_places = {
+        normalize_text(place.name): place
+        for place in places if place.is_delivery
+    }
+    matcher = NameMatcher(delivery_places)
+    fuzzy_index = TrigramIndex(delivery_places)
+    not_delivery_ids = [place.id for place in places if not place.is_delivery]
+    finished = time.monotonic()
+
+    return PlacesSnapshot(
+        version=version,
+        places=delivery_places,
+        matcher=matcher,
+        fuzzy_index=fuzzy_index,
+        not_delivery_ids=not_delivery_ids,
+        built_at=finished,
+        build_duration=finished - started,
+    )
+
+
+EMPTY_SNAPSHOT = build_places_snapshot((), version=0)
 
 
 class PlacesInfo:
-    """Класс предназначен для хранения прочитанной из БД информации о местах для заказов."""
+    """Класс предназначен для хранения информации о местах для заказов, построенной по
+    справочнику мест.
+
+    Вся информация хранится в одном неизменяемом снимке `snapshot`. При изменении справочника
+    новый снимок строится в пуле потоков и заменяет прежний одним присваиванием, поэтому
+    обработчики никогда не видят частично обновленных данных, а цикл событий не блокируется.
+    """
 
-    def __init__(self) -> None:
-        self.places: Optional[pd.DataFrame] = None
-        self.names_regex: Optional[re.Pattern] = None
-        self.not_delivery_ids = []
-        self.update_places()
+    def __init__(self, catalog: Optional[PlacesCatalog] = None) -> None:
+        self.catalog = catalog or places_catalog
+        self.snapshot = EMPTY_SNAPSHOT
+        self._build_task: Optional[asyncio.Future] = None
+        self.catalog.subscribe(self.request_update)
+        PLACES_SNAPSHOT_AGE.set_function(lambda: self.snapshot_age)
+        self.update_places(self.catalog)
 
     @property
     def has_data(self) -> bool:
-        return self.places is not None
+        return bool(self.snapshot.places)
+
+    @property
+    def places(self) -> Dict[str, PlaceRecord]:
+        return self.snapshot.places
+
+    @property
+    def not_delivery_ids(self) -> List[int]:
+        return self.snapshot.not_delivery_ids
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    @property
+    def snapshot_age(self) -> float:
+        """Время в секундах, прошедшее с построения текущего снимка."""
+        return time.monotonic() - self.snapshot.built_at
+
+    def find_place(self, text: str) -> Optional[PlaceRecord]:
+        """Поиск упоминания места в тексте.
+
+        Если ни одно название не встречается в тексте без изменений, текст сравнивается с
+        названиями нечетко: так находятся названия с опечатками или написанные по-русски.
+
+        :param text: текст, приведенный к виду `normalize_text`.
+        :return: место с самым длинным из упомянутых названий или с наиболее похожим названием.
+        """
+        snapshot = self.snapshot
+        name = snapshot.matcher.find_longest(text)
+
+        if name is None:
+            name = snapshot.fuzzy_index.find(text)
 
-    def update_places(self) -> None:
-        with session_scope() as session:
-            query = session.query(Place.name, Place.url).filter(Place.is_delivery == True)
-            df = pd.read_sql(query.statement, ENGINE)
+        return snapshot.places[name] if name is not None else None
 
-            if df.empty:
-                logger.info('Данные о местах не найдены')
-                return
+    def set_snapshot(self, snapshot: PlacesSnapshot) -> None:
+        """Замена текущего снимка; снимки более старых версий справочника игнорируются."""
+        if snapshot.version <= self.snapshot.version:
+            return
 
-            df['normalized_name'] = (df.name
-                                     .str.lower()
-                                     .str.replace(pat=REGEX_NORMALIZATION, repl='', regex=True)
-                                     )
-            self.places = df.set_index('normalized_name').sort_index()
-            self.names_regex = re.compile('(' + '|'.join(self.places.index) + ')')
+        self.snapshot = snapshot
+        PLACES_SNAPSHOT_BUILD_DURATION.observe(snapshot.build_duration)
 
-            query_not_delivery = session.query(Place.id).filter(Place.is_delivery == False)
-            self.not_delivery_ids = [r for r, in query_not_delivery.all()]
+        if not snapshot.places:
+            logger.info('Данные о местах не найдены')
+            return
 
-        logger.info('Информация о местах обновлена')
+        logger.info(f'Информация о местах обновлена до версии {snapshot.version} '
+                    f'за {snapshot.build_duration:.3f} с')
+
+    def update_places(self, catalog: PlacesCatalog) -> None:
+        """Построение снимка по справочнику в текущем потоке."""
+        if catalog.version != self.version:
+            self.set_snapshot(build_places_snapshot(catalog.places, catalog.version))
+
+    async def rebuild(self, catalog: PlacesCatalog) -> None:
+        """Построение снимка по справочнику в пуле потоков."""
+        places, version = catalog.places, catalog.version
+
+        if version == self.version:
+            return
+
+        loop = asyncio.get_event_loop()
+        snapshot = await loop.run_in_executor(None, build_places_snapshot, places, version)
+        self.set_snapshot(snapshot)
+
+    def request_update(self, catalog: PlacesCatalog) -> None:
+        """Обработка изменения справочника: при запущенном цикле событий снимок строится в фоне."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.update_places(catalog)
+            return
+
+        self._build_task = asyncio.ensure_future(self._rebuild_in_background(catalog))
+
+    async def _rebuild_in_background(self, catalog: PlacesCatalog) -> None:
+        try:
+            await self.rebuild(catalog)
+        except Exception:
+            logger.exception('Ошибка при построении информации о местах')
+
+    async def wait_for_update(self) -> None:
+        """Ожидание построения снимка, запущенного последним изменением справочника."""
+        if self._build_task is not None:
+            await asyncio.shield(self._build_task)
 
 
 def get_utc_now() -> dt.datetime:
@@ -68,8 +194,12 @@ def get_sign(value: int) -> str:
     raise TypeError
 
 
-def get_polls_votes(session: Session) -> pd.DataFrame:
-    """Возвращает таблицу с информацией о количестве голосов за варианты опросов."""
+def polls_votes_query(session: Session, poll_ids: Optional[List[str]] = None) -> Query:
+    """Запрос количества голосов за варианты незакрытых опросов.
+
+    :param session: экземпляр сессии.
+    :param poll_ids: ID опросов; по умолчанию — все опросы, срок которых истек.
+    """
     cols_to_analyze = (
         Poll.chat_id,
         Poll.id.label(POLL_ID),
@@ -78,25 +208,74 @@ def get_polls_votes(session: Session) -> pd.DataFrame:
         PollVote.option_number,
     )
 
-    time_condition = (
-        func.timezone('utc', func.now()) >= Poll.start_date +
-        func.cast(concat(Poll.open_period, ' SECONDS'), INTERVAL)
-    )
+    if poll_ids is None:
+        condition = Poll.deadline <= func.timezone('utc', func.now())
+    else:
+        condition = Poll.id.in_(poll_ids)
 
     polls_to_process_query = (
         session
         .query(*cols_to_analyze, func.count(PollVote.option_number).label('num_votes'))
-        .filter(Poll.is_closed == False, time_condition)
+        .filter(Poll.is_closed == False, condition)
         .outerjoin(PollVote, Poll.id == PollVote.poll_id)
         .group_by(*cols_to_analyze)
     )
 
-    return pd.read_sql(polls_to_process_query.statement, ENGINE)
+    return polls_to_process_query
+
+
+def get_polls_votes(session: Session, poll_ids: Optional[List[str]] = None) -> pd.DataFrame:
+    """Возвращает таблицу с информацией о количестве голосов за варианты опросов."""
+    return pd.read_sql(polls_votes_query(session, poll_ids).statement, ENGINE)
+
+
+def rank_polls_winners(votes: FromClause, random_ties: bool = True) -> Select:
+    """Запрос, возвращающий для каждого опроса вариант-победитель.
+
+    Варианты каждого опроса ранжируются оконной функцией по убыванию числа голосов, среди
+    вариантов с одинаковым числом голосов порядок случайный (или по номеру варианта, если
+    `random_ties=False`; так результат запроса воспроизводим).
+
+    :param votes: таблица (подзапрос) с колонками `chat_id`, `poll_id`, `option_number` и
+    `num_votes`.
+    :param random_ties: выбирать победителя среди вариантов с равным числом голосов случайно.
+    :return: запрос, каждая строка которого содержит `poll_id`, `chat_id`, номер
+    варианта-победителя `option_number` и число голосов за него `num_votes`.
+    """
+    rank = func.row_number().over(
+        partition_by=votes.c.poll_id,
+        order_by=(
+            votes.c.num_votes.desc(),
+            func.random() if random_ties else votes.c.option_number,
+        ),
+    )
+
+    ranked = select(
+        votes.c.poll_id,
+        votes.c.chat_id,
+        votes.c.option_number,
+        votes.c.num_votes,
+        rank.label('rank'),
+    ).subquery()
+
+    return (select(ranked.c.poll_id, ranked.c.chat_id, ranked.c.option_number, ranked.c.num_votes)
+            .where(ranked.c.rank == 1)
+            .order_by(ranked.c.poll_id)
+            )
+
+
+def select_polls_winners(session: Session, poll_ids: Optional[List[str]] = None) -> List[Row]:
+    """Варианты-победители незакрытых опросов (см. `rank_polls_winners` и `polls_votes_query`)."""
+    votes = polls_votes_query(session, poll_ids).subquery()
+    return session.execute(rank_polls_winners(votes)).all()
 
 
 def get_polls_winners(df: pd.DataFrame) -> pd.DataFrame:
     """Возвращает таблицу, каждая строка которой содержит информацию об опросе и номер варианта-
-    победителя."""
+    победителя.
+
+    Эталонная реализация `rank_polls_winners`.
+    """
     if df.empty:
         return df.set_index(POLL_ID)
 
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from loguru import logger
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session
+
+from database import run_in_session
+from database.tables import PollVote
+
+
+VOTES_FLUSH_INTERVAL = 2
+
+# (ID опроса, ID пользователя) -> номера выбранных вариантов ответа
+TVotes = Dict[Tuple[str, int], Tuple[int, ...]]
+
+
+def write_votes(session: Session, votes: TVotes) -> None:
+    """Запись ответов пользователей: предыдущие ответы заменяются новыми, пустой ответ означает
+    отмену голоса."""
+    session.query(PollVote).filter(
+        tuple_(PollVote.poll_id, PollVote.user_id).in_(list(votes))
+    ).delete(synchronize_session=False)
+
+    rows = [
+        {'poll_id': poll_id, 'user_id': user_id, 'option_number': option_number}
+        for (poll_id, user_id), option_ids in votes.items()
+        for option_number in option_ids
+    ]
+
+    if rows:
+        session.execute(insert(PollVote).values(rows))
+
+
+class VoteBuffer:
+    """Буфер ответов пользователей на опросы.
+
+    Для каждой пары (опрос, пользователь) хранится только последний ответ, поэтому повторные
+    голосования и отмены голоса не приводят к лишним запросам. Накопленные ответы записываются в БД
+    одной транзакцией при вызове `flush`.
+    """
+
+    def __init__(self) -> None:
+        self._pending: TVotes = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, poll_id: str, user_id: int, option_ids: List[int]) -> None:
+        self._pending[(poll_id, user_id)] = tuple(option_ids)
+
+    async def flush(self) -> int:
+        """Запись накопленных ответов в БД.
+
+        :return: количество записанных ответов.
+        """
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, {}
+
+            try:
+                await run_in_session(write_votes, votes=pending)
+            except Exception:
+                # ответы, полученные во время записи, новее тех, что не удалось записать
+                for key, option_ids in pending.items():
+                    self._pending.setdefault(key, option_ids)
+
+                raise
+
+        logger.debug(f'Записано ответов на опросы: {len(pending)}')
+        return len(pending)